@@ -0,0 +1,165 @@
+# admin_routers.py
+import os
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import FileResponse
+
+from utils.db import engine
+from utils.cache import entity_cache
+from utils.read_replica import replica_router
+from utils.admission import admission_controller
+from utils.coalesce import single_flight
+from utils.storage import upload_queue
+from utils.jobs import job_queue
+from utils.slow_queries import SLOW_QUERY_MS, SLOW_QUERY_EXPLAIN_SAMPLE, slow_query_log
+from operations.operations_history import (
+    HISTORY_MODELS, HISTORY_RETENTION_DAYS, HISTORY_RETENTION_MODE, apply_retention, list_partitions,
+)
+from operations.operations_timeseries import downsample, record_snapshot
+from operations.operations_stats_engine import StatsEngineUnavailable, stats_engine
+from operations.operations_ratings import RatingsUnavailable, recompute_ratings
+from operations.operations_snapshot import (
+    SNAPSHOT_DIR, SnapshotUnavailable, create_snapshot, list_snapshots,
+)
+
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+# Solo para desarrollo local: sin ADMIN_TOKEN los endpoints de administración quedan abiertos
+ADMIN_OPEN = os.getenv("ADMIN_OPEN", "false").lower() in ("1", "true", "yes")
+
+
+# Los endpoints de administración exigen la cabecera X-Admin-Token. Sin ADMIN_TOKEN
+# configurado se rechazan todos (salvo ADMIN_OPEN=true).
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    if not ADMIN_TOKEN:
+        if ADMIN_OPEN:
+            return
+        raise HTTPException(status_code=403, detail="Administración deshabilitada: define ADMIN_TOKEN")
+    if x_admin_token != ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Token de administración inválido")
+
+
+router = APIRouter(prefix="/admin", dependencies=[Depends(require_admin)])
+
+# Consultas lentas capturadas (las más recientes primero)
+@router.get("/slow-queries", tags=["Admin"])
+def get_slow_queries(limit: Optional[int] = Query(None, ge=1)):
+    return {
+        "threshold_ms": SLOW_QUERY_MS,
+        "explain_sample": SLOW_QUERY_EXPLAIN_SAMPLE,
+        "total_recorded": slow_query_log.total,
+        "queries": slow_query_log.snapshot(limit),
+    }
+
+@router.delete("/slow-queries", tags=["Admin"])
+def clear_slow_queries():
+    slow_query_log.clear()
+    return {"message": "Registro de consultas lentas vaciado"}
+
+# Estado de la caché local de este worker
+@router.get("/cache", tags=["Admin"])
+def get_cache_stats():
+    return entity_cache.stats()
+
+@router.delete("/cache", tags=["Admin"])
+def clear_cache():
+    entity_cache.clear()
+    return {"message": "Caché local vaciada"}
+
+# Lecturas coalescidas: consultas ejecutadas (leader) y ahorradas (shared, microcache)
+@router.get("/coalesce", tags=["Admin"])
+def get_coalesce_stats():
+    return single_flight.stats()
+
+# Estado de la réplica de lectura (retraso medido, si está caída)
+@router.get("/replica", tags=["Admin"])
+def get_replica_status():
+    return replica_router.status()
+
+# Control de admisión: cola de espera del pool, plazas ocupadas por ruta, clientes con cupo
+@router.get("/admission", tags=["Admin"])
+def get_admission_status():
+    return admission_controller.status()
+
+# Cola de subidas al almacenamiento de objetos: pendientes, reintentos y fallos
+@router.get("/storage", tags=["Admin"])
+def get_storage_status():
+    return upload_queue.status()
+
+# Cola de trabajos en segundo plano: backend, hilos, trabajos por estado
+@router.get("/jobs", tags=["Admin"])
+def get_jobs_status():
+    return job_queue.status()
+
+# ---------------------- HISTORIAL ----------------------
+
+@router.get("/history/partitions", tags=["Admin"])
+def get_history_partitions():
+    if engine.dialect.name != "postgresql":
+        return {}
+    with engine.connect() as conn:
+        return {table: list_partitions(conn, table) for table in HISTORY_MODELS}
+
+# Aplica ahora la política de retención (por defecto la configurada en el entorno)
+@router.post("/history/retention", tags=["Admin"])
+def run_history_retention(
+    days: int = Query(HISTORY_RETENTION_DAYS, ge=0),
+    mode: str = Query(HISTORY_RETENTION_MODE, pattern="^(purge|archive)$"),
+):
+    return apply_retention(engine, days, mode)
+
+# ---------------------- SERIE TEMPORAL DE ESTADÍSTICAS ----------------------
+
+# Toma ahora una muestra de jugadores y equipos (solo los que cambiaron)
+@router.post("/stats/snapshot", tags=["Admin"])
+def take_stats_snapshot():
+    return record_snapshot(engine)
+
+@router.post("/stats/downsample", tags=["Admin"])
+def run_stats_downsample():
+    return downsample(engine)
+
+# Copia columnar en memoria de los rankings: versión, antigüedad y cambios pendientes
+@router.get("/stats/engine", tags=["Admin"])
+def get_stats_engine_status():
+    return stats_engine.status()
+
+# Recarga completa (p. ej. tras cargas masivas hechas fuera de la aplicación)
+@router.post("/stats/engine/reload", tags=["Admin"])
+def reload_stats_engine():
+    try:
+        stats_engine.refresh(engine, full=True)
+    except StatsEngineUnavailable as e:
+        raise HTTPException(status_code=501, detail=str(e))
+    return stats_engine.status()
+
+# ---------------------- RATINGS ----------------------
+
+# Rehace el historial de ratings de todos los equipos a partir de todos los partidos
+@router.post("/ratings/recompute", tags=["Admin"])
+def recompute_ratings_endpoint():
+    try:
+        return recompute_ratings(engine)
+    except RatingsUnavailable as e:
+        raise HTTPException(status_code=501, detail=str(e))
+
+# ---------------------- SNAPSHOTS ANALÍTICOS ----------------------
+
+# Crea un snapshot columnar (Parquet o Arrow IPC) de player, team, deletedplayer y deletedteam
+@router.post("/snapshots", tags=["Admin"])
+def create_snapshot_endpoint(format: str = Query("parquet", pattern="^(parquet|arrow)$")):
+    try:
+        return create_snapshot(engine, format)
+    except SnapshotUnavailable as e:
+        raise HTTPException(status_code=501, detail=str(e))
+
+@router.get("/snapshots", tags=["Admin"])
+def get_snapshots():
+    return list_snapshots()
+
+@router.get("/snapshots/{snapshot}/{filename}", tags=["Admin"])
+def download_snapshot_file(snapshot: str, filename: str):
+    path = (SNAPSHOT_DIR / snapshot / filename).resolve()
+    if SNAPSHOT_DIR.resolve() not in path.parents or not path.is_file():
+        raise HTTPException(status_code=404, detail="Archivo de snapshot no encontrado")
+    return FileResponse(path, filename=filename)
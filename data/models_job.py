@@ -0,0 +1,31 @@
+from sqlmodel import SQLModel, Field
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import Column, DateTime, Index, JSON
+
+# --- TRABAJOS EN SEGUNDO PLANO (JOBS_BACKEND=db) ---
+# Cola persistente compartida por todos los workers: se reclama con FOR UPDATE SKIP LOCKED
+# y sobrevive a reinicios (los trabajos "running" sin latido vuelven a la cola).
+# status: queued | running | succeeded | failed | cancelled
+class Job(SQLModel, table=True):
+    id: str = Field(primary_key=True)
+    kind: str
+    status: str = "queued"
+    params: dict = Field(default_factory=dict, sa_column=Column(JSON, nullable=False))
+    progress: float = 0
+    message: Optional[str] = None
+    result: Optional[dict] = Field(default=None, sa_column=Column(JSON, nullable=True))
+    error: Optional[str] = None
+    attempts: int = 0
+    max_attempts: int = 3
+    cancel_requested: bool = False
+    worker: Optional[str] = None
+    created_at: datetime = Field(sa_column=Column(DateTime, nullable=False))
+    run_after: datetime = Field(sa_column=Column(DateTime, nullable=False))
+    started_at: Optional[datetime] = Field(default=None, sa_column=Column(DateTime, nullable=True))
+    finished_at: Optional[datetime] = Field(default=None, sa_column=Column(DateTime, nullable=True))
+    heartbeat_at: Optional[datetime] = Field(default=None, sa_column=Column(DateTime, nullable=True))
+
+# Reclamar el siguiente trabajo listo y purgar los terminados
+Index("ix_job_status_run_after", Job.__table__.c.status, Job.__table__.c.run_after)
+Index("ix_job_finished_at", Job.__table__.c.finished_at)
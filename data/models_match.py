@@ -0,0 +1,61 @@
+from sqlmodel import SQLModel, Field
+from datetime import datetime
+from typing import Optional
+from pydantic import validator
+from sqlalchemy import Column, BIGINT, DateTime, Float, Index
+
+# --- PARTIDOS (RESULTADOS REGISTRADOS) ---
+# Sin clave foránea a team: los equipos pueden pasar al historial y volver con el mismo id
+class Match(SQLModel, table=True):
+    id: Optional[int] = Field(default=None, sa_column=Column(BIGINT, primary_key=True))
+    played_at: datetime = Field(default_factory=datetime.utcnow, sa_column=Column(DateTime, nullable=False))
+    team_a_id: int = Field(sa_column=Column(BIGINT, nullable=False))
+    team_b_id: int = Field(sa_column=Column(BIGINT, nullable=False))
+    score_a: int
+    score_b: int
+
+Index("ix_match_played_at", Match.__table__.c.played_at, Match.__table__.c.id)
+Index("ix_match_team_a_id", Match.__table__.c.team_a_id)
+Index("ix_match_team_b_id", Match.__table__.c.team_b_id)
+
+
+# --- REGISTRAR PARTIDO ---
+class MatchCreate(SQLModel):
+    team_a_id: int
+    team_b_id: int
+    score_a: int
+    score_b: int
+    played_at: Optional[datetime] = None
+
+    @validator('score_a', 'score_b')
+    def check_score(cls, v):
+        if v < 0:
+            raise ValueError("No se permiten valores negativos.")
+        return v
+
+    @validator('team_b_id')
+    def check_teams(cls, v, values):
+        if v == values.get('team_a_id'):
+            raise ValueError("Un equipo no puede jugar contra sí mismo.")
+        return v
+
+
+# --- HISTORIAL DE RATINGS ---
+# Rating de cada equipo al cierre de cada periodo en el que jugó. El periodo es un número
+# (semanas desde RATING_EPOCH por defecto); el rating vigente es la fila más reciente.
+# rd y volatility solo se usan con Glicko-2.
+class TeamRating(SQLModel, table=True):
+    system: str = Field(primary_key=True)
+    team_id: int = Field(sa_column=Column(BIGINT, primary_key=True))
+    period: int = Field(sa_column=Column(BIGINT, primary_key=True))
+    period_start: datetime = Field(sa_column=Column(DateTime, nullable=False))
+    rating: float = Field(sa_column=Column(Float, nullable=False))
+    rd: Optional[float] = Field(default=None, sa_column=Column(Float, nullable=True))
+    volatility: Optional[float] = Field(default=None, sa_column=Column(Float, nullable=True))
+    matches: int = 0
+
+# Para rehacer desde un periodo (las filas posteriores se borran y se recalculan)
+Index("ix_teamrating_system_period", TeamRating.__table__.c.system, TeamRating.__table__.c.period)
+# Rating vigente de cada equipo (DISTINCT ON (team_id) ... ORDER BY team_id, period DESC)
+Index("ix_teamrating_system_team_period", TeamRating.__table__.c.system, TeamRating.__table__.c.team_id,
+      TeamRating.__table__.c.period.desc())
@@ -1,7 +1,11 @@
-from sqlmodel import SQLModel, Field
-from typing import Optional
+from sqlmodel import SQLModel, Field, Relationship
+from datetime import datetime
+from typing import TYPE_CHECKING, Optional
 from pydantic import validator
-from sqlalchemy import Column, BIGINT, ForeignKey
+from sqlalchemy import Column, BIGINT, DateTime, Float, ForeignKey, Index, cast, func, text
+
+if TYPE_CHECKING:
+    from data.models_team import Team
 
 MAX_BIGINT = 9223372036854775807
 
@@ -15,6 +19,17 @@ class Player(SQLModel, table=True):
     team_id: Optional[int] = Field(sa_column=Column(BIGINT, ForeignKey("team.id"), nullable=True))
     image_url: Optional[str] = None
 
+    team: Optional["Team"] = Relationship(back_populates="players", sa_relationship_kwargs={"lazy": "raise"})
+
+# K/D: con 0 muertes se divide entre 1. La misma expresión se usa en el índice y en las consultas.
+PLAYER_KD = cast(Player.__table__.c.kills, Float) / func.greatest(Player.__table__.c.deaths, 1)
+
+# Índices para filtrar y ordenar en /players/query
+Index("ix_player_team_id", Player.__table__.c.team_id)
+Index("ix_player_kills", Player.__table__.c.kills)
+Index("ix_player_deaths", Player.__table__.c.deaths)
+Index("ix_player_kd", PLAYER_KD)
+
 # --- CREAR PLAYER ---
 class PlayerCreate(SQLModel):
     name: str
@@ -52,11 +67,22 @@ class UpdatedPlayer(SQLModel):
         return v
 
 # --- ELIMINADO (HISTORIAL) ---
+# En PostgreSQL la tabla está particionada por mes de deleted_at (ver operations_history.py).
+# team_id no lleva clave foránea: el equipo del jugador puede estar también en el historial.
 class DeletedPlayer(SQLModel, table=True):
     id: Optional[int] = Field(sa_column=Column(BIGINT, primary_key=True, autoincrement=True))
     name: str
     gamertag: str
     kills: int = Field(sa_column=Column(BIGINT))
     deaths: int = Field(sa_column=Column(BIGINT))
-    team_id: Optional[int] = Field(sa_column=Column(BIGINT, ForeignKey("team.id"), nullable=True))
+    team_id: Optional[int] = Field(sa_column=Column(BIGINT, nullable=True))
     image_url: Optional[str] = None
+    deleted_at: datetime = Field(default_factory=datetime.utcnow, sa_column=Column(
+        DateTime, nullable=False, server_default=text("(now() at time zone 'utc')")))
+
+# restore_team busca los jugadores del historial por team_id; las vistas paginan por fecha de borrado
+Index("ix_deletedplayer_team_id", DeletedPlayer.__table__.c.team_id)
+Index("ix_deletedplayer_deleted_at", DeletedPlayer.__table__.c.deleted_at, DeletedPlayer.__table__.c.id)
+
+# Registra Team (relación Player.team) aunque solo se importe este módulo
+from data.models_team import Team  # noqa: E402,F401
@@ -0,0 +1,23 @@
+from sqlmodel import SQLModel, Field
+from typing import Optional
+from datetime import datetime
+from sqlalchemy import Column, BIGINT, Index
+
+# --- SERIE TEMPORAL DE ESTADÍSTICAS ---
+# Tabla de solo inserción. Cada fila es el valor acumulado de una entidad al final de su
+# intervalo: resolution 'raw' (una muestra por snapshot), 'hour' o 'day' (ya reducidas).
+# La clave (entity, entity_id, bucket, ...) hace que un rango de fechas de una entidad sea
+# un solo recorrido del índice, tenga la antigüedad que tenga.
+class StatSample(SQLModel, table=True):
+    entity: str = Field(primary_key=True)
+    entity_id: int = Field(sa_column=Column(BIGINT, primary_key=True))
+    bucket: datetime = Field(primary_key=True)
+    resolution: str = Field(primary_key=True)
+    kills: int = Field(sa_column=Column(BIGINT, nullable=False))
+    deaths: int = Field(sa_column=Column(BIGINT, nullable=False))
+    # Solo equipos
+    championships: Optional[int] = Field(default=None, sa_column=Column(BIGINT, nullable=True))
+    players: Optional[int] = Field(default=None, sa_column=Column(BIGINT, nullable=True))
+
+# Para la reducción periódica (muestras de una resolución anteriores a un corte)
+Index("ix_statsample_resolution_bucket", StatSample.__table__.c.resolution, StatSample.__table__.c.bucket)
@@ -0,0 +1,15 @@
+from sqlmodel import SQLModel, Field
+from typing import Optional
+from datetime import datetime
+from sqlalchemy import Column, BIGINT
+
+# --- ESTADO DE SINCRONIZACIÓN CON FUENTES CSV ---
+# Una fila por entidad sincronizada: clave en la fuente (nombre del equipo / gamertag),
+# id de la entidad en nuestra tabla y huella (hash) de la última versión aplicada.
+class SyncState(SQLModel, table=True):
+    entity: str = Field(primary_key=True)
+    source_key: str = Field(primary_key=True)
+    entity_id: int = Field(sa_column=Column(BIGINT, nullable=False))
+    fingerprint: str
+    last_seen_run: Optional[str] = None
+    synced_at: datetime = Field(default_factory=datetime.utcnow)
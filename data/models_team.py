@@ -1,7 +1,11 @@
-from sqlmodel import SQLModel, Field
-from typing import Optional
+from sqlmodel import SQLModel, Field, Relationship
+from datetime import datetime
+from typing import TYPE_CHECKING, List, Optional
 from pydantic import validator
-from sqlalchemy import Column, BIGINT
+from sqlalchemy import Column, BIGINT, DateTime, Index, text
+
+if TYPE_CHECKING:
+    from data.models_player import Player
 
 MAX_BIGINT = 9223372036854775807
 
@@ -13,6 +17,16 @@ class Team(SQLModel, table=True):
     championships: int = Field(sa_column=Column(BIGINT))
     image_url: Optional[str] = None
 
+    # Plantilla. lazy="raise": solo se carga pidiéndolo (selectinload en get_teams_with_players),
+    # nunca con una consulta por equipo al recorrer una lista. passive_deletes="all": borrar el
+    # equipo no carga ni desvincula a sus jugadores (la clave foránea lo impide, como antes).
+    players: List["Player"] = Relationship(
+        back_populates="team",
+        sa_relationship_kwargs={"lazy": "raise", "passive_deletes": "all", "order_by": "Player.id"},
+    )
+
+Index("ix_team_region", Team.__table__.c.region)
+
 
 # --- CREAR TEAM ---
 class TeamCreate(SQLModel):
@@ -55,3 +69,10 @@ class DeletedTeam(SQLModel, table=True):
     region: str
     championships: int = Field(sa_column=Column(BIGINT))
     image_url: Optional[str] = None
+    deleted_at: datetime = Field(default_factory=datetime.utcnow, sa_column=Column(
+        DateTime, nullable=False, server_default=text("(now() at time zone 'utc')")))
+
+Index("ix_deletedteam_deleted_at", DeletedTeam.__table__.c.deleted_at, DeletedTeam.__table__.c.id)
+
+# Registra Player (relación Team.players) aunque solo se importe este módulo
+from data.models_player import Player  # noqa: E402,F401
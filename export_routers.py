@@ -0,0 +1,71 @@
+# export_routers.py
+import os
+import tempfile
+from pathlib import Path
+
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import FileResponse, StreamingResponse
+from starlette.background import BackgroundTask
+
+from utils.db import engine
+from operations.operations_export import EXPORTS, EXPORT_BATCH_SIZE, stream_csv, stream_ndjson, gzip_stream
+from operations.operations_snapshot import SNAPSHOT_FORMATS, SnapshotUnavailable, write_table
+
+router = APIRouter(prefix="/export")
+
+MEDIA_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+    "arrow": "application/vnd.apache.arrow.file",
+}
+
+# Exportación en streaming: CSV compatible con load_from_csv.py o NDJSON con todas las columnas.
+# parquet/arrow se escriben por lotes a un archivo temporal (formatos columnares para análisis).
+@router.get("/{kind}", tags=["Export"])
+def export_table(
+    kind: str,
+    format: str = Query("csv", pattern="^(csv|ndjson|parquet|arrow)$"),
+    gzip: bool = False,
+    batch_size: int = Query(EXPORT_BATCH_SIZE, ge=1, le=50_000),
+):
+    if kind not in EXPORTS:
+        raise HTTPException(status_code=404, detail=f"Exportación '{kind}' no existe. Opciones: {', '.join(EXPORTS)}")
+
+    if format in SNAPSHOT_FORMATS:
+        return _columnar_export(kind, format)
+
+    stream = stream_csv if format == "csv" else stream_ndjson
+    body = stream(engine, kind, batch_size)
+    filename = f"{kind}.{format}"
+    media_type = MEDIA_TYPES[format]
+    if gzip:
+        body = gzip_stream(body)
+        filename += ".gz"
+        media_type = "application/gzip"
+
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+def _columnar_export(kind: str, fmt: str):
+    fd, tmp_name = tempfile.mkstemp(suffix=SNAPSHOT_FORMATS[fmt])
+    os.close(fd)
+    path = Path(tmp_name)
+    try:
+        write_table(engine, kind, path, fmt)
+    except SnapshotUnavailable as e:
+        path.unlink(missing_ok=True)
+        raise HTTPException(status_code=501, detail=str(e))
+    except Exception:
+        path.unlink(missing_ok=True)
+        raise
+    return FileResponse(
+        path,
+        media_type=MEDIA_TYPES[fmt],
+        filename=f"{kind}{SNAPSHOT_FORMATS[fmt]}",
+        background=BackgroundTask(path.unlink, missing_ok=True),
+    )
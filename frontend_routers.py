@@ -1,8 +1,8 @@
 
 from fastapi import APIRouter, Request, Depends, Form, HTTPException, UploadFile, File
-from fastapi.responses import HTMLResponse, RedirectResponse
+from fastapi.responses import HTMLResponse, RedirectResponse, Response
 from sqlmodel import Session, select
-from typing import Optional, Union
+from typing import Optional, Tuple, Union
 import shutil
 import os
 from pathlib import Path
@@ -10,8 +10,15 @@ from pathlib import Path
 from fastapi.templating import Jinja2Templates
 
 from utils.db import get_session
+from utils.read_replica import get_read_session
+from utils.metrics import record_upload
+from utils.coalesce import coalesce
 from data.models_player import Player, DeletedPlayer
 from data.models_team import Team, DeletedTeam
+from operations.operations_history import HISTORY_PAGE_SIZE, get_history_page, history_cursor, parse_history_cursor
+from operations.operations_team import get_teams_with_player_counts, team_has_players
+from operations.operations_images import offload_image
+from utils.storage import upload_queue
 from urllib.parse import urlencode
 
 def validar_extension_jpg(archivo: UploadFile):
@@ -30,14 +37,65 @@ templates = Jinja2Templates(directory=str(project_root_dir / "frontend" / "templ
 
 router = APIRouter(prefix="/frontend")
 
+# Guarda la imagen subida en 'static/uploads' con un nombre único y devuelve la URL para el navegador
+async def guardar_imagen(image: UploadFile) -> str:
+    content = await image.read()
+    image_url = upload_queue.save_local(content, image.filename)
+    record_upload(len(content))
+    # La subida al almacenamiento de objetos (si hay uno configurado) la hace después
+    # offload_image, una vez confirmada la fila que apunta a la imagen
+    return image_url
+
+# Filas por página de las listas; las siguientes llegan con scroll infinito
+FRONTEND_PAGE_SIZE = 50
+
+# Peticiones de static/fragments.js (misma cabecera que HTMX): se responde solo con las
+# filas afectadas en vez de redirigir o volver a renderizar la lista completa
+def es_fragmento(request: Request) -> bool:
+    return request.headers.get("HX-Request") == "true"
+
+def renderizar(request: Request, page: str, fragment: str, context: dict):
+    template = fragment if es_fragmento(request) else page
+    response = templates.TemplateResponse(template, {"request": request, **context})
+    # La misma URL sirve página o fragmento: las cachés no deben mezclarlos
+    response.headers["Vary"] = "HX-Request"
+    return response
+
+# Tras una acción: respuesta vacía para el fragmento (la fila se quita en el navegador)
+# o la redirección de siempre si el formulario se envió sin JavaScript
+def accion_completada(request: Request, url: str):
+    if es_fragmento(request):
+        return Response(status_code=200)
+    return RedirectResponse(url=url, status_code=303)
+
+def url_siguiente(path: str, **params) -> str:
+    return f"{path}?{urlencode({k: v for k, v in params.items() if v not in (None, '')})}"
+
 print("✅ frontend_routers.py cargado correctamente")
 
 #---------------------------- PLAYERS --------------------------------------------------------------------------
+# Paginación por clave (id > after): cada página es un recorrido corto del índice
+def _players_page(session: Session, name: Optional[str], team_id: Optional[int], after: Optional[int]) -> dict:
+    query = select(Player)
+    if name: # Esto ya funciona bien con cadenas vacías para 'name'
+        query = query.where(Player.name.ilike(f"%{name}%"))
+    if team_id is not None:
+        query = query.where(Player.team_id == team_id)
+    if after is not None:
+        query = query.where(Player.id > after)
+    players = session.exec(query.order_by(Player.id).limit(FRONTEND_PAGE_SIZE + 1)).all()
+    next_url = None
+    if len(players) > FRONTEND_PAGE_SIZE:
+        players = players[:FRONTEND_PAGE_SIZE]
+        next_url = url_siguiente("/frontend/players/search", name=name, team_id=team_id, after=players[-1].id)
+    return {"players": players, "next_url": next_url, "first_page": after is None, "columns": 8}
+
 @router.get("/players/view", response_class=HTMLResponse, tags=["Frontend Player"])
-def show_players(request: Request, session: Session = Depends(get_session)):
-    players = session.exec(select(Player)).all()
+def show_players(request: Request, session: Session = Depends(get_read_session)):
     teams = session.exec(select(Team)).all()
-    return templates.TemplateResponse("players.html", {"request": request, "players": players, "teams": teams})
+    return templates.TemplateResponse("players.html", {
+        "request": request, "teams": teams, **_players_page(session, None, None, None),
+    })
 
 @router.get("/players/search", response_class=HTMLResponse, tags=["Frontend Player"])
 def search_players(
@@ -45,13 +103,9 @@ def search_players(
     name: Optional[str] = None,
     # Cambiamos team_id a Optional[Union[int, str]] para aceptar "" y luego lo convertimos a None
     team_id: Optional[Union[int, str]] = None, # <--- CAMBIO AQUÍ
-    session: Session = Depends(get_session)
+    after: Optional[int] = None,
+    session: Session = Depends(get_read_session)
 ):
-    query = select(Player)
-
-    if name: # Esto ya funciona bien con cadenas vacías para 'name'
-        query = query.where(Player.name.ilike(f"%{name}%"))
-
     # Convertir "" a None para team_id
     if isinstance(team_id, str) and team_id == "": # Si es una cadena vacía
         team_id = None
@@ -61,20 +115,30 @@ def search_players(
         except ValueError:
             team_id = None # Si no se puede convertir a int, lo tratamos como None
 
-    if team_id is not None: # Ahora team_id será int o None
-        query = query.where(Player.team_id == team_id)
+    page = _players_page(session, name, team_id, after)
+    if not es_fragmento(request):
+        page["teams"] = session.exec(select(Team)).all()  # Para el formulario
+    return renderizar(request, "players.html", "partials/player_rows.html", page)
 
-    players = session.exec(query).all()
-    teams = session.exec(select(Team)).all()  # Para el formulario
-    return templates.TemplateResponse("players.html", {"request": request, "players": players, "teams": teams})
+# Historial por clave (deleted_at, id): restaurar o borrar filas ya mostradas no desplaza
+# la página siguiente, como pasaría con OFFSET
+def _history_page(session: Session, model, path: str, after: Optional[str]) -> Tuple[list, Optional[str]]:
+    try:
+        cursor = parse_history_cursor(after)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    rows, has_next = get_history_page(session, model, HISTORY_PAGE_SIZE, after=cursor)
+    return rows, url_siguiente(path, after=history_cursor(rows[-1])) if has_next else None
 
 @router.get("/deleted-players/view", response_class=HTMLResponse, tags=["Frontend Player"])
-def show_deleted_players(request: Request, session: Session = Depends(get_session)):
-    players = session.exec(select(DeletedPlayer)).all()
-    return templates.TemplateResponse("deleted_players.html", {"request": request, "players": players})
+def show_deleted_players(request: Request, after: Optional[str] = None, session: Session = Depends(get_read_session)):
+    players, next_url = _history_page(session, DeletedPlayer, "/frontend/deleted-players/view", after)
+    return renderizar(request, "deleted_players.html", "partials/deleted_player_rows.html", {
+        "players": players, "first_page": after is None, "columns": 8, "next_url": next_url,
+    })
 
 @router.get("/form/players", response_class=HTMLResponse, tags=["Frontend Player"])
-def form_create_player(request: Request, session: Session = Depends(get_session)):
+def form_create_player(request: Request, session: Session = Depends(get_read_session)):
     teams = session.exec(select(Team)).all()
     if not teams:
         raise HTTPException(status_code=400, detail="No hay equipos registrados.")
@@ -94,16 +158,7 @@ async def create_player_form(
     try: # Inicia el bloque try
         validar_extension_jpg(image)
 
-        static_dir = project_root_dir / "static"
-        os.makedirs(static_dir, exist_ok=True)  # Crea la carpeta si no existe
-
-        image_path = static_dir / image.filename
-        # Asegúrate de que el nombre del archivo no cause problemas (ej. caracteres especiales, duplicados)
-        # Podrías generar un nombre único si es necesario, pero por ahora usamos el original
-        with open(image_path, "wb") as buffer:
-            buffer.write(await image.read())
-
-        image_url = f"/static/{image.filename}" # La URL para el navegador
+        image_url = await guardar_imagen(image) # La URL para el navegador
 
         team = None
         if team_id is not None: # Solo intenta buscar el equipo si se proporcionó un team_id
@@ -123,6 +178,7 @@ async def create_player_form(
         session.add(db_player)
         session.commit()
         session.refresh(db_player)
+        offload_image(db_player)
 
         # Log para depuración
         print(f"DEBUG: Jugador '{db_player.name}' (ID: {db_player.id}) creado exitosamente. Redirigiendo...")
@@ -145,7 +201,7 @@ async def create_player_form(
 
 
 @router.post("/players/delete/{player_id}", tags=["Frontend Player"])
-def delete_player_frontend(player_id: int, session: Session = Depends(get_session)):
+def delete_player_frontend(player_id: int, request: Request, session: Session = Depends(get_session)):
     player = session.get(Player, player_id)
     if not player:
         raise HTTPException(status_code=404, detail="Jugador no encontrado.")
@@ -164,10 +220,10 @@ def delete_player_frontend(player_id: int, session: Session = Depends(get_sessio
     session.delete(player)
     session.commit()
 
-    return RedirectResponse(url="/frontend/players/view", status_code=303)
+    return accion_completada(request, "/frontend/players/view")
 
 @router.post("/players/restore/{player_id}", tags=["Frontend Player"])
-def restore_deleted_player(player_id: int, session: Session = Depends(get_session)):
+def restore_deleted_player(player_id: int, request: Request, session: Session = Depends(get_session)):
     player = session.get(DeletedPlayer, player_id)
     if not player:
         raise HTTPException(status_code=404, detail="Jugador eliminado no encontrado")
@@ -191,29 +247,38 @@ def restore_deleted_player(player_id: int, session: Session = Depends(get_sessio
     session.add(restored)
     session.delete(player)
     session.commit()
-    return RedirectResponse(url="/frontend/players/view", status_code=303)
+    return accion_completada(request, "/frontend/players/view")
 
 @router.post("/deleted-players/delete/{player_id}", tags=["Frontend Player"])
-def delete_player_permanently(player_id: int, session: Session = Depends(get_session)):
+def delete_player_permanently(player_id: int, request: Request, session: Session = Depends(get_session)):
     player = session.get(DeletedPlayer, player_id)
     if not player:
         raise HTTPException(status_code=404, detail="Jugador eliminado no encontrado")
     session.delete(player)
     session.commit()
-    return RedirectResponse("/frontend/deleted-players/view", status_code=303)
+    return accion_completada(request, "/frontend/deleted-players/view")
 
 @router.get("/players/edit/{player_id}", response_class=HTMLResponse, tags=["Frontend Player"])
-def edit_player_form(player_id: int, request: Request, session: Session = Depends(get_session)):
+def edit_player_form(player_id: int, request: Request, session: Session = Depends(get_read_session)):
     player = session.get(Player, player_id)
     if not player:
         raise HTTPException(status_code=404, detail="Jugador no encontrado.")
 
     teams = session.exec(select(Team)).all()
-    return templates.TemplateResponse("edit_player.html", {"request": request, "player": player, "teams": teams})
+    return renderizar(request, "edit_player.html", "partials/player_edit_row.html", {"player": player, "teams": teams})
+
+# Fila de solo lectura (cancelar la edición en línea)
+@router.get("/players/row/{player_id}", response_class=HTMLResponse, tags=["Frontend Player"])
+def player_row(player_id: int, request: Request, session: Session = Depends(get_read_session)):
+    player = session.get(Player, player_id)
+    if not player:
+        raise HTTPException(status_code=404, detail="Jugador no encontrado.")
+    return templates.TemplateResponse("partials/player_row.html", {"request": request, "player": player})
 
 @router.post("/players/update/{player_id}", tags=["Frontend Player"])
 async def update_player_form(
     player_id: int,
+    request: Request,
     name: str = Form(...),
     gamertag: str = Form(...),
     kills: int = Form(...),
@@ -240,19 +305,18 @@ async def update_player_form(
 
         if image:
             validar_extension_jpg(image)
-            static_dir = project_root_dir / "static"
-            os.makedirs(static_dir, exist_ok=True)
-            image_path = static_dir / image.filename
-            with open(image_path, "wb") as buffer:
-                buffer.write(await image.read())
-            player.image_url = f"/static/{image.filename}"
+            player.image_url = await guardar_imagen(image)
 
         session.add(player)
         session.commit()
         session.refresh(player)
+        if image:
+            offload_image(player)
 
         print(f"DEBUG: Jugador '{player.name}' (ID: {player.id}) actualizado exitosamente.")
 
+        if es_fragmento(request):
+            return templates.TemplateResponse("partials/player_row.html", {"request": request, "player": player})
         return RedirectResponse(url="/frontend/players/view", status_code=303)
 
     except HTTPException as e:
@@ -266,10 +330,32 @@ async def update_player_form(
 
 
 #----------------------------- TEAMS ----------------------------------------------------------------------------
+def _teams_page(session: Session, query, name: Optional[str], championships: Optional[int], after: Optional[int]) -> dict:
+    if after is not None:
+        query = query.where(Team.id > after)
+    teams = get_teams_with_player_counts(session, query.limit(FRONTEND_PAGE_SIZE + 1))
+    next_url = None
+    if len(teams) > FRONTEND_PAGE_SIZE:
+        teams = teams[:FRONTEND_PAGE_SIZE]
+        next_url = url_siguiente("/frontend/teams/search", name=name, championships=championships, after=teams[-1][0].id)
+    return {"teams": teams, "next_url": next_url, "first_page": after is None, "columns": 7}
+
+def _team_row(request: Request, session: Session, team_id: int, template: str = "partials/team_row.html"):
+    rows = get_teams_with_player_counts(session, select(Team).where(Team.id == team_id))
+    if not rows:
+        raise HTTPException(status_code=404, detail="Equipo no encontrado")
+    team, player_count = rows[0]
+    return templates.TemplateResponse(template, {"request": request, "team": team, "player_count": player_count})
+
 @router.get("/teams/view", response_class=HTMLResponse , tags=["Frontend Teams"])
-def show_teams(request: Request, session: Session = Depends(get_session)):
-    teams = session.exec(select(Team)).all()
-    return templates.TemplateResponse("teams.html", {"request": request, "teams": teams})
+def show_teams(request: Request, session: Session = Depends(get_read_session)):
+    # Las peticiones simultáneas comparten la consulta y el HTML ya renderizado
+    def render():
+        page = _teams_page(session, select(Team), None, None, None)
+        return templates.TemplateResponse("teams.html", {"request": request, **page}).body
+
+    tags = [("team", None), ("player", None)]
+    return HTMLResponse(coalesce(session, "frontend_teams_view", "frontend:teams:view", tags, render))
 
 @router.get("/teams/search", response_class=HTMLResponse, tags=["Frontend Teams"])
 def search_teams(
@@ -277,7 +363,8 @@ def search_teams(
     name: Optional[str] = None,
     # Cambiamos championships a Optional[Union[int, str]]
     championships: Optional[Union[int, str]] = None, # <--- CAMBIO AQUÍ
-    session: Session = Depends(get_session)
+    after: Optional[int] = None,
+    session: Session = Depends(get_read_session)
 ):
     query = select(Team)
     if name:
@@ -294,13 +381,15 @@ def search_teams(
 
     if championships is not None: # Ahora championships será int o None
         query = query.where(Team.championships == championships)
-    teams = session.exec(query).all()
-    return templates.TemplateResponse("teams.html", {"request": request, "teams": teams})
+    page = _teams_page(session, query, name, championships, after)
+    return renderizar(request, "teams.html", "partials/team_rows.html", page)
 
 @router.get("/teams/deleted/view", response_class=HTMLResponse, tags=["Frontend Teams"])
-def view_deleted_teams(request: Request, session: Session = Depends(get_session)):
-    teams = session.exec(select(DeletedTeam)).all()
-    return templates.TemplateResponse("deleted_teams.html", {"request": request, "teams": teams})
+def view_deleted_teams(request: Request, after: Optional[str] = None, session: Session = Depends(get_read_session)):
+    teams, next_url = _history_page(session, DeletedTeam, "/frontend/teams/deleted/view", after)
+    return renderizar(request, "deleted_teams.html", "partials/deleted_team_rows.html", {
+        "teams": teams, "first_page": after is None, "columns": 6, "next_url": next_url,
+    })
 
 @router.get("/teams-form", response_class=HTMLResponse, tags=["Frontend Teams"])
 def form_team(request: Request):
@@ -317,14 +406,7 @@ async def create_team_form(
     try: # Inicia el bloque try
         validar_extension_jpg(image)
 
-        static_dir = project_root_dir / "static"
-        os.makedirs(static_dir, exist_ok=True)
-
-        image_path = static_dir / image.filename
-        with open(image_path, "wb") as buffer:
-            buffer.write(await image.read())
-
-        image_url = f"/static/{image.filename}"
+        image_url = await guardar_imagen(image)
 
         db_team = Team(
             name=name,
@@ -336,6 +418,7 @@ async def create_team_form(
         session.add(db_team)
         session.commit()
         session.refresh(db_team)
+        offload_image(db_team)
 
         print(f"DEBUG: Equipo '{db_team.name}' (ID: {db_team.id}) creado exitosamente. Redirigiendo...")
 
@@ -353,13 +436,16 @@ async def create_team_form(
 
 # ÚNICA FUNCIÓN delete_team_frontend - la duplicada ha sido eliminada.
 @router.post("/teams/delete/{team_id}", tags=["Frontend Teams"])
-def delete_team_frontend(team_id: int, session: Session = Depends(get_session)):
+def delete_team_frontend(team_id: int, request: Request, session: Session = Depends(get_session)):
     team = session.get(Team, team_id)
     if not team:
+        if es_fragmento(request):
+            raise HTTPException(status_code=404, detail="Equipo no encontrado")
         return RedirectResponse(url="/frontend/teams/view?error=Equipo%20no%20encontrado", status_code=303)
 
-    players = session.exec(select(Player).where(Player.team_id == team_id)).all()
-    if players:
+    if team_has_players(team_id, session):
+        if es_fragmento(request):
+            raise HTTPException(status_code=409, detail="No se puede eliminar el equipo porque tiene jugadores asignados.")
         message = urlencode({"error": "No se puede eliminar el equipo porque tiene jugadores asignados."})
         return RedirectResponse(url=f"/frontend/teams/view?{message}", status_code=303)
 
@@ -375,10 +461,10 @@ def delete_team_frontend(team_id: int, session: Session = Depends(get_session)):
     session.delete(team)
     session.commit()
 
-    return RedirectResponse(url="/frontend/teams/view", status_code=303)
+    return accion_completada(request, "/frontend/teams/view")
 
 @router.post("/teams/restore/{team_id}", tags=["Frontend Teams"])
-def restore_deleted_team(team_id: int, session: Session = Depends(get_session)):
+def restore_deleted_team(team_id: int, request: Request, session: Session = Depends(get_session)):
     try:
         team = session.get(DeletedTeam, team_id) # Busca en DeletedTeam
         if not team:
@@ -403,7 +489,7 @@ def restore_deleted_team(team_id: int, session: Session = Depends(get_session)):
         session.delete(team) # Elimina de la tabla DeletedTeam
         session.commit()
         print(f"DEBUG: Equipo '{restored_team.name}' (ID: {restored_team.id}) restaurado exitosamente.")
-        return RedirectResponse(url="/frontend/teams/view", status_code=303)
+        return accion_completada(request, "/frontend/teams/view")
 
     except HTTPException as e:
         session.rollback()
@@ -416,28 +502,36 @@ def restore_deleted_team(team_id: int, session: Session = Depends(get_session)):
 
 
 @router.post("/teams/delete-permanent/{team_id}", tags=["Frontend Teams"])
-def delete_team_permanently(team_id: int, session: Session = Depends(get_session)):
+def delete_team_permanently(team_id: int, request: Request, session: Session = Depends(get_session)):
     team = session.get(DeletedTeam, team_id)
     if not team:
         raise HTTPException(status_code=404, detail="Equipo eliminado no encontrado.")
 
     session.delete(team)
     session.commit()
-    return RedirectResponse(url="/frontend/teams/deleted/view", status_code=303)
+    return accion_completada(request, "/frontend/teams/deleted/view")
 
 # GET: Mostrar formulario de edición
 @router.get("/teams/edit/{team_id}", response_class=HTMLResponse, tags=["Frontend Teams"])
-def edit_team_form(team_id: int, request: Request, session: Session = Depends(get_session)):
+def edit_team_form(team_id: int, request: Request, session: Session = Depends(get_read_session)):
+    if es_fragmento(request):
+        return _team_row(request, session, team_id, "partials/team_edit_row.html")
     team = session.get(Team, team_id)
     if not team:
         raise HTTPException(status_code=404, detail="Equipo no encontrado")
     return templates.TemplateResponse("edit_team.html", {"request": request, "team": team})
 
+# Fila de solo lectura (cancelar la edición en línea)
+@router.get("/teams/row/{team_id}", response_class=HTMLResponse, tags=["Frontend Teams"])
+def team_row(team_id: int, request: Request, session: Session = Depends(get_read_session)):
+    return _team_row(request, session, team_id)
+
 
 # POST: Procesar formulario de edición
 @router.post("/teams/edit/{team_id}", tags=["Frontend Teams"])
 async def update_team_form(
     team_id: int,
+    request: Request,
     name: str = Form(...),
     region: str = Form(...),
     championships: int = Form(...),
@@ -455,16 +549,15 @@ async def update_team_form(
 
         if image:
             validar_extension_jpg(image)
-            static_dir = project_root_dir / "static"
-            os.makedirs(static_dir, exist_ok=True)
-            image_path = static_dir / image.filename
-            with open(image_path, "wb") as buffer:
-                buffer.write(await image.read())
-            team.image_url = f"/static/{image.filename}"
+            team.image_url = await guardar_imagen(image)
 
         session.add(team)
         session.commit()
+        if image:
+            offload_image(team)
         print(f"DEBUG: Equipo '{team.name}' (ID: {team.id}) actualizado exitosamente.")
+        if es_fragmento(request):
+            return _team_row(request, session, team_id)
         return RedirectResponse(url="/frontend/teams/view", status_code=303)
 
     except HTTPException as e:
@@ -0,0 +1,291 @@
+import argparse
+import csv
+import io
+import random
+from collections import defaultdict
+from itertools import islice
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+BASE_DIR = Path(__file__).resolve().parent
+
+TEAM_COLUMNS = ["name", "region", "championships", "image_url"]
+PLAYER_COLUMNS = ["name", "gamertag", "kills", "deaths", "team_name", "image_url"]
+
+CHUNK_SIZE = 50_000
+NAME_POOL_SIZE = 5_000
+_MASK64 = (1 << 64) - 1
+
+
+class DatasetProfile:
+    # Distribuciones aprendidas de los CSV reales (teams_real.csv / players_real.csv)
+    def __init__(self):
+        self.regions: List[str] = []
+        self.championships: List[int] = []
+        self.stat_pairs: List[Tuple[int, int]] = []
+        self.kills_sd: float = 0.0
+        self.deaths_sd: float = 0.0
+        self.roster_size: int = 4
+        self.team_prefixes: List[str] = []
+        self.team_suffixes: List[str] = []
+        self.name_chain: Dict[str, List[str]] = {}
+
+
+# Cadena de Markov de orden 2 sobre caracteres para imitar la forma de los gamertags
+def _build_name_chain(names: List[str]) -> Dict[str, List[str]]:
+    chain = defaultdict(list)
+    for name in names:
+        padded = "^^" + name + "$"
+        for i in range(len(padded) - 2):
+            chain[padded[i:i + 2]].append(padded[i + 2])
+    return dict(chain)
+
+
+def _markov_name(chain: Dict[str, List[str]], rng: random.Random, max_len: int = 12) -> str:
+    state, out = "^^", []
+    while len(out) < max_len:
+        options = chain.get(state)
+        if not options:
+            break
+        char = rng.choice(options)
+        if char == "$":
+            break
+        out.append(char)
+        state = state[1] + char
+    # Sin dígitos al final: así "base + índice" es siempre único
+    return "".join(out).strip().rstrip("0123456789") or "Spartan"
+
+
+def _stdev(values: List[int]) -> float:
+    mean = sum(values) / len(values)
+    return (sum((v - mean) ** 2 for v in values) / len(values)) ** 0.5
+
+
+def learn_profile(csv_teams: str, csv_players: str) -> DatasetProfile:
+    profile = DatasetProfile()
+
+    with open(csv_teams, newline='', encoding='utf-8') as csvfile:
+        for row in csv.DictReader(csvfile):
+            profile.regions.append(row["region"])
+            profile.championships.append(int(row["championships"]))
+            words = row["name"].split()
+            profile.team_prefixes.append(words[0])
+            if len(words) > 1:
+                profile.team_suffixes.append(" ".join(words[1:]))
+
+    gamertags = []
+    rosters = defaultdict(int)
+    with open(csv_players, newline='', encoding='utf-8') as csvfile:
+        for row in csv.DictReader(csvfile):
+            profile.stat_pairs.append((int(row["kills"]), int(row["deaths"])))
+            gamertags.append(row["gamertag"])
+            rosters[row["team_name"]] += 1
+
+    if not profile.regions or not profile.stat_pairs:
+        raise ValueError("Los CSV de origen no tienen filas suficientes para aprender distribuciones")
+
+    # Se remuestrean pares (kills, deaths) reales con ruido para conservar su correlación
+    profile.kills_sd = _stdev([k for k, _ in profile.stat_pairs]) / 2
+    profile.deaths_sd = _stdev([d for _, d in profile.stat_pairs]) / 2
+    profile.roster_size = max(1, round(sum(rosters.values()) / len(rosters)))
+    profile.team_suffixes = profile.team_suffixes or ["Gaming"]
+    profile.name_chain = _build_name_chain(gamertags)
+    return profile
+
+
+# Mezcla entera (splitmix64): nombre de equipo determinista a partir del índice, sin guardarlos en memoria
+def _mix(seed: int, i: int) -> int:
+    z = (seed * 0x9E3779B97F4A7C15 + i + 1) & _MASK64
+    z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & _MASK64
+    z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & _MASK64
+    return z ^ (z >> 31)
+
+
+class DatasetGenerator:
+    def __init__(self, profile: DatasetProfile, seed: int = 42):
+        self.profile = profile
+        self.seed = seed
+        pool_rng = random.Random(f"{seed}-names")
+        self.name_pool = [_markov_name(profile.name_chain, pool_rng) for _ in range(NAME_POOL_SIZE)]
+
+    def team_name(self, index: int) -> str:
+        h = _mix(self.seed, index)
+        prefixes, suffixes = self.profile.team_prefixes, self.profile.team_suffixes
+        prefix = prefixes[h % len(prefixes)]
+        suffix = suffixes[(h >> 16) % len(suffixes)]
+        return f"{prefix} {suffix} {index + 1}"
+
+    def _teams(self, count: int, offset: int, stream: str) -> Iterator[tuple]:
+        rng = random.Random(f"{self.seed}-{stream}")
+        regions, championships = self.profile.regions, self.profile.championships
+        n_regions, n_champs = len(regions), len(championships)
+        rand = rng.random
+        for i in range(offset, offset + count):
+            yield (
+                self.team_name(i),
+                regions[int(rand() * n_regions)],
+                championships[int(rand() * n_champs)],
+                "",
+            )
+
+    def _players(self, count: int, offset: int, n_teams: int, stream: str) -> Iterator[tuple]:
+        rng = random.Random(f"{self.seed}-{stream}")
+        pairs, pool = self.profile.stat_pairs, self.name_pool
+        n_pairs, n_pool = len(pairs), len(pool)
+        kills_sd, deaths_sd = self.profile.kills_sd, self.profile.deaths_sd
+        roster = self.profile.roster_size
+        rand, gauss = rng.random, rng.gauss
+        for j in range(offset, offset + count):
+            kills, deaths = pairs[int(rand() * n_pairs)]
+            team_index = (j // roster) % n_teams if n_teams else None
+            yield (
+                pool[int(rand() * n_pool)],
+                f"{pool[int(rand() * n_pool)]}{j}",
+                max(0, int(kills + gauss(0, kills_sd))),
+                max(0, int(deaths + gauss(0, deaths_sd))),
+                team_index,
+                "",
+            )
+
+    def teams(self, count: int) -> Iterator[tuple]:
+        return self._teams(count, 0, "teams")
+
+    # Equipos del historial: índices posteriores a los activos para no repetir nombres
+    def deleted_teams(self, count: int, n_teams: int) -> Iterator[tuple]:
+        return self._teams(count, n_teams, "deleted-teams")
+
+    def players(self, count: int, n_teams: int) -> Iterator[tuple]:
+        return self._players(count, 0, n_teams, "players")
+
+    # Jugadores del historial: apuntan a equipos activos (deletedplayer.team_id tiene FK a team)
+    def deleted_players(self, count: int, n_players: int, n_teams: int) -> Iterator[tuple]:
+        return self._players(count, n_players, n_teams, "deleted-players")
+
+
+def _chunks(rows: Iterator[tuple], size: int = CHUNK_SIZE) -> Iterator[List[tuple]]:
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+# ---------------------- SALIDA CSV ----------------------
+
+def write_csv(generator: DatasetGenerator, out_dir: str, n_teams: int, n_players: int,
+              n_deleted_teams: int = 0, n_deleted_players: int = 0):
+    out = Path(out_dir)
+    out.mkdir(parents=True, exist_ok=True)
+
+    def dump(filename: str, columns: List[str], rows: Iterator[tuple], player_rows: bool):
+        with open(out / filename, "w", newline='', encoding='utf-8') as csvfile:
+            writer = csv.writer(csvfile)
+            writer.writerow(columns)
+            for chunk in _chunks(rows):
+                if player_rows:
+                    # team_name en lugar de team_id, igual que players_real.csv
+                    chunk = [r[:4] + ("" if r[4] is None else generator.team_name(r[4]), r[5]) for r in chunk]
+                writer.writerows(chunk)
+        print(f"{filename}: generado en {out}")
+
+    dump("teams.csv", TEAM_COLUMNS, generator.teams(n_teams), False)
+    dump("players.csv", PLAYER_COLUMNS, generator.players(n_players, n_teams), True)
+    if n_deleted_teams:
+        dump("deleted_teams.csv", TEAM_COLUMNS, generator.deleted_teams(n_deleted_teams, n_teams), False)
+    if n_deleted_players:
+        dump("deleted_players.csv", PLAYER_COLUMNS,
+             generator.deleted_players(n_deleted_players, n_players, n_teams), True)
+
+
+# ---------------------- CARGA DIRECTA A BD ----------------------
+
+def _with_ids(rows: Iterator[tuple], first_id: int, player_rows: bool) -> Iterator[tuple]:
+    for i, row in enumerate(rows, start=first_id):
+        if player_rows:
+            # El índice de equipo pasa a ser team.id (ids explícitos desde 1)
+            row = row[:4] + (None if row[4] is None else row[4] + 1, row[5] or None)
+        else:
+            row = row[:3] + (row[3] or None,)
+        yield (i,) + row
+
+
+def _copy_rows(engine, table: str, columns: List[str], rows: Iterator[tuple]):
+    if engine.dialect.name == "postgresql":
+        # COPY ... FROM STDIN: órdenes de magnitud más rápido que INSERT fila a fila
+        raw = engine.raw_connection()
+        try:
+            cursor = raw.cursor()
+            for chunk in _chunks(rows):
+                buffer = io.StringIO()
+                writer = csv.writer(buffer)
+                writer.writerows(["\\N" if v is None else v for v in r] for r in chunk)
+                buffer.seek(0)
+                cursor.copy_expert(
+                    f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv, NULL '\\N')", buffer
+                )
+            raw.commit()
+        finally:
+            raw.close()
+        return
+
+    from sqlalchemy import text
+    stmt = text(f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join(':' + c for c in columns)})")
+    with engine.begin() as conn:
+        for chunk in _chunks(rows):
+            conn.execute(stmt, [dict(zip(columns, r)) for r in chunk])
+
+
+def load_into_db(generator: DatasetGenerator, n_teams: int, n_players: int,
+                 n_deleted_teams: int = 0, n_deleted_players: int = 0):
+    from sqlalchemy import text
+    from utils.db import engine, create_db_and_tables
+    import data.models_team, data.models_player  # noqa: F401 (registra las tablas)
+
+    create_db_and_tables()
+    team_cols = ["id"] + TEAM_COLUMNS
+    player_cols = ["id", "name", "gamertag", "kills", "deaths", "team_id", "image_url"]
+
+    _copy_rows(engine, "team", team_cols, _with_ids(generator.teams(n_teams), 1, False))
+    _copy_rows(engine, "player", player_cols, _with_ids(generator.players(n_players, n_teams), 1, True))
+    if n_deleted_teams:
+        _copy_rows(engine, "deletedteam", team_cols,
+                   _with_ids(generator.deleted_teams(n_deleted_teams, n_teams), n_teams + 1, False))
+    if n_deleted_players:
+        _copy_rows(engine, "deletedplayer", player_cols,
+                   _with_ids(generator.deleted_players(n_deleted_players, n_players, n_teams), n_players + 1, True))
+
+    # Reiniciar secuencias después de insertar ids explícitos
+    if engine.dialect.name == "postgresql":
+        with engine.begin() as conn:
+            for table in ("team", "player", "deletedteam", "deletedplayer"):
+                conn.execute(text(
+                    f"SELECT setval('{table}_id_seq', COALESCE((SELECT MAX(id) FROM {table}), 0) + 1, false)"
+                ))
+    print(f"Cargados {n_teams} equipos y {n_players} jugadores (+{n_deleted_teams}/{n_deleted_players} en historial).")
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Genera datasets sintéticos a partir de los CSV reales.")
+    parser.add_argument("--players", type=int, default=1_000_000)
+    parser.add_argument("--teams", type=int, default=None, help="Por defecto: jugadores / tamaño de plantilla")
+    parser.add_argument("--deleted-players", type=int, default=0)
+    parser.add_argument("--deleted-teams", type=int, default=0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", default="synthetic_data", help="Directorio de salida de los CSV")
+    parser.add_argument("--db", action="store_true", help="Cargar directamente en DATABASE_URL en lugar de CSV")
+    parser.add_argument("--teams-csv", default=str(BASE_DIR / "teams_real.csv"))
+    parser.add_argument("--players-csv", default=str(BASE_DIR / "players_real.csv"))
+    args = parser.parse_args(argv)
+
+    profile = learn_profile(args.teams_csv, args.players_csv)
+    generator = DatasetGenerator(profile, seed=args.seed)
+    n_teams = args.teams if args.teams is not None else max(1, args.players // profile.roster_size)
+
+    if args.db:
+        load_into_db(generator, n_teams, args.players, args.deleted_teams, args.deleted_players)
+    else:
+        write_csv(generator, args.out, n_teams, args.players, args.deleted_teams, args.deleted_players)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+# import_routers.py
+import io
+
+from fastapi import APIRouter, Depends, File, HTTPException, UploadFile
+from sqlmodel import Session
+
+from utils.db import get_session
+from operations.operations_import import import_players, import_teams
+from operations.operations_sync import sync_players, sync_teams
+from operations.operations_jobs import submit_import
+from utils.jobs import job_accepted
+
+router = APIRouter(prefix="/import")
+
+
+def _check_csv(file: UploadFile):
+    if not file.filename.lower().endswith(".csv"):
+        raise HTTPException(status_code=400, detail="Solo se permiten archivos con extensión .csv")
+
+# El archivo subido queda en un SpooledTemporaryFile; se envuelve para leerlo como texto línea a línea
+def _text_stream(file: UploadFile) -> io.TextIOWrapper:
+    _check_csv(file)
+    file.file.seek(0)
+    return io.TextIOWrapper(file.file, encoding="utf-8-sig", newline="")
+
+
+def _run_import(importer, file: UploadFile, session: Session, **options) -> dict:
+    text_file = _text_stream(file)
+    try:
+        return importer(text_file, session, **options)
+    except ValueError as e:
+        session.rollback()
+        raise HTTPException(status_code=400, detail=str(e))
+    except UnicodeDecodeError:
+        session.rollback()
+        raise HTTPException(status_code=400, detail="El archivo no está codificado en UTF-8")
+    finally:
+        text_file.detach()
+
+# background=true: el archivo se copia y la importación corre como trabajo (202 + /jobs/{id})
+def _import_or_submit(kind: str, importer, file: UploadFile, session: Session, background: bool, **options):
+    if not background:
+        return _run_import(importer, file, session, **options)
+    _check_csv(file)
+    return job_accepted(submit_import(kind, file.file, file.filename, **options))
+
+# Mismas columnas que teams_real.csv: name, region, championships, image_url
+@router.post("/teams", tags=["Import"])
+def import_teams_csv(background: bool = False, file: UploadFile = File(...), session: Session = Depends(get_session)):
+    return _import_or_submit("import_teams", import_teams, file, session, background)
+
+# Mismas columnas que players_real.csv: name, gamertag, kills, deaths, team_name, image_url
+@router.post("/players", tags=["Import"])
+def import_players_csv(background: bool = False, file: UploadFile = File(...), session: Session = Depends(get_session)):
+    return _import_or_submit("import_players", import_players, file, session, background)
+
+# ---------------------- SINCRONIZACIÓN INCREMENTAL ----------------------
+# Solo se escriben las filas cuya huella cambió; archive_missing=true mueve al historial
+# las entidades sincronizadas antes que ya no aparecen en el archivo.
+
+@router.post("/teams/sync", tags=["Import"])
+def sync_teams_csv(archive_missing: bool = False, background: bool = False, file: UploadFile = File(...),
+                   session: Session = Depends(get_session)):
+    return _import_or_submit("sync_teams", sync_teams, file, session, background, archive_missing=archive_missing)
+
+@router.post("/players/sync", tags=["Import"])
+def sync_players_csv(archive_missing: bool = False, background: bool = False, file: UploadFile = File(...),
+                     session: Session = Depends(get_session)):
+    return _import_or_submit("sync_players", sync_players, file, session, background, archive_missing=archive_missing)
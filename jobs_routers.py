@@ -0,0 +1,49 @@
+# jobs_routers.py
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Query
+
+from utils.jobs import JobStateError, job_accepted, job_public, job_queue
+
+router = APIRouter(prefix="/jobs")
+
+JOB_STATUS_PATTERN = "^(queued|running|succeeded|failed|cancelled)$"
+
+
+def _found(job: Optional[dict]) -> dict:
+    if job is None:
+        raise HTTPException(status_code=404, detail="Trabajo no encontrado")
+    return job
+
+
+# Más recientes primero
+@router.get("", tags=["Jobs"])
+def list_jobs(
+    status: Optional[str] = Query(None, pattern=JOB_STATUS_PATTERN),
+    kind: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=500),
+    offset: int = Query(0, ge=0),
+):
+    return [job_public(job) for job in job_queue.list(status=status, kind=kind, limit=limit, offset=offset)]
+
+# Estado, progreso (0-1), resultado o error del trabajo
+@router.get("/{job_id}", tags=["Jobs"])
+def get_job(job_id: str):
+    return job_public(_found(job_queue.get(job_id)))
+
+# En cola: se cancela al momento. En ejecución: se marca y el trabajo se detiene en su
+# siguiente punto de control (cancel_requested=true hasta entonces).
+@router.post("/{job_id}/cancel", tags=["Jobs"])
+def cancel_job(job_id: str):
+    try:
+        return job_public(_found(job_queue.cancel(job_id)))
+    except JobStateError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+# Vuelve a encolar un trabajo fallido o cancelado con los mismos parámetros
+@router.post("/{job_id}/retry", tags=["Jobs"])
+def retry_job(job_id: str):
+    try:
+        return job_accepted(_found(job_queue.retry(job_id)))
+    except JobStateError as e:
+        raise HTTPException(status_code=409, detail=str(e))
@@ -1,8 +1,10 @@
+import argparse
 import csv
 from sqlmodel import Session, select
-from utils.db import engine
+from utils.db import engine, create_db_and_tables
 from data.models_team import Team
 from data.models_player import Player
+from operations.operations_sync import sync_teams, sync_players
 
 def load_teams(session: Session, csv_path: str):
     with open(csv_path, newline='', encoding='utf-8') as csvfile:
@@ -50,13 +52,29 @@ def load_players(session: Session, csv_path: str):
             session.add(player)
         session.commit()
 
+# Modo sincronización: actualiza solo las filas que cambiaron desde la última carga
+def sync_from_csv(session: Session, csv_teams: str, csv_players: str, archive_missing: bool = False):
+    with open(csv_teams, newline='', encoding='utf-8') as csvfile:
+        print("Equipos:", sync_teams(csvfile, session, archive_missing=archive_missing))
+    with open(csv_players, newline='', encoding='utf-8') as csvfile:
+        print("Jugadores:", sync_players(csvfile, session, archive_missing=archive_missing))
+
 def main():
-    csv_teams = "teams_real.csv"
-    csv_players = "players_real.csv"
+    parser = argparse.ArgumentParser(description="Carga equipos y jugadores desde CSV.")
+    parser.add_argument("--teams", default="teams_real.csv")
+    parser.add_argument("--players", default="players_real.csv")
+    parser.add_argument("--sync", action="store_true", help="Actualizar filas modificadas en lugar de saltarlas")
+    parser.add_argument("--archive-missing", action="store_true",
+                        help="Con --sync, mover al historial lo que ya no está en los CSV")
+    args = parser.parse_args()
 
     with Session(engine) as session:
-        load_teams(session, csv_teams)
-        load_players(session, csv_players)
+        if args.sync:
+            create_db_and_tables()
+            sync_from_csv(session, args.teams, args.players, args.archive_missing)
+            return
+        load_teams(session, args.teams)
+        load_players(session, args.players)
 
 if __name__ == "__main__":
     main()
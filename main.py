@@ -1,13 +1,29 @@
 from fastapi import FastAPI, Depends, HTTPException, Request
-from fastapi.responses import JSONResponse, HTMLResponse
-from sqlalchemy import text
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, HTMLResponse, PlainTextResponse
 from sqlmodel import Session
 from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
 import os
 from pathlib import Path
 
-from utils.db import create_db_and_tables, get_session
+from utils.db import create_db_and_tables, get_session, engine, read_engine
+from utils.request_context import RequestContextMiddleware
+from utils.metrics import METRICS_ENABLED, install_metrics, registry
+from utils.sql_profiler import SQL_PROFILER_ENABLED, install_sql_profiler
+from utils.slow_queries import install_slow_query_log
+from utils.read_replica import ReadYourWritesMiddleware
+from utils.admission import ADMISSION_ENABLED, AdmissionMiddleware
+from operations.operations_snapshot import start_snapshot_scheduler
+from utils.change_bus import change_bus, start_change_bus, stop_change_bus
+from operations.operations_query import ensure_query_indexes
+from operations.operations_timeseries import start_stats_scheduler
+from operations.operations_stats_engine import stats_engine
+from operations.operations_images import start_image_offload
+from operations.operations_jobs import reset_all_data, start_jobs
+from utils.jobs import job_accepted, job_queue
+from utils.warmup import warmup, warmup_steps
+from operations.operations_history import ensure_history_partitioning, start_history_maintenance
 
 # Define BASE_DIR lo antes posible
 BASE_DIR = Path(__file__).resolve().parent
@@ -28,6 +44,17 @@ Puedes:
     version="1.0.0"
 )
 
+# Middlewares: el último añadido es el más externo (RequestContext debe envolver a los demás)
+if ADMISSION_ENABLED:
+    app.add_middleware(AdmissionMiddleware)
+app.add_middleware(ReadYourWritesMiddleware)
+if METRICS_ENABLED:
+    install_metrics(app)
+if SQL_PROFILER_ENABLED:
+    install_sql_profiler(app)
+app.add_middleware(RequestContextMiddleware)
+install_slow_query_log()
+
 # Monta los archivos estáticos
 app.mount("/static", StaticFiles(directory=str(BASE_DIR / "static")), name="static")
 
@@ -37,35 +64,80 @@ app.mount("/static", StaticFiles(directory=str(BASE_DIR / "static")), name="stat
 # y que 'frontend_routers.py' ya no importe 'templates' y 'BASE_DIR' de aquí.
 from routers import router # Este es tu router de la API pura
 from frontend_routers import router as frontend_router # Este es el router de las vistas HTML
+from frontend_routers import templates as frontend_templates
+from admin_routers import router as admin_router
+from export_routers import router as export_router
+from import_routers import router as import_router
+from jobs_routers import router as jobs_router
 
 # Incluir routers
 app.include_router(frontend_router)
 app.include_router(router)
+app.include_router(admin_router)
+app.include_router(export_router)
+app.include_router(import_router)
+app.include_router(jobs_router)
 
 @app.get("/", response_class=HTMLResponse, name="index")
 async def index(request: Request):
     return templates.TemplateResponse("index.html", {"request": request})
 
+# Métricas en formato de texto de Prometheus
+@app.get("/metrics", response_class=PlainTextResponse, tags=["General"])
+async def metrics():
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+# Liveness: el proceso responde (no toca la base de datos; reiniciar no arregla una base caída)
+@app.get("/live", tags=["General"])
+async def live():
+    return {"status": "alive"}
+
+# Readiness: 200 solo cuando el calentamiento terminó; incluye la duración de cada paso
+@app.get("/ready", tags=["General"])
+async def ready():
+    status = warmup.status()
+    return JSONResponse(jsonable_encoder(status), status_code=200 if status["ready"] else 503)
+
 @app.on_event("startup")
 def on_startup():
     create_db_and_tables()
-
+    # Historial particionado por mes de borrado (antes de instalar los triggers del bus de cambios)
+    ensure_history_partitioning(engine)
+    start_history_maintenance(engine)
+    ensure_query_indexes(engine)
+    # Triggers NOTIFY + conexión LISTEN para invalidar las cachés locales entre workers
+    start_change_bus(engine)
+    # Muestras periódicas de kills/deaths para las series temporales (STATS_SNAPSHOT_MINUTES, 0 = desactivado)
+    start_stats_scheduler(engine)
+    # Copia columnar en memoria para rankings y agregados (STATS_ENGINE_ENABLED)
+    stats_engine.start(engine)
+    # Subida de imágenes a S3/Supabase en segundo plano (STORAGE_BACKEND); reanuda las pendientes
+    start_image_offload(engine)
+    # Trabajos pesados en segundo plano (JOBS_BACKEND=memory|db); con db retoma los que quedaron a medias
+    start_jobs(engine)
+    # Snapshots columnares periódicos para análisis (0 = desactivado)
+    start_snapshot_scheduler(
+        engine,
+        float(os.getenv("SNAPSHOT_INTERVAL_MINUTES", "0")),
+        os.getenv("SNAPSHOT_FORMAT", "parquet"),
+    )
+    # Lo último: conexiones del pool, plantillas, esquemas y OpenAPI antes de declararse listo
+    warmup.start(warmup_steps(
+        app, {"primary": engine, "replica": read_engine}, [templates.env, frontend_templates.env]))
+    # SIGTERM: /ready a 503 durante WARMUP_DRAIN_SECONDS antes de que uvicorn cierre el socket
+    warmup.install_drain_signal()
+
+@app.on_event("shutdown")
+def on_shutdown():
+    warmup.drain()
+    stop_change_bus()
+
+# background=true: responde 202 con la URL del trabajo (GET /jobs/{id})
 @app.delete("/reset-all", tags=["General"])
-def reset_all(session: Session = Depends(get_session)):
-    session.exec(text("DELETE FROM player"))
-    session.exec(text("DELETE FROM team"))
-    session.exec(text("DELETE FROM deletedplayer"))
-    session.exec(text("DELETE FROM deletedteam"))
-
-    # Reiniciar secuencias de IDs en PostgreSQL
-    # Las comillas dobles son necesarias si los nombres de tabla/columna no son minúsculas
-    session.execute(text("SELECT setval('player_id_seq', 1, false)"))
-    session.execute(text("SELECT setval('team_id_seq', 1, false)"))
-    session.execute(text("SELECT setval('deletedplayer_id_seq', 1, false)"))
-    session.execute(text("SELECT setval('deletedteam_id_seq', 1, false)"))
-
-
-    session.commit()
+def reset_all(background: bool = False, session: Session = Depends(get_session)):
+    if background:
+        return job_accepted(job_queue.submit("reset_all"))
+    reset_all_data(session)
     return {"message": "Todos los jugadores, equipos y registros históricos eliminados. Secuencias reiniciadas."}
 
 @app.exception_handler(HTTPException)
@@ -0,0 +1,147 @@
+# operations_distribution.py
+from typing import List, Optional
+
+from operations.operations_stats_engine import PLAYER_METRICS, StatsSnapshot, np
+
+# Ámbitos de comparación: toda la liga, la región del equipo del jugador o su equipo
+SCOPES = ("league", "region", "team")
+QUANTILES = (10, 25, 50, 75, 90, 99)
+
+
+# Distribución de una métrica dentro de cada grupo de un ámbito, calculada para toda la
+# población de una vez: ordenar por (grupo, valor) y derivar de las posiciones el rango
+# percentil de cada jugador, sin recorrer grupos ni jugadores en Python.
+class Distribution:
+    def __init__(self, values, groups, labels):
+        n = len(values)
+        count = len(labels)
+        self.labels = labels
+        self.counts = np.bincount(groups, minlength=count)
+        sizes = np.maximum(self.counts, 1)
+        self.means = np.bincount(groups, weights=values, minlength=count) / sizes
+        deviations = values - self.means[groups]
+        self.stds = np.sqrt(np.bincount(groups, weights=deviations ** 2, minlength=count) / sizes)
+        # z-score poblacional; en un grupo sin dispersión todos están en la media
+        self.z_scores = np.divide(deviations, self.stds[groups], out=np.zeros(n), where=self.stds[groups] > 0)
+
+        order = np.lexsort((values, groups))
+        sorted_groups, sorted_values = groups[order], values[order]
+        new_group = np.ones(n, dtype=bool)
+        new_group[1:] = sorted_groups[1:] != sorted_groups[:-1]
+        # Tramos de valores iguales dentro del grupo
+        new_run = new_group.copy()
+        new_run[1:] |= sorted_values[1:] != sorted_values[:-1]
+        group_start = np.flatnonzero(new_group)
+        run_start = np.flatnonzero(new_run)
+        run_size = np.diff(np.append(run_start, n))
+        group_of = np.cumsum(new_group) - 1
+        run_of = np.cumsum(new_run) - 1
+        # Rango percentil con empates a mitad: (por debajo + la mitad de los iguales) / total
+        below = run_start[run_of] - group_start[group_of]
+        self.percentiles = np.empty(n)
+        self.percentiles[order] = (below + 0.5 * run_size[run_of]) / self.counts[sorted_groups] * 100
+
+        # Cuantiles por grupo con interpolación lineal (como np.quantile) sobre el orden ya hecho
+        present = np.flatnonzero(self.counts)
+        self.quantiles = np.full((count, len(QUANTILES)), np.nan)
+        for column, q in enumerate(QUANTILES):
+            position = group_start + (q / 100) * (self.counts[present] - 1)
+            low = np.floor(position).astype(np.int64)
+            high = np.ceil(position).astype(np.int64)
+            fraction = position - low
+            self.quantiles[present, column] = sorted_values[low] + (sorted_values[high] - sorted_values[low]) * fraction
+
+    def group_summary(self, group: int) -> Optional[dict]:
+        if not self.counts[group]:
+            return None
+        summary = {
+            "mean": round(float(self.means[group]), 4),
+            "std": round(float(self.stds[group]), 4),
+        }
+        for column, q in enumerate(QUANTILES):
+            summary[f"p{q}"] = round(float(self.quantiles[group, column]), 4)
+        return summary
+
+
+def _scope_groups(snapshot: StatsSnapshot, scope: str):
+    if scope == "league":
+        return np.zeros(snapshot.size, dtype=np.int64), [None]
+    keys = snapshot.region_codes if scope == "region" else snapshot.team_ids
+    codes, groups = np.unique(keys, return_inverse=True)
+    if scope == "region":
+        labels = [snapshot.regions[c] if c >= 0 else None for c in codes.tolist()]
+    else:
+        labels = [c if c >= 0 else None for c in codes.tolist()]
+    return groups.astype(np.int64), labels
+
+
+# Se calcula la primera vez que se pide y se reutiliza hasta la siguiente escritura
+def get_distribution(snapshot: StatsSnapshot, scope: str, metric: str):
+    if scope not in SCOPES:
+        raise ValueError(f"Ámbito '{scope}' no válido; opciones: {', '.join(SCOPES)}")
+
+    def compute():
+        groups, labels = _scope_groups(snapshot, scope)
+        values = snapshot.player_metric(metric).astype(np.float64)
+        return Distribution(values, groups, labels), groups
+
+    return snapshot.memo(("distribution", scope, metric), compute)
+
+
+def _metric_entry(snapshot: StatsSnapshot, scope: str, metric: str, i: int) -> dict:
+    distribution, groups = get_distribution(snapshot, scope, metric)
+    value = snapshot.player_metric(metric)[i]
+    return {
+        "value": round(float(value), 4) if metric == "kd" else int(value),
+        "percentile": round(float(distribution.percentiles[i]), 2),
+        "z": round(float(distribution.z_scores[i]), 4),
+        "group_size": int(distribution.counts[groups[i]]),
+    }
+
+
+def player_percentiles(snapshot: StatsSnapshot, player_id: int) -> Optional[dict]:
+    i = snapshot.index_of(player_id)
+    if i is None:
+        return None
+    result = {
+        "player_id": player_id,
+        "gamertag": snapshot.players["gamertags"][i],
+        "team_id": snapshot.team_id_at(i),
+        "region": snapshot.region_at(i),
+    }
+    scopes = result["scopes"] = {}
+    for scope in SCOPES:
+        # Sin equipo no hay región ni equipo con los que comparar
+        if scope != "league" and result["team_id"] is None:
+            scopes[scope] = None
+            continue
+        scopes[scope] = {metric: _metric_entry(snapshot, scope, metric, i) for metric in PLAYER_METRICS}
+    return result
+
+
+def distribution_report(snapshot: StatsSnapshot, scope: str, metrics: List[str], include_players: bool = False,
+                        limit: int = 100, offset: int = 0) -> dict:
+    first, first_groups = get_distribution(snapshot, scope, metrics[0])
+    key = "region" if scope == "region" else "team_id"
+    groups = []
+    for group, label in enumerate(first.labels):
+        entry = {} if scope == "league" else {key: label}
+        entry["players"] = int(first.counts[group])
+        for metric in metrics:
+            entry[metric] = get_distribution(snapshot, scope, metric)[0].group_summary(group)
+        groups.append(entry)
+    report = {"scope": scope, "quantiles": list(QUANTILES), "groups": groups}
+
+    if include_players:
+        items = []
+        for i in range(offset, min(offset + limit, snapshot.size)):
+            item = {"id": int(snapshot.ids[i]), "gamertag": snapshot.players["gamertags"][i]}
+            if scope != "league":
+                item[key] = first.labels[first_groups[i]]
+            for metric in metrics:
+                entry = _metric_entry(snapshot, scope, metric, i)
+                item[metric] = {k: entry[k] for k in ("value", "percentile", "z")}
+            items.append(item)
+        report["players"] = items
+        report["next_offset"] = offset + limit if offset + limit < snapshot.size else None
+    return report
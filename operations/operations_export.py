@@ -0,0 +1,88 @@
+# operations_export.py
+import csv
+import io
+import json
+import zlib
+from typing import Dict, Iterator
+
+from sqlalchemy import func, select
+from sqlalchemy.engine import Engine
+
+from data.models_player import Player, DeletedPlayer
+from data.models_team import Team, DeletedTeam
+
+EXPORT_BATCH_SIZE = 1000
+
+# Mismas columnas que leen load_from_csv.py (players_real.csv / teams_real.csv)
+PLAYER_CSV_COLUMNS = ["name", "gamertag", "kills", "deaths", "team_name", "image_url"]
+TEAM_CSV_COLUMNS = ["name", "region", "championships", "image_url"]
+
+
+def _player_query(model):
+    team_name = Team.name
+    query = select(
+        model.id, model.name, model.gamertag, model.kills, model.deaths, model.team_id,
+    )
+    if model is DeletedPlayer:
+        # El equipo de un jugador del historial puede estar también en el historial
+        team_name = func.coalesce(Team.name, DeletedTeam.name)
+        query = query.outerjoin(DeletedTeam, DeletedTeam.id == model.team_id)
+    return (
+        query.add_columns(team_name.label("team_name"), model.image_url)
+        .outerjoin(Team, Team.id == model.team_id)
+        .order_by(model.id)
+    )
+
+
+def _team_query(model):
+    return select(model.id, model.name, model.region, model.championships, model.image_url).order_by(model.id)
+
+
+# tipo de exportación -> (consulta, columnas CSV)
+EXPORTS: Dict[str, tuple] = {
+    "players": (lambda: _player_query(Player), PLAYER_CSV_COLUMNS),
+    "deleted-players": (lambda: _player_query(DeletedPlayer), PLAYER_CSV_COLUMNS),
+    "teams": (lambda: _team_query(Team), TEAM_CSV_COLUMNS),
+    "deleted-teams": (lambda: _team_query(DeletedTeam), TEAM_CSV_COLUMNS),
+}
+
+
+# Cursor del lado del servidor: la memoria depende del tamaño del lote, no de la tabla.
+# Con as_mappings=False se entregan tuplas (más baratas para construir columnas).
+def iter_export_batches(engine: Engine, kind: str, batch_size: int = EXPORT_BATCH_SIZE,
+                        as_mappings: bool = True) -> Iterator[list]:
+    build_query, _ = EXPORTS[kind]
+    with engine.connect() as conn:
+        result = conn.execution_options(stream_results=True, yield_per=batch_size).execute(build_query())
+        if as_mappings:
+            result = result.mappings()
+        for partition in result.partitions():
+            yield partition
+
+
+def stream_csv(engine: Engine, kind: str, batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[bytes]:
+    _, columns = EXPORTS[kind]
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=columns, extrasaction="ignore", lineterminator="\n")
+    writer.writeheader()
+    for batch in iter_export_batches(engine, kind, batch_size):
+        writer.writerows(batch)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+def stream_ndjson(engine: Engine, kind: str, batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[bytes]:
+    for batch in iter_export_batches(engine, kind, batch_size):
+        yield "".join(json.dumps(dict(row), ensure_ascii=False) + "\n" for row in batch).encode("utf-8")
+
+
+def gzip_stream(chunks: Iterator[bytes], level: int = 6) -> Iterator[bytes]:
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits=31 -> formato gzip
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
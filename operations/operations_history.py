@@ -0,0 +1,256 @@
+# operations_history.py
+import csv
+import gzip
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from sqlalchemy import text, tuple_
+from sqlalchemy.engine import Engine
+from sqlalchemy.schema import CreateColumn
+from sqlmodel import Session, select
+
+from data.models_player import DeletedPlayer
+from data.models_team import DeletedTeam
+
+# Días que se conserva el historial (0 = para siempre)
+HISTORY_RETENTION_DAYS = int(os.getenv("HISTORY_RETENTION_DAYS", "0"))
+# purge: se borra | archive: se vuelca a CSV comprimido en HISTORY_ARCHIVE_DIR y luego se borra
+HISTORY_RETENTION_MODE = os.getenv("HISTORY_RETENTION_MODE", "archive").lower()
+HISTORY_ARCHIVE_DIR = Path(os.getenv(
+    "HISTORY_ARCHIVE_DIR", Path(__file__).resolve().parent.parent / "history_archive"))
+# Particiones mensuales que se crean por adelantado
+HISTORY_MONTHS_AHEAD = 2
+HISTORY_PAGE_SIZE = 100
+HISTORY_MAX_PAGE_SIZE = 1000
+
+HISTORY_MODELS = {"deletedplayer": DeletedPlayer, "deletedteam": DeletedTeam}
+
+
+def _month_start(moment: datetime) -> datetime:
+    return datetime(moment.year, moment.month, 1)
+
+
+def _next_month(moment: datetime) -> datetime:
+    return datetime(moment.year + moment.month // 12, moment.month % 12 + 1, 1)
+
+
+def _partition_name(table: str, month: datetime) -> str:
+    return f"{table}_p{month:%Y%m}"
+
+
+# deletedplayer_p202405 -> (2024-05-01, 2024-06-01); None para la partición por defecto
+def _partition_bounds(table: str, name: str) -> Optional[Tuple[datetime, datetime]]:
+    suffix = name[len(table) + 2:]
+    if not suffix.isdigit() or len(suffix) != 6:
+        return None
+    start = datetime(int(suffix[:4]), int(suffix[4:]), 1)
+    return start, _next_month(start)
+
+
+# ---------------------- PARTICIONADO (POSTGRESQL) ----------------------
+
+def _is_partitioned(conn, table: str) -> Optional[bool]:
+    relkind = conn.execute(
+        text("SELECT relkind FROM pg_class WHERE oid = to_regclass(:table)"), {"table": table}
+    ).scalar()
+    if relkind is None:
+        return None
+    return relkind == "p"
+
+
+def list_partitions(conn, table: str) -> List[str]:
+    return conn.execute(text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = to_regclass(:table) ORDER BY c.relname"
+    ), {"table": table}).scalars().all()
+
+
+def _create_month_partition(conn, table: str, month: datetime):
+    conn.execute(text(
+        f"CREATE TABLE IF NOT EXISTS {_partition_name(table, month)} PARTITION OF {table} "
+        f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{_next_month(month):%Y-%m-%d}')"
+    ))
+
+
+# Convierte una tabla de historial normal en una particionada por RANGE(deleted_at).
+# La clave primaria de una tabla particionada debe incluir la columna de partición: pasa
+# a ser (id, deleted_at). Para el ORM el id sigue identificando la fila.
+def _convert_to_partitioned(conn, table: str):
+    model = HISTORY_MODELS[table]
+    legacy = f"{table}_legacy"
+    conn.execute(text(f"LOCK TABLE {table} IN ACCESS EXCLUSIVE MODE"))
+    conn.execute(text(
+        f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS deleted_at TIMESTAMP "
+        f"NOT NULL DEFAULT (now() at time zone 'utc')"
+    ))
+    conn.execute(text(f"ALTER TABLE {table} RENAME TO {legacy}"))
+    conn.execute(text(f"ALTER TABLE {legacy} DROP CONSTRAINT IF EXISTS {table}_pkey"))
+    conn.execute(text(f"ALTER TABLE {legacy} DROP CONSTRAINT IF EXISTS {table}_team_id_fkey"))
+    for index in model.__table__.indexes:
+        conn.execute(text(f"DROP INDEX IF EXISTS {index.name}"))
+    # La secuencia de ids se conserva (reset-all hace setval sobre ella)
+    conn.execute(text(f"ALTER SEQUENCE IF EXISTS {table}_id_seq OWNED BY NONE"))
+    conn.execute(text(f"CREATE SEQUENCE IF NOT EXISTS {table}_id_seq"))
+
+    columns = []
+    for column in model.__table__.columns:
+        if column.name == "id":
+            columns.append(f"id BIGINT NOT NULL DEFAULT nextval('{table}_id_seq')")
+        else:
+            columns.append(str(CreateColumn(column).compile(dialect=conn.dialect)))
+    conn.execute(text(
+        f"CREATE TABLE {table} ({', '.join(columns)}, PRIMARY KEY (id, deleted_at)) "
+        f"PARTITION BY RANGE (deleted_at)"
+    ))
+    conn.execute(text(f"ALTER SEQUENCE {table}_id_seq OWNED BY {table}.id"))
+
+    months = conn.execute(text(
+        f"SELECT DISTINCT date_trunc('month', deleted_at) FROM {legacy}"
+    )).scalars().all()
+    for month in months:
+        _create_month_partition(conn, table, month)
+    _ensure_month_partitions(conn, table)
+
+    names = ", ".join(c.name for c in model.__table__.columns)
+    conn.execute(text(f"INSERT INTO {table} ({names}) SELECT {names} FROM {legacy}"))
+    conn.execute(text(f"DROP TABLE {legacy}"))
+    # Los índices del padre se crean también en cada partición
+    for index in model.__table__.indexes:
+        index.create(conn)
+
+
+def _ensure_month_partitions(conn, table: str, months_ahead: int = HISTORY_MONTHS_AHEAD):
+    month = _month_start(datetime.utcnow())
+    for _ in range(months_ahead + 1):
+        _create_month_partition(conn, table, month)
+        month = _next_month(month)
+    # Red de seguridad para fechas fuera de rango (relojes desfasados, cargas antiguas)
+    conn.execute(text(f"CREATE TABLE IF NOT EXISTS {table}_pdefault PARTITION OF {table} DEFAULT"))
+
+
+def ensure_history_partitioning(engine: Engine):
+    if engine.dialect.name != "postgresql":
+        return
+    for table in HISTORY_MODELS:
+        with engine.begin() as conn:
+            conn.execute(text("SELECT pg_advisory_xact_lock(hashtext('halo_history_partitions'))"))
+            partitioned = _is_partitioned(conn, table)
+            if partitioned is False:
+                print(f"Convirtiendo {table} en tabla particionada por mes")
+                _convert_to_partitioned(conn, table)
+            elif partitioned:
+                _ensure_month_partitions(conn, table)
+
+
+# ---------------------- RETENCIÓN ----------------------
+
+# Vuelca a CSV comprimido las filas de source (la tabla o una de sus particiones)
+def _archive_rows(conn, table: str, source: str, where: str, params: dict, path: Path) -> int:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    columns = [c.name for c in HISTORY_MODELS[table].__table__.columns]
+    query = text(f"SELECT {', '.join(columns)} FROM {source} WHERE {where} ORDER BY deleted_at, id")
+    # Las opciones van en la sentencia: en la conexión quedarían fijadas para el resto de la transacción
+    result = conn.execute(query.execution_options(stream_results=True), params)
+    rows = 0
+    tmp_path = path.with_suffix(path.suffix + ".tmp")
+    with gzip.open(tmp_path, "wt", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(columns)
+        for partition in result.partitions(1000):
+            writer.writerows(partition)
+            rows += len(partition)
+    if rows:
+        os.replace(tmp_path, path)
+    else:
+        tmp_path.unlink()
+    return rows
+
+
+# Las particiones enteras anteriores al corte se eliminan con DROP (sin DELETE ni VACUUM);
+# solo las filas del mes frontera (y de la partición por defecto) se borran fila a fila.
+def apply_retention(engine: Engine, days: int = HISTORY_RETENTION_DAYS, mode: str = HISTORY_RETENTION_MODE,
+                    archive_dir: Path = HISTORY_ARCHIVE_DIR) -> dict:
+    if days <= 0:
+        return {"retention_days": days, "tables": {}}
+    if mode not in ("purge", "archive"):
+        raise ValueError(f"Modo de retención '{mode}' no soportado")
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    stamp = datetime.utcnow().strftime("%Y%m%dT%H%M%SZ")
+    report = {}
+    for table in HISTORY_MODELS:
+        dropped, deleted, archived = [], 0, 0
+        with engine.begin() as conn:
+            partitions = list_partitions(conn, table) if engine.dialect.name == "postgresql" else []
+            for name in partitions:
+                bounds = _partition_bounds(table, name)
+                if bounds is None or bounds[1] > cutoff:
+                    continue
+                if mode == "archive":
+                    archived += _archive_rows(conn, table, name, "TRUE", {}, archive_dir / table / f"{name}.csv.gz")
+                conn.execute(text(f"DROP TABLE {name}"))
+                dropped.append(name)
+            if mode == "archive":
+                archived += _archive_rows(conn, table, table, "deleted_at < :cutoff", {"cutoff": cutoff},
+                                          archive_dir / table / f"{table}_{stamp}.csv.gz")
+            deleted = conn.execute(
+                text(f"DELETE FROM {table} WHERE deleted_at < :cutoff"), {"cutoff": cutoff}
+            ).rowcount
+        report[table] = {"dropped_partitions": dropped, "deleted_rows": deleted, "archived_rows": archived}
+    return {"retention_days": days, "mode": mode, "cutoff": cutoff.isoformat(), "tables": report}
+
+
+# ---------------------- CONSULTA PAGINADA ----------------------
+
+# Más recientes primero; el índice (deleted_at, id) sirve para el orden.
+# after=(deleted_at, id) de la última fila vista: paginación por clave, estable aunque
+# se restauren o borren filas de páginas anteriores (con offset se saltarían filas)
+def get_history_page(session: Session, model, limit: int = HISTORY_PAGE_SIZE, offset: int = 0,
+                     after: Optional[Tuple[datetime, int]] = None):
+    query = select(model).order_by(model.deleted_at.desc(), model.id.desc())
+    if after is not None:
+        query = query.where(tuple_(model.deleted_at, model.id) < tuple_(*after))
+    rows = session.exec(query.limit(limit + 1).offset(offset)).all()
+    return rows[:limit], len(rows) > limit
+
+# Cursor de texto para las URLs: "<deleted_at ISO>,<id>"
+def history_cursor(row) -> str:
+    return f"{row.deleted_at.isoformat()},{row.id}"
+
+def parse_history_cursor(cursor: Optional[str]) -> Optional[Tuple[datetime, int]]:
+    if not cursor:
+        return None
+    try:
+        deleted_at, row_id = cursor.rsplit(",", 1)
+        return datetime.fromisoformat(deleted_at), int(row_id)
+    except ValueError:
+        raise ValueError("Cursor de historial inválido")
+
+
+# ---------------------- MANTENIMIENTO PERIÓDICO ----------------------
+
+_maintenance = {}
+
+
+# Una vez al día: crea las particiones de los próximos meses y aplica la retención
+def start_history_maintenance(engine: Engine, interval_hours: float = 24):
+    if "thread" in _maintenance:
+        return
+
+    def loop():
+        while True:
+            time.sleep(interval_hours * 3600)
+            try:
+                ensure_history_partitioning(engine)
+                info = apply_retention(engine)
+                if info["tables"]:
+                    print(f"Retención del historial aplicada: {info['tables']}")
+            except Exception as e:
+                print(f"ERROR: Falló el mantenimiento del historial: {e}")
+
+    thread = threading.Thread(target=loop, name="history-maintenance", daemon=True)
+    thread.start()
+    _maintenance["thread"] = thread
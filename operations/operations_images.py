@@ -0,0 +1,55 @@
+# operations_images.py
+from typing import Optional, Tuple
+
+from sqlalchemy import exists, or_, update
+from sqlalchemy.engine import Engine
+from sqlmodel import Session, SQLModel, select
+
+from data.models_player import Player, DeletedPlayer
+from data.models_team import Team, DeletedTeam
+from utils.storage import upload_queue
+
+IMAGE_MODELS = (Player, Team, DeletedPlayer, DeletedTeam)
+MODELS_BY_TABLE = {model.__tablename__: model for model in IMAGE_MODELS}
+
+
+def _image_referenced(session: Session, local_url: str) -> bool:
+    return session.scalar(select(or_(*(exists().where(model.image_url == local_url) for model in IMAGE_MODELS))))
+
+
+# Cuando una imagen termina de subirse, la fila que la guardó pasa a la URL remota (solo si
+# sigue apuntando a esa copia local). Se hace con la sesión del ORM para que el bus de cambios
+# invalide las cachés. Devuelve True si ninguna fila apunta ya a la copia local.
+def rewrite_image_url(engine: Engine, local_url: str, remote_url: str,
+                      target: Optional[Tuple[str, int]]) -> bool:
+    with Session(engine) as session:
+        if target is not None:
+            model = MODELS_BY_TABLE[target[0]]
+            session.execute(
+                update(model).where(model.id == target[1], model.image_url == local_url).values(image_url=remote_url)
+            )
+            session.commit()
+        return not _image_referenced(session, local_url)
+
+
+# Llamar después del commit: si la subida terminara antes, la fila aún no existiría
+def offload_image(row: SQLModel) -> bool:
+    return upload_queue.enqueue(row.image_url, (row.__tablename__, row.id))
+
+
+# Imágenes que siguen en static/ (subidas interrumpidas por un reinicio o fallidas), fila a fila
+def enqueue_pending_images(engine: Engine) -> int:
+    if not upload_queue.enabled:
+        return 0
+    queued = 0
+    with engine.connect() as conn:
+        for model in IMAGE_MODELS:
+            rows = conn.execute(select(model.id, model.image_url).where(model.image_url.like("/static/%")))
+            queued += sum(upload_queue.enqueue(url, (model.__tablename__, row_id)) for row_id, url in rows)
+    return queued
+
+
+def start_image_offload(engine: Engine) -> int:
+    upload_queue.on_uploaded = lambda local_url, remote_url, target: rewrite_image_url(
+        engine, local_url, remote_url, target)
+    return enqueue_pending_images(engine)
@@ -0,0 +1,150 @@
+# operations_import.py
+import csv
+from itertools import islice
+from typing import IO, Dict, Iterator, List, Optional, Set, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy import insert
+from sqlmodel import Session, select
+
+from data.models_player import Player, PlayerCreate
+from data.models_team import Team, TeamCreate
+
+IMPORT_CHUNK_SIZE = 1000
+# Tope de errores detallados en el reporte (el resto solo se cuenta)
+MAX_REPORTED_ERRORS = 500
+
+PLAYER_REQUIRED_COLUMNS = {"name", "gamertag", "kills", "deaths"}
+TEAM_REQUIRED_COLUMNS = {"name", "region", "championships"}
+
+
+class ImportReport:
+    def __init__(self):
+        self.processed = 0
+        self.inserted = 0
+        self.skipped = 0
+        self.errors: List[dict] = []
+
+    def error(self, row: int, message: str):
+        self.skipped += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"row": row, "error": message})
+
+    def as_dict(self) -> dict:
+        return {
+            "processed": self.processed,
+            "inserted": self.inserted,
+            "skipped": self.skipped,
+            "errors": self.errors,
+            "errors_truncated": self.skipped > len(self.errors),
+        }
+
+
+def _format_validation_error(e: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(p) for p in err['loc']) or 'fila'}: {err['msg']}" for err in e.errors()
+    )
+
+
+# Lee el CSV fila a fila (el archivo subido ya está en disco/spool) y entrega
+# lotes de (número de fila, fila). Nunca se carga el archivo completo en memoria.
+def _read_chunks(text_file: IO[str], required: Set[str], chunk_size: int) -> Iterator[List[Tuple[int, dict]]]:
+    reader = csv.DictReader(text_file)
+    missing = required - set(reader.fieldnames or [])
+    if missing:
+        raise ValueError(f"Faltan columnas en el CSV: {', '.join(sorted(missing))}")
+
+    def numbered():
+        for row in reader:
+            yield reader.line_num, row
+
+    rows = numbered()
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _empty_to_none(value: Optional[str]) -> Optional[str]:
+    return value if value not in ("", None) else None
+
+
+def import_teams(text_file: IO[str], session: Session, chunk_size: int = IMPORT_CHUNK_SIZE) -> dict:
+    report = ImportReport()
+    for chunk in _read_chunks(text_file, TEAM_REQUIRED_COLUMNS, chunk_size):
+        report.processed += len(chunk)
+        names = {row["name"] for _, row in chunk}
+        # Una sola consulta por lote para detectar equipos ya existentes (mismo criterio que load_from_csv.py)
+        existing = set(session.exec(select(Team.name).where(Team.name.in_(names))).all())
+
+        values = []
+        for line, row in chunk:
+            if row["name"] in existing:
+                report.error(line, f"Equipo '{row['name']}' ya existe")
+                continue
+            try:
+                team = TeamCreate.model_validate({
+                    "name": row["name"],
+                    "region": row["region"],
+                    "championships": row["championships"],
+                    "image_url": _empty_to_none(row.get("image_url")),
+                })
+            except ValidationError as e:
+                report.error(line, _format_validation_error(e))
+                continue
+            existing.add(team.name)
+            values.append(team.model_dump())
+
+        if values:
+            session.execute(insert(Team), values)
+            session.commit()
+            report.inserted += len(values)
+    return report.as_dict()
+
+
+def import_players(text_file: IO[str], session: Session, chunk_size: int = IMPORT_CHUNK_SIZE) -> dict:
+    report = ImportReport()
+    team_ids: Dict[str, Optional[int]] = {}
+    for chunk in _read_chunks(text_file, PLAYER_REQUIRED_COLUMNS, chunk_size):
+        report.processed += len(chunk)
+        gamertags = {row["gamertag"] for _, row in chunk}
+        existing = set(session.exec(select(Player.gamertag).where(Player.gamertag.in_(gamertags))).all())
+
+        # Resolver team_name -> team_id en bloque, con caché entre lotes
+        pending = {row.get("team_name") for _, row in chunk} - set(team_ids) - {None, ""}
+        if pending:
+            found = dict(session.exec(select(Team.name, Team.id).where(Team.name.in_(pending))).all())
+            for name in pending:
+                team_ids[name] = found.get(name)
+
+        values = []
+        for line, row in chunk:
+            if row["gamertag"] in existing:
+                report.error(line, f"Jugador '{row['gamertag']}' ya existe")
+                continue
+            team_name = _empty_to_none(row.get("team_name"))
+            team_id = team_ids.get(team_name) if team_name else None
+            if team_name and team_id is None:
+                report.error(line, f"Equipo '{team_name}' no encontrado")
+                continue
+            try:
+                player = PlayerCreate.model_validate({
+                    "name": row["name"],
+                    "gamertag": row["gamertag"],
+                    "kills": row["kills"],
+                    "deaths": row["deaths"],
+                    "team_id": team_id,
+                    "image_url": _empty_to_none(row.get("image_url")),
+                })
+            except ValidationError as e:
+                report.error(line, _format_validation_error(e))
+                continue
+            existing.add(player.gamertag)
+            values.append(player.model_dump())
+
+        if values:
+            session.execute(insert(Player), values)
+            session.commit()
+            report.inserted += len(values)
+    return report.as_dict()
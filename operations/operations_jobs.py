@@ -0,0 +1,156 @@
+# operations_jobs.py
+import io
+import os
+from contextlib import contextmanager
+from typing import Callable, Optional
+
+from fastapi import HTTPException
+from sqlalchemy import event, text
+from sqlalchemy.engine import Engine
+from sqlmodel import Session
+
+from data.models_job import Job
+from operations.operations_import import import_players, import_teams
+from operations.operations_ratings import RatingsUnavailable, recompute_ratings
+from operations.operations_sync import sync_players, sync_teams
+from operations.operations_team import delete_team, restore_team
+from utils.change_bus import change_bus
+from utils.db import engine as default_engine
+from utils.jobs import JOBS_BACKEND, DatabaseJobStore, JobCancelled, JobContext, JobError, job_queue
+
+# Tablas que se vacían; match, teamrating, statsample y syncstate no tienen FK pero guardan ids de
+# equipos y jugadores: una entidad nueva que reutilice el id heredaría el rating, la serie o el
+# vínculo con la fuente CSV de la anterior
+RESET_TABLES = ("player", "team", "deletedplayer", "deletedteam", "match", "teamrating", "statsample", "syncstate")
+# Secuencias de IDs que vuelven a empezar en 1
+RESET_SEQUENCES = ("player", "team", "deletedplayer", "deletedteam", "match")
+
+IMPORTERS = {
+    "import_teams": import_teams,
+    "import_players": import_players,
+    "sync_teams": sync_teams,
+    "sync_players": sync_players,
+}
+
+_engine: Engine = default_engine
+
+# La tabla job solo se toca al encolar o reclamar, no al importar el módulo
+if JOBS_BACKEND == "db":
+    job_queue.configure(DatabaseJobStore(default_engine, Job.__table__))
+
+
+# Vacía jugadores, equipos e historial y reinicia las secuencias de IDs en una transacción
+def reset_all_data(session: Session, on_step: Optional[Callable[[int, int], None]] = None):
+    steps = len(RESET_TABLES) + 1
+    for i, table in enumerate(RESET_TABLES):
+        if on_step is not None:
+            on_step(i, steps)
+        session.exec(text(f"DELETE FROM {table}"))
+
+    # Reiniciar secuencias de IDs en PostgreSQL
+    if on_step is not None:
+        on_step(len(RESET_TABLES), steps)
+    for table in RESET_SEQUENCES:
+        session.execute(text(f"SELECT setval('{table}_id_seq', 1, false)"))
+
+    session.commit()
+    change_bus.publish_all()
+
+
+# Las operaciones de equipo señalan con HTTPException; en un trabajo son fallos definitivos
+@contextmanager
+def _job_errors():
+    try:
+        yield
+    except HTTPException as e:
+        raise JobError(e.detail)
+
+
+# Archivo abierto en binario que informa del avance (bytes leídos) en cada lectura del buffer.
+# Es también el punto de cancelación: los lotes ya confirmados se quedan, el actual se descarta.
+class _ProgressFile(io.FileIO):
+    def __init__(self, path: str, ctx: JobContext):
+        super().__init__(path, "rb")
+        self.ctx = ctx
+        self.size = os.fstat(self.fileno()).st_size
+
+    def readinto(self, buffer):
+        read = super().readinto(buffer)
+        self.ctx.progress(self.tell(), self.size)
+        return read
+
+
+@job_queue.handler("delete_team")
+def _delete_team_job(ctx: JobContext, team_id: int):
+    ctx.progress(0, message=f"Moviendo el equipo {team_id} y sus jugadores al historial")
+    with Session(_engine) as session, _job_errors():
+        return delete_team(team_id, session)
+
+
+@job_queue.handler("restore_team")
+def _restore_team_job(ctx: JobContext, team_id: int):
+    ctx.progress(0, message=f"Restaurando el equipo {team_id} y sus jugadores")
+    with Session(_engine) as session, _job_errors():
+        return restore_team(team_id, session)
+
+
+@job_queue.handler("reset_all")
+def _reset_all_job(ctx: JobContext):
+    with Session(_engine) as session:
+        reset_all_data(session, on_step=lambda done, total: ctx.progress(done, total, f"Paso {done + 1} de {total}"))
+    return {"message": "Todos los jugadores, equipos y registros históricos eliminados. Secuencias reiniciadas."}
+
+
+# Partidos con fecha antigua: rehace los ratings desde su periodo (ver record_match)
+@job_queue.handler("recompute_ratings")
+def _recompute_ratings_job(ctx: JobContext, since: Optional[int] = None):
+    ctx.progress(0, message=f"Recalculando ratings desde el periodo {since}")
+    try:
+        return recompute_ratings(_engine, since=since)
+    except RatingsUnavailable as e:
+        raise JobError(str(e))
+
+
+def _import_job(ctx: JobContext, importer, upload: str, filename: Optional[str] = None, **options):
+    if not os.path.exists(upload):
+        raise JobError("El archivo subido ya no está disponible; vuelve a enviarlo")
+    text_file = io.TextIOWrapper(io.BufferedReader(_ProgressFile(upload, ctx)), encoding="utf-8-sig", newline="")
+    committed = []
+    try:
+        with Session(_engine) as session:
+            event.listen(session, "after_commit", lambda _session: committed.append(True))
+            return importer(text_file, session, **options)
+    except (JobError, JobCancelled):
+        raise
+    except UnicodeDecodeError:
+        raise JobError("El archivo no está codificado en UTF-8")
+    except ValueError as e:
+        raise JobError(str(e))
+    except Exception as e:
+        # Un reintento empezaría en la línea 1: los lotes ya confirmados saldrían como
+        # "ya existe" y el recuento de insertados sería falso. Solo se reintenta si no hubo commit.
+        if committed:
+            raise JobError(f"Importación interrumpida tras confirmar algunos lotes: {e}") from e
+        raise
+    finally:
+        text_file.close()
+
+
+for _kind, _importer in IMPORTERS.items():
+    job_queue.handler(_kind)(
+        lambda ctx, _importer=_importer, **params: _import_job(ctx, _importer, **params)
+    )
+
+
+# Encola la importación de un CSV subido: se copia fuera del spool de la petición
+def submit_import(kind: str, file, filename: str, **options) -> dict:
+    file.seek(0)
+    return job_queue.submit(kind, {"upload": job_queue.save_upload(file), "filename": filename, **options})
+
+
+def start_jobs(engine: Engine):
+    global _engine
+    _engine = engine
+    if JOBS_BACKEND == "db":
+        job_queue.configure(DatabaseJobStore(engine, Job.__table__))
+    job_queue.start()
@@ -0,0 +1,126 @@
+# operations_query.py
+from typing import Dict, List, Optional
+
+from sqlalchemy import select, text
+from sqlalchemy.engine import Engine
+from sqlmodel import Session
+
+from data.models_player import PLAYER_KD, Player
+from data.models_team import Team
+from data.models_match import TeamRating
+
+QUERY_DEFAULT_LIMIT = 50
+QUERY_MAX_LIMIT = 500
+
+# Campos que se pueden pedir en fields= y usar en sort=
+PLAYER_QUERY_FIELDS = {
+    "id": Player.id,
+    "name": Player.name,
+    "gamertag": Player.gamertag,
+    "kills": Player.kills,
+    "deaths": Player.deaths,
+    "kd": PLAYER_KD,
+    "team_id": Player.team_id,
+    "team_name": Team.name,
+    "region": Team.region,
+    "image_url": Player.image_url,
+}
+# Por defecto no se devuelve image_url (URLs firmadas muy largas): hay que pedirla
+PLAYER_DEFAULT_FIELDS = ["id", "name", "gamertag", "kills", "deaths", "team_id"]
+TEAM_FIELDS = {"team_name", "region"}
+
+
+def _parse_fields(fields: Optional[str]) -> List[str]:
+    if not fields:
+        return list(PLAYER_DEFAULT_FIELDS)
+    names = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in names if f not in PLAYER_QUERY_FIELDS]
+    if unknown:
+        raise ValueError(f"Campos no válidos: {', '.join(unknown)}")
+    return list(dict.fromkeys(names))
+
+
+# sort=-kills,name -> [("kills", True), ("name", False)]
+def _parse_sort(sort: Optional[str]) -> List[tuple]:
+    keys = []
+    for part in (sort or "").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        descending = part.startswith("-")
+        name = part.lstrip("+-")
+        if name not in PLAYER_QUERY_FIELDS or name == "image_url":
+            raise ValueError(f"No se puede ordenar por '{name}'")
+        keys.append((name, descending))
+    return keys
+
+
+def query_players(session: Session, filters: Dict, sort: Optional[str] = None, fields: Optional[str] = None,
+                  limit: int = QUERY_DEFAULT_LIMIT, offset: int = 0) -> dict:
+    field_names = _parse_fields(fields)
+    sort_keys = _parse_sort(sort)
+
+    query = select(*[PLAYER_QUERY_FIELDS[f].label(f) for f in field_names]).select_from(Player)
+    # El JOIN con team solo se añade si algún filtro, orden o campo lo necesita
+    needs_team = (
+        filters.get("team_name") or filters.get("region")
+        or TEAM_FIELDS.intersection(field_names)
+        or TEAM_FIELDS.intersection(name for name, _ in sort_keys)
+    )
+    if needs_team:
+        query = query.outerjoin(Team, Team.id == Player.team_id)
+
+    if filters.get("name"):
+        query = query.where(Player.name.ilike(f"%{filters['name']}%"))
+    if filters.get("gamertag"):
+        query = query.where(Player.gamertag.ilike(f"%{filters['gamertag']}%"))
+    if filters.get("team_id"):
+        query = query.where(Player.team_id.in_(filters["team_id"]))
+    if filters.get("team_name"):
+        query = query.where(Team.name.ilike(f"%{filters['team_name']}%"))
+    if filters.get("region"):
+        query = query.where(Team.region == filters["region"])
+    for column, low, high in (
+        (Player.kills, "min_kills", "max_kills"),
+        (Player.deaths, "min_deaths", "max_deaths"),
+        (PLAYER_KD, "min_kd", "max_kd"),
+    ):
+        if filters.get(low) is not None:
+            query = query.where(column >= filters[low])
+        if filters.get(high) is not None:
+            query = query.where(column <= filters[high])
+
+    order = [PLAYER_QUERY_FIELDS[name].desc() if desc else PLAYER_QUERY_FIELDS[name].asc()
+             for name, desc in sort_keys]
+    # id como desempate para que la paginación sea estable
+    if "id" not in (name for name, _ in sort_keys):
+        order.append(Player.id.asc())
+    query = query.order_by(*order)
+
+    # Se pide una fila de más para saber si hay página siguiente sin hacer COUNT(*)
+    rows = session.execute(query.limit(limit + 1).offset(offset)).mappings().all()
+    has_more = len(rows) > limit
+    return {
+        "items": [dict(row) for row in rows[:limit]],
+        "limit": limit,
+        "offset": offset,
+        "next_offset": offset + limit if has_more else None,
+    }
+
+
+# create_all no añade índices a tablas que ya existen: se crean aquí si faltan
+def ensure_query_indexes(engine: Engine):
+    for table in (Player.__table__, Team.__table__, TeamRating.__table__):
+        for index in table.indexes:
+            index.create(engine, checkfirst=True)
+    if engine.dialect.name != "postgresql":
+        return
+    # Búsquedas ILIKE '%texto%' por nombre: índice trigram si pg_trgm está disponible
+    try:
+        with engine.begin() as conn:
+            conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+            conn.execute(text(
+                "CREATE INDEX IF NOT EXISTS ix_player_name_trgm ON player USING gin (name gin_trgm_ops)"
+            ))
+    except Exception as e:
+        print(f"⚠️ No se creó el índice trigram de player.name: {e}")
@@ -0,0 +1,321 @@
+# operations_ratings.py
+import math
+import os
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import delete, insert, text
+from sqlalchemy.engine import Engine
+from sqlmodel import Session, select
+
+from data.models_match import Match, TeamRating
+from data.models_team import Team
+from utils.jobs import job_queue
+
+try:
+    import numpy as np
+except ImportError:  # numpy es opcional: sin él no se calculan ratings
+    np = None
+
+RATING_SYSTEMS = ("glicko2", "elo")
+# Sistema que devuelve /teams/ratings por defecto (se calculan ambos)
+RATING_SYSTEM = os.getenv("RATING_SYSTEM", "glicko2").lower()
+# Duración del periodo de rating: los partidos de un mismo periodo se procesan a la vez
+RATING_PERIOD_DAYS = float(os.getenv("RATING_PERIOD_DAYS", "7"))
+# Origen de la numeración de periodos (un lunes)
+RATING_EPOCH = datetime(2000, 1, 3)
+# Partidos leídos por lote al recalcular todo el historial
+RATING_CHUNK_SIZE = 10_000
+
+INITIAL_RATING = 1500.0
+ELO_K = float(os.getenv("RATING_ELO_K", "32"))
+GLICKO_INITIAL_RD = 350.0
+GLICKO_INITIAL_VOLATILITY = 0.06
+GLICKO_TAU = float(os.getenv("RATING_GLICKO_TAU", "0.5"))
+GLICKO_SCALE = 173.7178
+GLICKO_EPSILON = 1e-6
+
+
+class RatingsUnavailable(RuntimeError):
+    pass
+
+
+def _require_numpy():
+    if np is None:
+        raise RatingsUnavailable("numpy no está instalado (pip install numpy)")
+
+
+def _period_seconds() -> float:
+    return RATING_PERIOD_DAYS * 86400
+
+
+def period_of(moment: datetime) -> int:
+    return math.floor((moment - RATING_EPOCH).total_seconds() / _period_seconds())
+
+
+def period_start(period: int) -> datetime:
+    return RATING_EPOCH + timedelta(seconds=period * _period_seconds())
+
+
+# ---------------------- ESTADO EN MEMORIA ----------------------
+
+# Estado de todos los equipos en arrays alineados por un índice denso (team_index)
+class RatingState:
+    def __init__(self):
+        self.team_index: Dict[int, int] = {}
+        self.team_ids: List[int] = []
+        self.rating = np.empty(0)
+        self.rd = np.empty(0)
+        self.volatility = np.empty(0)
+        # Último periodo en el que jugó cada equipo (para inflar el RD de los inactivos)
+        self.last_period = np.empty(0, dtype=np.int64)
+
+    def indices(self, team_ids, period: int):
+        new = [t for t in dict.fromkeys(team_ids.tolist()) if t not in self.team_index]
+        if new:
+            for team_id in new:
+                self.team_index[team_id] = len(self.team_ids)
+                self.team_ids.append(team_id)
+            self.rating = np.append(self.rating, np.full(len(new), INITIAL_RATING))
+            self.rd = np.append(self.rd, np.full(len(new), GLICKO_INITIAL_RD))
+            self.volatility = np.append(self.volatility, np.full(len(new), GLICKO_INITIAL_VOLATILITY))
+            self.last_period = np.append(self.last_period, np.full(len(new), period - 1, dtype=np.int64))
+        return np.fromiter((self.team_index[t] for t in team_ids.tolist()), dtype=np.int64, count=len(team_ids))
+
+    def load(self, rows):
+        for team_id, period, rating, rd, volatility in rows:
+            i = self.indices(np.array([team_id]), period + 1)[0]
+            self.rating[i] = rating
+            self.rd[i] = GLICKO_INITIAL_RD if rd is None else rd
+            self.volatility[i] = GLICKO_INITIAL_VOLATILITY if volatility is None else volatility
+            self.last_period[i] = period
+
+
+# Un periodo: arrays de índices de equipo (a, b) y resultado de a (1, 0.5 o 0)
+def _scores(score_a, score_b):
+    return np.where(score_a > score_b, 1.0, np.where(score_a < score_b, 0.0, 0.5))
+
+
+# Elo por periodos (aproximación en lote): todos los partidos del periodo usan los ratings
+# del inicio del periodo y los cambios de cada equipo se suman. No coincide con el Elo
+# partido a partido, donde cada resultado mueve el rating antes del siguiente partido.
+def _elo_period(state: RatingState, a, b, s_a):
+    expected_a = 1 / (1 + 10 ** ((state.rating[b] - state.rating[a]) / 400))
+    change = np.zeros(len(state.rating))
+    np.add.at(change, a, ELO_K * (s_a - expected_a))
+    np.add.at(change, b, ELO_K * (expected_a - s_a))
+    state.rating = state.rating + change
+
+
+# Glicko-2 (Glickman, 2012) con todos los equipos del periodo a la vez
+def _glicko_period(state: RatingState, a, b, s_a, period: int):
+    # Los periodos sin jugar solo aumentan la incertidumbre
+    idle = np.maximum(period - state.last_period - 1, 0)
+    mu = (state.rating - INITIAL_RATING) / GLICKO_SCALE
+    phi = np.sqrt((state.rd / GLICKO_SCALE) ** 2 + idle * state.volatility ** 2)
+    sigma = state.volatility
+
+    # Cada partido cuenta para los dos equipos
+    team = np.concatenate([a, b])
+    rival = np.concatenate([b, a])
+    score = np.concatenate([s_a, 1 - s_a])
+    g = 1 / np.sqrt(1 + 3 * phi[rival] ** 2 / math.pi ** 2)
+    expected = 1 / (1 + np.exp(-g * (mu[team] - mu[rival])))
+    v_inv = np.zeros(len(mu))
+    delta_sum = np.zeros(len(mu))
+    np.add.at(v_inv, team, g ** 2 * expected * (1 - expected))
+    np.add.at(delta_sum, team, g * (score - expected))
+
+    active = np.flatnonzero(v_inv > 0)
+    v = 1 / v_inv[active]
+    delta = v * delta_sum[active]
+    new_sigma = _glicko_volatility(delta, phi[active], v, sigma[active])
+    phi_star = np.sqrt(phi[active] ** 2 + new_sigma ** 2)
+    new_phi = 1 / np.sqrt(1 / phi_star ** 2 + 1 / v)
+    new_mu = mu[active] + new_phi ** 2 * delta_sum[active]
+
+    state.rating[active] = new_mu * GLICKO_SCALE + INITIAL_RATING
+    state.rd[active] = np.minimum(new_phi * GLICKO_SCALE, GLICKO_INITIAL_RD)
+    state.volatility[active] = new_sigma
+
+
+# Nueva volatilidad por el método de Illinois, iterando todos los equipos a la vez
+def _glicko_volatility(delta, phi, v, sigma):
+    a = np.log(sigma ** 2)
+    tau2 = GLICKO_TAU ** 2
+
+    def f(x):
+        ex = np.exp(x)
+        return ex * (delta ** 2 - phi ** 2 - v - ex) / (2 * (phi ** 2 + v + ex) ** 2) - (x - a) / tau2
+
+    big = delta ** 2 > phi ** 2 + v
+    upper = np.where(big, np.log(np.maximum(delta ** 2 - phi ** 2 - v, 1e-300)), a - GLICKO_TAU)
+    pending = ~big
+    for k in range(2, 100):
+        if not pending.any():
+            break
+        pending &= f(upper) < 0
+        upper = np.where(pending, a - k * GLICKO_TAU, upper)
+
+    low, high = a, upper
+    f_low, f_high = f(low), f(high)
+    # Los equipos ya convergidos se dejan quietos (sus divisiones 0/0 se descartan)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for _ in range(100):
+            converged = np.abs(high - low) <= GLICKO_EPSILON
+            if converged.all():
+                break
+            c = low + (low - high) * f_low / (f_high - f_low)
+            f_c = f(c)
+            swap = f_c * f_high <= 0
+            low = np.where(converged, low, np.where(swap, high, low))
+            f_low = np.where(converged, f_low, np.where(swap, f_high, f_low / 2))
+            high = np.where(converged, high, c)
+            f_high = np.where(converged, f_high, f_c)
+    return np.exp(low / 2)
+
+
+# ---------------------- RECÁLCULO ----------------------
+
+# Partidos desde un periodo, leídos por lotes y agrupados por periodo completo
+def _iter_periods(conn, since: Optional[int]) -> Iterator[Tuple[int, "np.ndarray", "np.ndarray", "np.ndarray"]]:
+    query = select(Match.played_at, Match.team_a_id, Match.team_b_id, Match.score_a, Match.score_b)
+    if since is not None:
+        query = query.where(Match.played_at >= period_start(since))
+    query = query.order_by(Match.played_at, Match.id).execution_options(stream_results=True, yield_per=RATING_CHUNK_SIZE)
+
+    current, buffer = None, []
+    for chunk in conn.execute(query).partitions(RATING_CHUNK_SIZE):
+        for row in chunk:
+            period = period_of(row[0])
+            if current is not None and period != current:
+                yield _period_arrays(current, buffer)
+                buffer = []
+            current = period
+            buffer.append(row[1:])
+    if buffer:
+        yield _period_arrays(current, buffer)
+
+
+def _period_arrays(period: int, rows):
+    data = np.array(rows, dtype=np.int64)
+    return period, data[:, 0], data[:, 1], _scores(data[:, 2], data[:, 3])
+
+
+def _store_period(conn, system: str, state: RatingState, period: int, teams, counts):
+    started = period_start(period)
+    glicko = system == "glicko2"
+    conn.execute(insert(TeamRating.__table__), [
+        {
+            "system": system, "team_id": state.team_ids[i], "period": period, "period_start": started,
+            "rating": float(state.rating[i]),
+            "rd": float(state.rd[i]) if glicko else None,
+            "volatility": float(state.volatility[i]) if glicko else None,
+            "matches": int(counts[i]),
+        }
+        for i in teams.tolist()
+    ])
+    state.last_period[teams] = period
+
+
+# Rehace los ratings desde el periodo `since` (None = todo el historial). Un partido nuevo
+# solo obliga a rehacer su periodo; uno con fecha antigua, desde su periodo en adelante.
+def recompute_ratings(engine: Engine, since: Optional[int] = None) -> dict:
+    _require_numpy()
+    table = TeamRating.__table__
+    report = {"since_period": since, "periods": 0, "matches": 0}
+    with engine.begin() as conn:
+        # Dos partidos registrados a la vez no rehacen el mismo periodo en paralelo
+        if engine.dialect.name == "postgresql":
+            conn.execute(text("SELECT pg_advisory_xact_lock(hashtext('halo_team_ratings'))"))
+        states = {}
+        for system in RATING_SYSTEMS:
+            if since is None:
+                conn.execute(delete(table).where(table.c.system == system))
+            else:
+                conn.execute(delete(table).where(table.c.system == system, table.c.period >= since))
+            state = states[system] = RatingState()
+            if since is not None:
+                state.load(_latest_rows(conn, system, before=since))
+
+        for period, team_a, team_b, s_a in _iter_periods(conn, since):
+            for system, state in states.items():
+                a = state.indices(team_a, period)
+                b = state.indices(team_b, period)
+                if system == "elo":
+                    _elo_period(state, a, b, s_a)
+                else:
+                    _glicko_period(state, a, b, s_a, period)
+                counts = np.bincount(np.concatenate([a, b]), minlength=len(state.team_ids))
+                _store_period(conn, system, state, period, np.flatnonzero(counts), counts)
+            report["periods"] += 1
+            report["matches"] += len(s_a)
+    return report
+
+
+def _latest_rows(conn, system: str, before: Optional[int] = None):
+    query = "SELECT DISTINCT ON (team_id) team_id, period, rating, rd, volatility FROM teamrating WHERE system = :system"
+    params = {"system": system}
+    if before is not None:
+        query += " AND period < :before"
+        params["before"] = before
+    return conn.execute(text(query + " ORDER BY team_id, period DESC"), params).all()
+
+
+# Un partido del periodo en curso rehace solo ese periodo dentro de la petición. Uno con
+# fecha antigua obliga a rehacer todo lo posterior: se encola como trabajo en segundo plano
+# y se devuelve el trabajo (None si el recálculo ya se hizo).
+def record_match(session: Session, engine: Engine, match: Match) -> Tuple[Match, Optional[dict]]:
+    _require_numpy()
+    session.add(match)
+    session.commit()
+    session.refresh(match)
+    since = period_of(match.played_at)
+    if since < period_of(datetime.utcnow()):
+        return match, job_queue.submit("recompute_ratings", {"since": since})
+    recompute_ratings(engine, since=since)
+    return match, None
+
+
+# ---------------------- CONSULTA ----------------------
+
+# Ratings vigentes de los equipos existentes; en Glicko-2 el RD de cada equipo crece con
+# los periodos cerrados sin jugar desde su último partido
+def get_current_ratings(session: Session, system: str = RATING_SYSTEM, limit: int = 100, offset: int = 0,
+                        now: Optional[datetime] = None) -> List[dict]:
+    current = period_of(now or datetime.utcnow())
+    latest = _latest_rows(session.connection(), system)
+    names = {team.id: team for team in session.exec(select(Team).where(Team.id.in_([r[0] for r in latest])))}
+    items = []
+    for team_id, period, rating, rd, volatility in latest:
+        team = names.get(team_id)
+        if team is None:
+            continue
+        item = {"team_id": team_id, "name": team.name, "region": team.region, "rating": round(rating, 2),
+                "last_period_start": period_start(period).isoformat()}
+        if system == "glicko2":
+            idle = max(current - period - 1, 0)
+            rd = min(math.sqrt((rd / GLICKO_SCALE) ** 2 + idle * volatility ** 2) * GLICKO_SCALE, GLICKO_INITIAL_RD)
+            item["rd"] = round(rd, 2)
+            item["volatility"] = round(volatility, 6)
+            # Estimación conservadora para sembrar cuadros: rating - 2 RD
+            item["conservative_rating"] = round(rating - 2 * rd, 2)
+        items.append(item)
+    key = "conservative_rating" if system == "glicko2" else "rating"
+    items.sort(key=lambda item: (-item[key], item["team_id"]))
+    for position, item in enumerate(items, start=1):
+        item["rank"] = position
+    return items[offset:offset + limit]
+
+
+def get_rating_history(session: Session, team_id: int, system: str = RATING_SYSTEM) -> List[dict]:
+    rows = session.exec(
+        select(TeamRating)
+        .where(TeamRating.system == system, TeamRating.team_id == team_id)
+        .order_by(TeamRating.period)
+    ).all()
+    return [
+        {"period_start": row.period_start.isoformat(), "rating": round(row.rating, 2),
+         "rd": None if row.rd is None else round(row.rd, 2), "matches": row.matches}
+        for row in rows
+    ]
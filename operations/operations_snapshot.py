@@ -0,0 +1,194 @@
+# operations_snapshot.py
+import os
+import shutil
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+from operations.operations_export import EXPORTS, iter_export_batches
+
+SNAPSHOT_DIR = Path(os.getenv("SNAPSHOT_DIR", Path(__file__).resolve().parent.parent / "snapshots"))
+SNAPSHOT_BATCH_SIZE = 50_000
+SNAPSHOT_FORMATS = {"parquet": ".parquet", "arrow": ".arrow"}
+# Número de snapshots que se conservan en disco (los más antiguos se borran)
+SNAPSHOT_KEEP = int(os.getenv("SNAPSHOT_KEEP", "5"))
+
+# Nombre de la tabla en la base de datos para cada tipo de exportación
+SNAPSHOT_TABLES = {
+    "players": "player",
+    "teams": "team",
+    "deleted-players": "deletedplayer",
+    "deleted-teams": "deletedteam",
+}
+
+
+class SnapshotUnavailable(RuntimeError):
+    pass
+
+
+# pyarrow es opcional: solo se necesita para exportar en formato columnar
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError:
+        raise SnapshotUnavailable("pyarrow no está instalado (pip install pyarrow)")
+    return pyarrow
+
+
+def _schema(pa, kind: str):
+    if kind in ("players", "deleted-players"):
+        return pa.schema([
+            ("id", pa.int64()), ("name", pa.string()), ("gamertag", pa.string()),
+            ("kills", pa.int64()), ("deaths", pa.int64()), ("team_id", pa.int64()),
+            ("team_name", pa.string()), ("image_url", pa.string()),
+        ])
+    return pa.schema([
+        ("id", pa.int64()), ("name", pa.string()), ("region", pa.string()),
+        ("championships", pa.int64()), ("image_url", pa.string()),
+    ])
+
+
+# Escribe una tabla lote a lote: cada lote de filas se transpone a columnas y se
+# convierte en un RecordBatch, así nunca se tiene la tabla entera en memoria.
+def write_table(engine: Engine, kind: str, path: Path, fmt: str = "parquet",
+                batch_size: int = SNAPSHOT_BATCH_SIZE) -> int:
+    pa = _pyarrow()
+    schema = _schema(pa, kind)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(path.suffix + ".tmp")
+
+    if fmt == "parquet":
+        writer = pa.parquet.ParquetWriter(str(tmp_path), schema, compression="zstd")
+    else:
+        # Arrow IPC sin compresión: se puede abrir con memory-mapping sin copiar a RAM
+        writer = pa.ipc.new_file(str(tmp_path), schema)
+
+    rows = 0
+    try:
+        for batch in iter_export_batches(engine, kind, batch_size, as_mappings=False):
+            columns = [pa.array(col, type=field.type) for col, field in zip(zip(*batch), schema)]
+            writer.write_batch(pa.RecordBatch.from_arrays(columns, schema=schema))
+            rows += len(batch)
+    finally:
+        writer.close()
+    os.replace(tmp_path, path)
+    return rows
+
+
+def create_snapshot(engine: Engine, fmt: str = "parquet", base_dir: Path = SNAPSHOT_DIR) -> dict:
+    if fmt not in SNAPSHOT_FORMATS:
+        raise ValueError(f"Formato '{fmt}' no soportado")
+    _pyarrow()
+    # Milisegundos + sufijo aleatorio: dos workers en el mismo segundo no comparten directorio.
+    # El prefijo de fecha mantiene el orden cronológico por nombre (_prune, list_snapshots).
+    now = datetime.now(timezone.utc)
+    name = f"{now.strftime('%Y%m%dT%H%M%S')}.{now.microsecond // 1000:03d}Z-{uuid.uuid4().hex[:8]}"
+    target = base_dir / name
+    started = time.perf_counter()
+    tables = {}
+    for kind, table in SNAPSHOT_TABLES.items():
+        path = target / f"{table}{SNAPSHOT_FORMATS[fmt]}"
+        tables[table] = {"rows": write_table(engine, kind, path, fmt), "file": str(path)}
+    _prune(base_dir)
+    return {
+        "snapshot": name,
+        "format": fmt,
+        "tables": tables,
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+
+
+def _prune(base_dir: Path, keep: int = SNAPSHOT_KEEP):
+    snapshots = sorted(p for p in base_dir.iterdir() if p.is_dir())
+    for old in snapshots[:-keep] if keep > 0 else []:
+        shutil.rmtree(old, ignore_errors=True)
+
+
+def _snapshot_time(name: str) -> Optional[datetime]:
+    try:
+        return datetime.strptime(name[:15], "%Y%m%dT%H%M%S").replace(tzinfo=timezone.utc)
+    except ValueError:
+        return None
+
+
+# Fecha del snapshot más reciente en disco (None si no hay ninguno)
+def latest_snapshot_time(base_dir: Path = SNAPSHOT_DIR) -> Optional[datetime]:
+    if not base_dir.exists():
+        return None
+    times = [t for t in (_snapshot_time(p.name) for p in base_dir.iterdir() if p.is_dir()) if t]
+    return max(times, default=None)
+
+
+def list_snapshots(base_dir: Path = SNAPSHOT_DIR) -> List[dict]:
+    if not base_dir.exists():
+        return []
+    result = []
+    for snapshot in sorted((p for p in base_dir.iterdir() if p.is_dir()), reverse=True):
+        files = {f.name: f.stat().st_size for f in snapshot.iterdir() if f.is_file() and not f.name.endswith(".tmp")}
+        result.append({"snapshot": snapshot.name, "files": files})
+    return result
+
+
+# Para analistas: abre un snapshot sin cargarlo entero en memoria.
+# Arrow IPC se mapea en memoria; Parquet se lee por columnas bajo demanda.
+def open_snapshot_table(path: str, columns: Optional[List[str]] = None):
+    pa = _pyarrow()
+    if path.endswith(".arrow"):
+        source = pa.memory_map(path, "r")
+        table = pa.ipc.open_file(source).read_all()
+        return table.select(columns) if columns else table
+    return pa.parquet.read_table(path, columns=columns, memory_map=True)
+
+
+# ---------------------- PROGRAMACIÓN PERIÓDICA ----------------------
+
+_scheduler: Dict[str, threading.Thread] = {}
+
+
+# Varios workers: el lock consultivo deja a uno solo escribir a la vez, y quien lo obtiene
+# no repite si otro worker ya dejó un snapshot en este intervalo. None = no le tocaba.
+def _scheduled_snapshot(engine: Engine, fmt: str, interval_minutes: float,
+                        base_dir: Path = SNAPSHOT_DIR) -> Optional[dict]:
+    def fresh() -> bool:
+        latest = latest_snapshot_time(base_dir)
+        # Margen del 10% para que el desfase entre workers no salte un intervalo
+        return latest is not None and datetime.now(timezone.utc) - latest < timedelta(minutes=interval_minutes * 0.9)
+
+    if engine.dialect.name != "postgresql":
+        return None if fresh() else create_snapshot(engine, fmt, base_dir)
+    with engine.connect() as conn:
+        acquired = conn.execute(text("SELECT pg_try_advisory_lock(hashtext('halo_columnar_snapshot'))")).scalar()
+        if not acquired:
+            return None
+        try:
+            return None if fresh() else create_snapshot(engine, fmt, base_dir)
+        finally:
+            conn.execute(text("SELECT pg_advisory_unlock(hashtext('halo_columnar_snapshot'))"))
+            conn.commit()
+
+
+def start_snapshot_scheduler(engine: Engine, interval_minutes: float, fmt: str = "parquet"):
+    if interval_minutes <= 0 or "thread" in _scheduler:
+        return
+
+    def loop():
+        while True:
+            time.sleep(interval_minutes * 60)
+            try:
+                info = _scheduled_snapshot(engine, fmt, interval_minutes)
+                if info is not None:
+                    print(f"Snapshot {info['snapshot']} creado en {info['seconds']} s")
+            except Exception as e:
+                print(f"ERROR: No se pudo crear el snapshot programado: {e}")
+
+    thread = threading.Thread(target=loop, name="snapshot-scheduler", daemon=True)
+    thread.start()
+    _scheduler["thread"] = thread
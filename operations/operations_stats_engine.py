@@ -0,0 +1,379 @@
+# operations_stats_engine.py
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Set
+
+from sqlalchemy import bindparam, text
+from sqlalchemy.engine import Engine
+
+from utils.change_bus import change_bus
+from utils.db import engine as default_engine
+from utils.metrics import Counter, registry
+
+try:
+    import numpy as np
+except ImportError:  # numpy es opcional: sin él los endpoints de ranking responden 501
+    np = None
+
+# Copia columnar en memoria de jugadores y equipos para rankings y agregados
+STATS_ENGINE_ENABLED = os.getenv("STATS_ENGINE_ENABLED", "true").lower() in ("1", "true", "yes")
+# Retraso máximo con el que se aplican los cambios recibidos del bus
+STATS_ENGINE_MAX_STALENESS_SECONDS = float(os.getenv("STATS_ENGINE_MAX_STALENESS_SECONDS", "2"))
+# Con más ids cambiados que esto en un lote sale más barato recargar todo
+STATS_ENGINE_FULL_RELOAD_IDS = 5000
+
+PLAYER_METRICS = ("kills", "deaths", "kd")
+TEAM_METRICS = ("kills", "deaths", "kd", "players", "championships")
+NO_TEAM = -1
+
+stats_engine_refreshes = registry.register(Counter(
+    "halo_stats_engine_refresh_total", "Actualizaciones de la copia columnar de estadísticas", ("kind",)))
+
+
+class StatsEngineUnavailable(RuntimeError):
+    pass
+
+
+def _require_numpy():
+    if np is None:
+        raise StatsEngineUnavailable("numpy no está instalado (pip install numpy)")
+
+
+# ---------------------- CARGA DESDE LA BASE DE DATOS ----------------------
+
+PLAYER_SQL = "SELECT id, name, gamertag, team_id, kills, deaths FROM player"
+TEAM_SQL = "SELECT id, name, region, championships FROM team"
+
+
+def _load_rows(conn, sql: str, ids: Optional[Iterable[int]] = None) -> list:
+    if ids is None:
+        return conn.execute(text(sql)).all()
+    query = text(f"{sql} WHERE id IN :ids").bindparams(bindparam("ids", expanding=True))
+    return conn.execute(query, {"ids": list(ids)}).all()
+
+
+def _player_columns(rows) -> dict:
+    return {
+        "ids": np.fromiter((r[0] for r in rows), dtype=np.int64, count=len(rows)),
+        "names": np.array([r[1] for r in rows], dtype=object),
+        "gamertags": np.array([r[2] for r in rows], dtype=object),
+        "team_ids": np.fromiter((NO_TEAM if r[3] is None else r[3] for r in rows), dtype=np.int64, count=len(rows)),
+        "kills": np.fromiter((r[4] or 0 for r in rows), dtype=np.int64, count=len(rows)),
+        "deaths": np.fromiter((r[5] or 0 for r in rows), dtype=np.int64, count=len(rows)),
+    }
+
+
+def _team_columns(rows) -> dict:
+    return {
+        "ids": np.fromiter((r[0] for r in rows), dtype=np.int64, count=len(rows)),
+        "names": np.array([r[1] for r in rows], dtype=object),
+        "regions": np.array([r[2] for r in rows], dtype=object),
+        "championships": np.fromiter((r[3] or 0 for r in rows), dtype=np.int64, count=len(rows)),
+    }
+
+
+# Sustituye en columns las filas de changed_ids por las de rows (las que faltan en rows se
+# borraron) y deja todo ordenado por id
+def _merge_columns(columns: dict, changed_ids: Set[int], fresh: dict) -> dict:
+    keep = ~np.isin(columns["ids"], np.fromiter(changed_ids, dtype=np.int64, count=len(changed_ids)))
+    merged = {name: np.concatenate([values[keep], fresh[name]]) for name, values in columns.items()}
+    order = np.argsort(merged["ids"], kind="stable")
+    return {name: values[order] for name, values in merged.items()}
+
+
+def _sorted(columns: dict) -> dict:
+    order = np.argsort(columns["ids"], kind="stable")
+    return {name: values[order] for name, values in columns.items()}
+
+
+# ---------------------- SNAPSHOT INMUTABLE ----------------------
+
+# Una versión completa de los datos. Las lecturas trabajan sobre la versión que tomaron;
+# los cambios construyen una nueva y se publica con una sola asignación (sin bloqueos).
+class StatsSnapshot:
+    def __init__(self, players: dict, teams: dict, version: int):
+        self.players = players
+        self.teams = teams
+        self.version = version
+        self.built_at = time.time()
+        self._memo = {}
+        self._memo_lock = threading.Lock()
+
+        self.ids = players["ids"]
+        self.kills = players["kills"]
+        self.deaths = players["deaths"]
+        self.team_ids = players["team_ids"]
+        self.kd = self.kills / np.maximum(self.deaths, 1)
+
+        # Códigos de región (índice en self.regions) por equipo y por jugador
+        self.regions: List[str] = sorted(set(teams["regions"].tolist()))
+        lookup = {region: code for code, region in enumerate(self.regions)}
+        self.team_region_codes = np.fromiter(
+            (lookup[r] for r in teams["regions"]), dtype=np.int16, count=len(teams["regions"]))
+        # Posición del equipo de cada jugador en las columnas de equipos (-1 sin equipo)
+        position = np.minimum(np.searchsorted(teams["ids"], self.team_ids), max(len(teams["ids"]) - 1, 0))
+        found = np.zeros(self.size, dtype=bool)
+        if len(teams["ids"]):
+            found = teams["ids"][position] == self.team_ids
+        self.team_positions = np.where(found, position, -1)
+        self.region_codes = np.full(self.size, -1, dtype=np.int16)
+        self.region_codes[found] = self.team_region_codes[position[found]]
+
+    @property
+    def size(self) -> int:
+        return len(self.ids)
+
+    # Resultados derivados (distribuciones, percentiles) válidos mientras esta versión esté
+    # vigente: la siguiente escritura publica otra versión y con ella se descartan
+    def memo(self, key, compute):
+        value = self._memo.get(key)
+        if value is None:
+            with self._memo_lock:
+                value = self._memo.get(key)
+                if value is None:
+                    value = self._memo[key] = compute()
+        return value
+
+    # Posición de un jugador en las columnas (los ids están ordenados)
+    def index_of(self, player_id: int) -> Optional[int]:
+        i = int(np.searchsorted(self.ids, player_id))
+        return i if i < self.size and self.ids[i] == player_id else None
+
+    def team_id_at(self, i: int) -> Optional[int]:
+        team_id = int(self.team_ids[i])
+        return None if team_id == NO_TEAM else team_id
+
+    def region_at(self, i: int) -> Optional[str]:
+        code = int(self.region_codes[i])
+        return self.regions[code] if code >= 0 else None
+
+    def region_code(self, region: str) -> int:
+        # Una región desconocida no coincide con ningún jugador
+        return self.regions.index(region) if region in self.regions else -2
+
+    def player_mask(self, region: Optional[str] = None, team_id: Optional[int] = None):
+        mask = np.ones(self.size, dtype=bool)
+        if region is not None:
+            mask &= self.region_codes == self.region_code(region)
+        if team_id is not None:
+            mask &= self.team_ids == team_id
+        return mask
+
+    def player_metric(self, metric: str):
+        if metric not in PLAYER_METRICS:
+            raise ValueError(f"Métrica '{metric}' no válida; opciones: {', '.join(PLAYER_METRICS)}")
+        return getattr(self, metric)
+
+    def _player_item(self, i: int, value) -> dict:
+        return {
+            "id": int(self.ids[i]),
+            "name": self.players["names"][i],
+            "gamertag": self.players["gamertags"][i],
+            "team_id": self.team_id_at(i),
+            "kills": int(self.kills[i]),
+            "deaths": int(self.deaths[i]),
+            "kd": round(float(self.kd[i]), 4),
+            "value": value.item(),
+        }
+
+    def top_players(self, metric: str = "kd", limit: int = 10, region: Optional[str] = None,
+                    team_id: Optional[int] = None, ascending: bool = False) -> List[dict]:
+        values = self.player_metric(metric)
+        candidates = np.flatnonzero(self.player_mask(region, team_id))
+        return [self._player_item(i, values[i]) for i in _top(candidates, values, self.ids, limit, ascending)]
+
+    # Totales por equipo: una pasada vectorizada agrupando por la posición del equipo
+    def team_totals(self) -> dict:
+        count = len(self.teams["ids"])
+        on_team = self.team_positions >= 0
+        positions = self.team_positions[on_team]
+        kills = np.zeros(count, dtype=np.int64)
+        deaths = np.zeros(count, dtype=np.int64)
+        np.add.at(kills, positions, self.kills[on_team])
+        np.add.at(deaths, positions, self.deaths[on_team])
+        return {
+            "kills": kills,
+            "deaths": deaths,
+            "kd": kills / np.maximum(deaths, 1),
+            "players": np.bincount(positions, minlength=count).astype(np.int64),
+            "championships": self.teams["championships"],
+        }
+
+    def top_teams(self, metric: str = "kd", limit: int = 10, region: Optional[str] = None,
+                  ascending: bool = False) -> List[dict]:
+        if metric not in TEAM_METRICS:
+            raise ValueError(f"Métrica '{metric}' no válida; opciones: {', '.join(TEAM_METRICS)}")
+        totals = self.team_totals()
+        values = totals[metric]
+        team_ids = self.teams["ids"]
+        mask = np.ones(len(team_ids), dtype=bool)
+        if region is not None:
+            mask &= self.team_region_codes == self.region_code(region)
+        items = []
+        for i in _top(np.flatnonzero(mask), values, team_ids, limit, ascending):
+            items.append({
+                "id": int(team_ids[i]),
+                "name": self.teams["names"][i],
+                "region": self.teams["regions"][i],
+                "championships": int(totals["championships"][i]),
+                "players": int(totals["players"][i]),
+                "kills": int(totals["kills"][i]),
+                "deaths": int(totals["deaths"][i]),
+                "kd": round(float(totals["kd"][i]), 4),
+                "value": values[i].item(),
+            })
+        return items
+
+    def summary(self, region: Optional[str] = None, team_id: Optional[int] = None) -> dict:
+        mask = self.player_mask(region, team_id)
+        count = int(mask.sum())
+        result = {"players": count}
+        for metric in PLAYER_METRICS:
+            values = self.player_metric(metric)[mask]
+            if count == 0:
+                result[metric] = None
+                continue
+            result[metric] = {
+                "mean": round(float(values.mean()), 4),
+                "median": round(float(np.median(values)), 4),
+                "min": values.min().item(),
+                "max": values.max().item(),
+            }
+            if metric != "kd":
+                result[metric]["total"] = int(values.sum())
+        return result
+
+
+# Índices de los `limit` mejores candidatos: argpartition (O(n)) y solo se ordena el
+# resultado; a igual valor gana el id menor para que el ranking sea estable
+def _top(candidates, values, ids, limit: int, ascending: bool):
+    if len(candidates) == 0 or limit <= 0:
+        return []
+    keys = values[candidates] if ascending else -values[candidates]
+    if len(candidates) > limit:
+        # Se incluyen todos los empatados con el último puesto antes de desempatar por id
+        threshold = np.partition(keys, limit - 1)[limit - 1]
+        candidates = candidates[keys <= threshold]
+        keys = keys[keys <= threshold]
+    order = np.lexsort((ids[candidates], keys))
+    return candidates[order[:limit]].tolist()
+
+
+# ---------------------- MOTOR CON ACTUALIZACIÓN INCREMENTAL ----------------------
+
+class StatsEngine:
+    def __init__(self, enabled: bool = STATS_ENGINE_ENABLED,
+                 max_staleness: float = STATS_ENGINE_MAX_STALENESS_SECONDS):
+        self.enabled = enabled
+        self.max_staleness = max_staleness
+        self.engine: Optional[Engine] = None
+        self._snapshot: Optional[StatsSnapshot] = None
+        self._pending: Dict[str, Optional[Set[int]]] = {}
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self.stats_by_kind = {"full": 0, "incremental": 0}
+
+    def _count(self, kind: str):
+        self.stats_by_kind[kind] += 1
+        with registry.lock:
+            stats_engine_refreshes.inc((kind,))
+
+    # Suscriptor del bus de cambios: solo anota; el hilo de refresco aplica en lote
+    def on_change(self, table: str, ids: Optional[List[int]] = None):
+        if table not in ("player", "team") or not self.enabled:
+            return
+        with self._lock:
+            if ids is None or self._pending.get(table, set()) is None:
+                self._pending[table] = None
+            else:
+                self._pending.setdefault(table, set()).update(i for i in ids if i is not None)
+        self._wake.set()
+
+    @property
+    def has_pending(self) -> bool:
+        return bool(self._pending)
+
+    def _full_load(self, engine: Engine) -> StatsSnapshot:
+        with engine.connect() as conn:
+            players = _sorted(_player_columns(_load_rows(conn, PLAYER_SQL)))
+            teams = _sorted(_team_columns(_load_rows(conn, TEAM_SQL)))
+        version = self._snapshot.version + 1 if self._snapshot else 1
+        self._count("full")
+        return StatsSnapshot(players, teams, version)
+
+    def refresh(self, engine: Optional[Engine] = None, full: bool = False) -> StatsSnapshot:
+        _require_numpy()
+        engine = engine or self.engine or default_engine
+        with self._refresh_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+            current = self._snapshot
+            too_many = any(ids is None or len(ids) > STATS_ENGINE_FULL_RELOAD_IDS for ids in pending.values())
+            if full or current is None or too_many:
+                self._snapshot = self._full_load(engine)
+                return self._snapshot
+            if not pending:
+                return current
+
+            players, teams = current.players, current.teams
+            with engine.connect() as conn:
+                if pending.get("player"):
+                    rows = _load_rows(conn, PLAYER_SQL, pending["player"])
+                    players = _merge_columns(players, pending["player"], _player_columns(rows))
+                if pending.get("team"):
+                    rows = _load_rows(conn, TEAM_SQL, pending["team"])
+                    teams = _merge_columns(teams, pending["team"], _team_columns(rows))
+            self._snapshot = StatsSnapshot(players, teams, current.version + 1)
+            self._count("incremental")
+            return self._snapshot
+
+    # Versión vigente. fresh=True aplica antes lo pendiente (quien acaba de escribir ve su
+    # cambio); sin hilo de refresco (tests, scripts) lo pendiente se aplica siempre al leer.
+    # Desactivado, cada llamada construye una copia desechable con la misma lógica.
+    def snapshot(self, fresh: bool = False) -> StatsSnapshot:
+        _require_numpy()
+        if not self.enabled:
+            return self._full_load(self.engine or default_engine)
+        if self._snapshot is None or (self.has_pending and (fresh or self._thread is None)):
+            return self.refresh()
+        return self._snapshot
+
+    def start(self, engine: Engine):
+        self.engine = engine
+        if not self.enabled or np is None or self._thread is not None:
+            return
+        self.refresh(engine, full=True)
+
+        def loop():
+            while True:
+                self._wake.wait()
+                # Agrupa los cambios que llegan seguidos en un solo refresco
+                time.sleep(self.max_staleness)
+                self._wake.clear()
+                try:
+                    self.refresh(engine)
+                except Exception as e:
+                    print(f"ERROR: Falló el refresco del motor de estadísticas: {e}")
+
+        self._thread = threading.Thread(target=loop, name="stats-engine", daemon=True)
+        self._thread.start()
+
+    def status(self) -> dict:
+        snapshot = self._snapshot
+        return {
+            "enabled": self.enabled,
+            "numpy": np is not None,
+            "version": snapshot.version if snapshot else None,
+            "players": snapshot.size if snapshot else 0,
+            "teams": len(snapshot.teams["ids"]) if snapshot else 0,
+            "age_seconds": round(time.time() - snapshot.built_at, 3) if snapshot else None,
+            "pending": {table: ("all" if ids is None else len(ids)) for table, ids in self._pending.items()},
+            "refreshes": dict(self.stats_by_kind),
+        }
+
+
+stats_engine = StatsEngine()
+change_bus.subscribe(stats_engine.on_change)
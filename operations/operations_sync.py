@@ -0,0 +1,257 @@
+# operations_sync.py
+import hashlib
+import uuid
+from datetime import datetime
+from typing import IO, Dict, List, Optional, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy import and_, delete, exists, func, insert, or_, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlmodel import Session
+
+from data.models_player import Player, PlayerCreate, DeletedPlayer
+from data.models_team import Team, TeamCreate, DeletedTeam
+from data.models_sync import SyncState
+from operations.operations_import import (
+    IMPORT_CHUNK_SIZE, PLAYER_REQUIRED_COLUMNS, TEAM_REQUIRED_COLUMNS, ImportReport,
+    _empty_to_none, _format_validation_error, _read_chunks,
+)
+
+TEAM_FIELDS = ["name", "region", "championships", "image_url"]
+PLAYER_FIELDS = ["name", "gamertag", "kills", "deaths", "team_id", "image_url"]
+
+
+class SyncReport(ImportReport):
+    def __init__(self, run_id: str):
+        super().__init__()
+        self.run_id = run_id
+        self.updated = 0
+        self.unchanged = 0
+        self.archived = 0
+        self.not_archived = 0
+
+    def as_dict(self) -> dict:
+        data = super().as_dict()
+        data.update({
+            "run_id": self.run_id,
+            "updated": self.updated,
+            "unchanged": self.unchanged,
+            "archived": self.archived,
+            "not_archived": self.not_archived,
+        })
+        return data
+
+
+# Huella de la fila de origen: solo cambia si cambia algún valor relevante
+def row_fingerprint(values: List) -> str:
+    raw = "\x1f".join("" if v is None else str(v) for v in values)
+    return hashlib.blake2b(raw.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def _upsert(session: Session, model, fields: List[str], rows: List[dict]):
+    # INSERT ... ON CONFLICT (id) DO UPDATE: las filas ya vinculadas llevan su id
+    stmt = pg_insert(model.__table__)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[model.__table__.c.id],
+        set_={f: stmt.excluded[f] for f in fields},
+    )
+    session.execute(stmt, rows)
+
+
+def _save_states(session: Session, entity: str, states: List[dict]):
+    stmt = pg_insert(SyncState.__table__)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["entity", "source_key"],
+        set_={c: stmt.excluded[c] for c in ("entity_id", "fingerprint", "last_seen_run", "synced_at")},
+    )
+    session.execute(stmt, states)
+
+
+# Aplica un lote ya validado: [(clave, valores, huella)]
+def _apply_chunk(session: Session, model, key_field: str, entity: str, fields: List[str],
+                 rows: List[Tuple[str, dict, str]], report: SyncReport, touch_unchanged: bool):
+    key_column = getattr(model, key_field)
+    keys = [key for key, _, _ in rows]
+    # Solo cuentan los estados cuya entidad sigue en la tabla con la misma clave: si se borró
+    # (historial, /reset-all) o su id lo reutiliza otra entidad, la clave se trata como nueva
+    stored: Dict[str, Tuple[int, str]] = {
+        key: (entity_id, fingerprint)
+        for key, entity_id, fingerprint in session.execute(
+            select(SyncState.source_key, SyncState.entity_id, SyncState.fingerprint)
+            .join(model, and_(model.id == SyncState.entity_id, key_column == SyncState.source_key))
+            .where(SyncState.entity == entity, SyncState.source_key.in_(keys))
+        ).all()
+    }
+    # Primera sincronización: se adoptan las entidades que ya existen con la misma clave
+    unknown = [key for key in keys if key not in stored]
+    adopted: Dict[str, int] = {}
+    if unknown:
+        for key, entity_id in session.execute(select(key_column, model.id).where(key_column.in_(unknown))).all():
+            adopted.setdefault(key, entity_id)
+
+    now = datetime.utcnow()
+    upserts, inserts, states, unchanged_keys = [], [], [], []
+    for key, values, fingerprint in rows:
+        if key in stored and stored[key][1] == fingerprint:
+            unchanged_keys.append(key)
+            continue
+        entity_id = stored[key][0] if key in stored else adopted.get(key)
+        if entity_id is None:
+            inserts.append((key, values, fingerprint))
+        else:
+            upserts.append({"id": entity_id, **values})
+            states.append({"entity": entity, "source_key": key, "entity_id": entity_id,
+                           "fingerprint": fingerprint, "last_seen_run": report.run_id, "synced_at": now})
+
+    if upserts:
+        _upsert(session, model, fields, upserts)
+        report.updated += len(upserts)
+    if inserts:
+        created = session.execute(
+            pg_insert(model.__table__).returning(model.__table__.c.id, model.__table__.c[key_field]),
+            [values for _, values, _ in inserts],
+        ).all()
+        new_ids = {key: entity_id for entity_id, key in created}
+        for key, _, fingerprint in inserts:
+            states.append({"entity": entity, "source_key": key, "entity_id": new_ids[key],
+                           "fingerprint": fingerprint, "last_seen_run": report.run_id, "synced_at": now})
+        report.inserted += len(inserts)
+    if states:
+        _save_states(session, entity, states)
+    if unchanged_keys and touch_unchanged:
+        # Solo hace falta marcar las filas intactas si luego se archivan las ausentes
+        session.execute(
+            update(SyncState)
+            .where(SyncState.entity == entity, SyncState.source_key.in_(unchanged_keys))
+            .values(last_seen_run=report.run_id)
+        )
+    report.unchanged += len(unchanged_keys)
+    session.commit()
+
+
+# Entidades vinculadas (mismo id y misma clave) que no aparecieron en esta ejecución
+def _missing_ids(model, key_column, entity: str, run_id: str):
+    return select(SyncState.entity_id).where(
+        SyncState.entity == entity,
+        or_(SyncState.last_seen_run.is_(None), SyncState.last_seen_run != run_id),
+        exists(select(model.id).where(model.id == SyncState.entity_id, key_column == SyncState.source_key)),
+    )
+
+
+def _archive(session: Session, model, history_model, key_field: str, fields: List[str], entity: str,
+             report: SyncReport, extra_filter=None):
+    key_column = getattr(model, key_field)
+    candidates = model.id.in_(_missing_ids(model, key_column, entity, report.run_id))
+    if extra_filter is not None:
+        candidates = and_(candidates, extra_filter)
+    columns = ["id"] + fields
+    # El historial está particionado y su clave es (id, deleted_at): no admite ON CONFLICT (id),
+    # así que primero se quitan las entradas antiguas de esos ids
+    session.execute(delete(history_model).where(history_model.id.in_(select(model.id).where(candidates))))
+    source = select(*[getattr(model, c) for c in columns]).where(candidates)
+    session.execute(insert(history_model.__table__).from_select(columns, source))
+    archived = session.execute(delete(model).where(candidates)).rowcount
+    report.archived += archived
+
+    # Estados de las entidades que ya no están en nuestra tabla (archivadas o borradas a mano)
+    session.execute(
+        delete(SyncState).where(
+            SyncState.entity == entity,
+            or_(SyncState.last_seen_run.is_(None), SyncState.last_seen_run != report.run_id),
+            ~exists(select(model.id).where(model.id == SyncState.entity_id, key_column == SyncState.source_key)),
+        )
+    )
+    report.not_archived += session.execute(
+        select(func.count()).select_from(SyncState).where(
+            SyncState.entity == entity,
+            or_(SyncState.last_seen_run.is_(None), SyncState.last_seen_run != report.run_id),
+        )
+    ).scalar_one()
+    session.commit()
+
+
+def sync_teams(text_file: IO[str], session: Session, archive_missing: bool = False,
+               chunk_size: int = IMPORT_CHUNK_SIZE) -> dict:
+    report = SyncReport(uuid.uuid4().hex)
+    # Nombres ya vistos en todo el archivo (no por lote): un repetido entre lotes también es error
+    seen = set()
+    for chunk in _read_chunks(text_file, TEAM_REQUIRED_COLUMNS, chunk_size):
+        report.processed += len(chunk)
+        rows = []
+        for line, row in chunk:
+            if row["name"] in seen:
+                report.error(line, f"Equipo '{row['name']}' repetido en el archivo")
+                continue
+            try:
+                team = TeamCreate.model_validate({
+                    "name": row["name"],
+                    "region": row["region"],
+                    "championships": row["championships"],
+                    "image_url": _empty_to_none(row.get("image_url")),
+                })
+            except ValidationError as e:
+                report.error(line, _format_validation_error(e))
+                continue
+            seen.add(team.name)
+            values = team.model_dump()
+            rows.append((team.name, values, row_fingerprint([values[f] for f in TEAM_FIELDS])))
+        if rows:
+            _apply_chunk(session, Team, "name", "team", TEAM_FIELDS, rows, report, archive_missing)
+
+    if archive_missing:
+        # Un equipo con jugadores (o con jugadores en el historial) no se archiva, igual que en el frontend
+        _archive(session, Team, DeletedTeam, "name", TEAM_FIELDS, "team", report,
+                 extra_filter=and_(
+                     ~exists(select(Player.id).where(Player.team_id == Team.id)),
+                     ~exists(select(DeletedPlayer.id).where(DeletedPlayer.team_id == Team.id)),
+                 ))
+    return report.as_dict()
+
+
+def sync_players(text_file: IO[str], session: Session, archive_missing: bool = False,
+                 chunk_size: int = IMPORT_CHUNK_SIZE) -> dict:
+    report = SyncReport(uuid.uuid4().hex)
+    team_ids: Dict[str, Optional[int]] = {}
+    # Gamertags ya vistos en todo el archivo (no por lote)
+    seen = set()
+    for chunk in _read_chunks(text_file, PLAYER_REQUIRED_COLUMNS, chunk_size):
+        report.processed += len(chunk)
+        pending = {row.get("team_name") for _, row in chunk} - set(team_ids) - {None, ""}
+        if pending:
+            found = dict(session.execute(select(Team.name, Team.id).where(Team.name.in_(pending))).all())
+            for name in pending:
+                team_ids[name] = found.get(name)
+
+        rows = []
+        for line, row in chunk:
+            if row["gamertag"] in seen:
+                report.error(line, f"Jugador '{row['gamertag']}' repetido en el archivo")
+                continue
+            team_name = _empty_to_none(row.get("team_name"))
+            team_id = team_ids.get(team_name) if team_name else None
+            if team_name and team_id is None:
+                report.error(line, f"Equipo '{team_name}' no encontrado")
+                continue
+            try:
+                player = PlayerCreate.model_validate({
+                    "name": row["name"],
+                    "gamertag": row["gamertag"],
+                    "kills": row["kills"],
+                    "deaths": row["deaths"],
+                    "team_id": team_id,
+                    "image_url": _empty_to_none(row.get("image_url")),
+                })
+            except ValidationError as e:
+                report.error(line, _format_validation_error(e))
+                continue
+            seen.add(player.gamertag)
+            values = player.model_dump()
+            # La huella usa team_name (dato de origen), no el id local
+            fingerprint = row_fingerprint([values[f] for f in PLAYER_FIELDS if f != "team_id"] + [team_name])
+            rows.append((player.gamertag, values, fingerprint))
+        if rows:
+            _apply_chunk(session, Player, "gamertag", "player", PLAYER_FIELDS, rows, report, archive_missing)
+
+    if archive_missing:
+        _archive(session, Player, DeletedPlayer, "gamertag", PLAYER_FIELDS, "player", report)
+    return report.as_dict()
@@ -1,6 +1,8 @@
 # operations_team.py
 from sqlmodel import Session, select
-from typing import List, Optional
+from sqlalchemy import delete, exists, func, insert
+from sqlalchemy.orm import selectinload
+from typing import List, Optional, Tuple
 from fastapi import HTTPException
 from data.models_team import Team, UpdatedTeam, DeletedTeam
 from data.models_player import DeletedPlayer, Player
@@ -9,6 +11,41 @@ from data.models_player import DeletedPlayer, Player
 def get_all_teams(session: Session) -> List[Team]:
     return session.exec(select(Team)).all()
 
+# Cada equipo con su número de jugadores en una sola consulta: el conteo se agrupa antes
+# del JOIN (recorre solo ix_player_team_id) en vez de una consulta por equipo
+def get_teams_with_player_counts(session: Session, query=None) -> List[Tuple[Team, int]]:
+    counts = (
+        select(Player.team_id, func.count().label("player_count"))
+        .where(Player.team_id.is_not(None))
+        .group_by(Player.team_id)
+        .subquery()
+    )
+    query = query if query is not None else select(Team)
+    query = query.add_columns(func.coalesce(counts.c.player_count, 0)).outerjoin(counts, counts.c.team_id == Team.id)
+    return session.execute(query.order_by(Team.id)).all()
+
+# Equipos con su plantilla en dos consultas en total: la de equipos y una de jugadores
+# (selectinload: WHERE team_id IN (...) con los ids de todos los equipos cargados)
+def get_teams_with_players(session: Session, query=None) -> List[Team]:
+    query = query if query is not None else select(Team)
+    return session.exec(query.options(selectinload(Team.players)).order_by(Team.id)).all()
+
+def team_with_roster(team: Team, player_count: bool = False) -> dict:
+    data = team.model_dump()
+    data["players"] = [player.model_dump() for player in team.players]
+    if player_count:
+        data["player_count"] = len(data["players"])
+    return data
+
+# Sondeo EXISTS: se detiene en la primera fila, no carga la plantilla entera
+def team_has_players(team_id: int, session: Session) -> bool:
+    return session.scalar(select(exists().where(Player.team_id == team_id)))
+
+def team_has_deleted_players(team_id: int, session: Session) -> bool:
+    return session.scalar(select(exists().where(DeletedPlayer.team_id == team_id)))
+
+PLAYER_COLUMNS = ["id", "name", "gamertag", "kills", "deaths", "team_id", "image_url"]
+
 # Obtener equipo por ID
 def read_team_by_id(team_id: int, session: Session) -> Optional[Team]:
     return session.get(Team, team_id)
@@ -63,13 +100,11 @@ def delete_team(team_id: int, session: Session):
     deleted_team = DeletedTeam(**team.dict())
     session.add(deleted_team)
 
-    # Buscar jugadores del equipo
-    players = session.exec(select(Player).where(Player.team_id == team_id)).all()
-
-    for player in players:
-        deleted_player = DeletedPlayer(**player.dict())
-        session.add(deleted_player)
-        session.delete(player)
+    # Mover los jugadores del equipo al historial con dos sentencias, sin cargarlos
+    if team_has_players(team_id, session):
+        roster = select(*[getattr(Player, c) for c in PLAYER_COLUMNS]).where(Player.team_id == team_id)
+        session.execute(insert(DeletedPlayer).from_select(PLAYER_COLUMNS, roster))
+        session.execute(delete(Player).where(Player.team_id == team_id))
 
     session.delete(team)
     session.commit()
@@ -90,12 +125,12 @@ def restore_team(team_id: int, session: Session):
     restored_team = Team(**deleted_team.dict())
     session.add(restored_team)
 
-    # Restaurar los jugadores con ese team_id
-    deleted_players = session.exec(select(DeletedPlayer).where(DeletedPlayer.team_id == team_id)).all()
-    for deleted_player in deleted_players:
-        restored_player = Player(**deleted_player.dict())
-        session.add(restored_player)
-        session.delete(deleted_player)
+    # Restaurar los jugadores con ese team_id (el equipo debe existir antes por la clave foránea)
+    if team_has_deleted_players(team_id, session):
+        session.flush()
+        roster = select(*[getattr(DeletedPlayer, c) for c in PLAYER_COLUMNS]).where(DeletedPlayer.team_id == team_id)
+        session.execute(insert(Player).from_select(PLAYER_COLUMNS, roster))
+        session.execute(delete(DeletedPlayer).where(DeletedPlayer.team_id == team_id))
 
     session.delete(deleted_team)
     session.commit()
@@ -0,0 +1,196 @@
+# operations_timeseries.py
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from sqlmodel import Session, select
+
+from data.models_stats import StatSample
+
+# Cada cuánto se toma una muestra de todos los jugadores y equipos (0 = desactivado)
+STATS_SNAPSHOT_MINUTES = float(os.getenv("STATS_SNAPSHOT_MINUTES", "10"))
+# Las muestras 'raw' más antiguas que esto se reducen a una por hora...
+STATS_RAW_HOURS = int(os.getenv("STATS_RAW_HOURS", "48"))
+# ...y las horarias más antiguas que esto, a una por día
+STATS_HOURLY_DAYS = int(os.getenv("STATS_HOURLY_DAYS", "90"))
+
+RESOLUTIONS = ("raw", "hour", "day")
+
+# Solo se inserta una muestra si el valor cambió respecto a la última de esa entidad:
+# los jugadores inactivos no generan filas nuevas. La subconsulta usa la clave primaria.
+_LAST_SAMPLE = """
+    LEFT JOIN LATERAL (
+        SELECT s.kills, s.deaths, s.championships, s.players FROM statsample s
+        WHERE s.entity = :entity AND s.entity_id = cur.id
+        ORDER BY s.bucket DESC LIMIT 1
+    ) last ON TRUE
+"""
+
+PLAYER_SNAPSHOT_SQL = f"""
+INSERT INTO statsample (entity, entity_id, bucket, resolution, kills, deaths)
+SELECT :entity, cur.id, :now, 'raw', cur.kills, cur.deaths
+FROM player cur {_LAST_SAMPLE}
+WHERE last.kills IS DISTINCT FROM cur.kills OR last.deaths IS DISTINCT FROM cur.deaths
+"""
+
+TEAM_SNAPSHOT_SQL = f"""
+INSERT INTO statsample (entity, entity_id, bucket, resolution, kills, deaths, championships, players)
+SELECT :entity, cur.id, :now, 'raw', cur.kills, cur.deaths, cur.championships, cur.players
+FROM (
+    SELECT t.id, t.championships,
+           COALESCE(SUM(p.kills), 0) AS kills, COALESCE(SUM(p.deaths), 0) AS deaths, COUNT(p.id) AS players
+    FROM team t LEFT JOIN player p ON p.team_id = t.id
+    GROUP BY t.id, t.championships
+) cur {_LAST_SAMPLE}
+WHERE last.kills IS DISTINCT FROM cur.kills OR last.deaths IS DISTINCT FROM cur.deaths
+   OR last.championships IS DISTINCT FROM cur.championships OR last.players IS DISTINCT FROM cur.players
+"""
+
+# Reduce las muestras de una resolución anteriores al corte a una por intervalo (la última,
+# porque los valores son acumulados) y borra las originales, en la misma transacción.
+DOWNSAMPLE_SQL = """
+INSERT INTO statsample (entity, entity_id, bucket, resolution, kills, deaths, championships, players)
+SELECT DISTINCT ON (entity, entity_id, date_trunc(:unit, bucket))
+       entity, entity_id, date_trunc(:unit, bucket), :target, kills, deaths, championships, players
+FROM statsample
+WHERE resolution = :source AND bucket < :cutoff
+ORDER BY entity, entity_id, date_trunc(:unit, bucket), bucket DESC
+ON CONFLICT (entity, entity_id, bucket, resolution) DO UPDATE
+SET kills = EXCLUDED.kills, deaths = EXCLUDED.deaths,
+    championships = EXCLUDED.championships, players = EXCLUDED.players
+"""
+
+
+def record_snapshot(engine: Engine, now: Optional[datetime] = None) -> dict:
+    now = now or datetime.utcnow()
+    with engine.begin() as conn:
+        players = conn.execute(text(PLAYER_SNAPSHOT_SQL), {"entity": "player", "now": now}).rowcount
+        teams = conn.execute(text(TEAM_SNAPSHOT_SQL), {"entity": "team", "now": now}).rowcount
+    return {"bucket": now.isoformat(), "players": players, "teams": teams}
+
+
+def _downsample(conn, source: str, target: str, unit: str, cutoff: datetime) -> int:
+    params = {"source": source, "target": target, "unit": unit, "cutoff": cutoff}
+    conn.execute(text(DOWNSAMPLE_SQL), params)
+    return conn.execute(
+        text("DELETE FROM statsample WHERE resolution = :source AND bucket < :cutoff"), params
+    ).rowcount
+
+
+# Solo se reducen intervalos ya cerrados: el corte se alinea al inicio de la hora/día
+def downsample(engine: Engine, now: Optional[datetime] = None) -> dict:
+    now = now or datetime.utcnow()
+    raw_cutoff = (now - timedelta(hours=STATS_RAW_HOURS)).replace(minute=0, second=0, microsecond=0)
+    hour_cutoff = (now - timedelta(days=STATS_HOURLY_DAYS)).replace(hour=0, minute=0, second=0, microsecond=0)
+    with engine.begin() as conn:
+        raw = _downsample(conn, "raw", "hour", "hour", raw_cutoff)
+        hourly = _downsample(conn, "hour", "day", "day", hour_cutoff)
+    return {"raw_compacted": raw, "hourly_compacted": hourly}
+
+
+def _pick_resolution(start: datetime, end: datetime) -> str:
+    span = end - start
+    if span <= timedelta(days=2):
+        return "raw"
+    if span <= timedelta(days=90):
+        return "hour"
+    return "day"
+
+
+def _truncate(moment: datetime, resolution: str) -> datetime:
+    if resolution == "hour":
+        return moment.replace(minute=0, second=0, microsecond=0)
+    if resolution == "day":
+        return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+    return moment
+
+
+# Serie de una entidad en [start, end]. Se leen todas las resoluciones almacenadas del rango
+# (los datos viejos solo existen ya reducidos) y se agrupan a la resolución pedida; con
+# 'auto' se elige según la amplitud del rango para no devolver miles de puntos.
+def get_history(session: Session, entity: str, entity_id: int, start: Optional[datetime] = None,
+                end: Optional[datetime] = None, resolution: str = "auto") -> dict:
+    end = end or datetime.utcnow()
+    start = start or end - timedelta(days=30)
+    if start > end:
+        raise ValueError("start debe ser anterior a end")
+    if resolution == "auto":
+        resolution = _pick_resolution(start, end)
+    elif resolution not in RESOLUTIONS:
+        raise ValueError(f"Resolución '{resolution}' no válida")
+
+    samples = session.exec(
+        select(StatSample)
+        .where(StatSample.entity == entity, StatSample.entity_id == entity_id,
+               StatSample.bucket >= start, StatSample.bucket <= end)
+        .order_by(StatSample.bucket)
+    ).all()
+
+    points: List[dict] = []
+    for sample in samples:
+        point = {
+            "t": _truncate(sample.bucket, resolution).isoformat(),
+            "kills": sample.kills,
+            "deaths": sample.deaths,
+            "kd": round(sample.kills / max(sample.deaths, 1), 4),
+        }
+        if entity == "team":
+            point["championships"] = sample.championships
+            point["players"] = sample.players
+        # Muestras del mismo intervalo: se queda la última (valores acumulados)
+        if points and points[-1]["t"] == point["t"]:
+            points[-1] = point
+        else:
+            points.append(point)
+    return {
+        f"{entity}_id": entity_id,
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "resolution": resolution,
+        "points": points,
+    }
+
+
+# ---------------------- PROGRAMACIÓN PERIÓDICA ----------------------
+
+_scheduler = {}
+
+
+# Varios workers: el lock consultivo los serializa, y quien lo obtiene no repite si otro ya
+# tomó una muestra 'raw' en este intervalo. None = no le tocaba.
+def _scheduled_sample(engine: Engine, interval_minutes: float, now: Optional[datetime] = None) -> Optional[dict]:
+    now = now or datetime.utcnow()
+    with engine.connect() as conn:
+        acquired = conn.execute(text("SELECT pg_try_advisory_lock(hashtext('halo_stats_snapshot'))")).scalar()
+        if not acquired:
+            return None
+        try:
+            latest = conn.execute(text("SELECT max(bucket) FROM statsample WHERE resolution = 'raw'")).scalar()
+            # Margen del 10% para que el desfase entre workers no salte un intervalo
+            if latest is not None and now - latest < timedelta(minutes=interval_minutes * 0.9):
+                return None
+            return {"snapshot": record_snapshot(engine, now), "downsample": downsample(engine, now)}
+        finally:
+            conn.execute(text("SELECT pg_advisory_unlock(hashtext('halo_stats_snapshot'))"))
+            conn.commit()
+
+
+def start_stats_scheduler(engine: Engine, interval_minutes: float = STATS_SNAPSHOT_MINUTES):
+    if interval_minutes <= 0 or engine.dialect.name != "postgresql" or "thread" in _scheduler:
+        return
+
+    def loop():
+        while True:
+            time.sleep(interval_minutes * 60)
+            try:
+                _scheduled_sample(engine, interval_minutes)
+            except Exception as e:
+                print(f"ERROR: Falló la muestra periódica de estadísticas: {e}")
+
+    thread = threading.Thread(target=loop, name="stats-snapshot", daemon=True)
+    thread.start()
+    _scheduler["thread"] = thread
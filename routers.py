@@ -1,17 +1,111 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlmodel import Session, select
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from sqlmodel import Session, SQLModel, select
 from typing import List, Optional
+from datetime import datetime
 from info_routers import router as info_router
 
-from utils.db import get_session
+from utils.db import engine, get_session
+from utils.read_replica import get_read_session, recent_write
+from utils.cache import entity_cache
+from utils.coalesce import coalesce
+from utils.jobs import job_accepted, job_queue
 from data.models_player import Player, PlayerCreate, UpdatedPlayer, DeletedPlayer
 from data.models_team import Team, TeamCreate, UpdatedTeam
 from data.models_team import DeletedTeam
-from operations.operations_team import get_deleted_teams,restore_team, delete_team
+from operations.operations_team import (
+    get_deleted_teams, restore_team, delete_team, get_teams_with_player_counts, get_teams_with_players,
+    team_with_roster,
+)
+from operations.operations_history import HISTORY_MAX_PAGE_SIZE, HISTORY_PAGE_SIZE, get_history_page
+from operations.operations_timeseries import get_history
+from operations.operations_query import QUERY_DEFAULT_LIMIT, QUERY_MAX_LIMIT, query_players
+from operations.operations_stats_engine import PLAYER_METRICS, StatsEngineUnavailable, stats_engine
+from operations.operations_distribution import distribution_report, player_percentiles
+from operations.operations_ratings import (
+    RATING_SYSTEM, RatingsUnavailable, get_current_ratings, get_rating_history, record_match,
+)
+from data.models_match import Match, MatchCreate
 
 router = APIRouter()
 router.include_router(info_router)
 
+_MISSING = object()
+
+# Lectura a través de la caché local, salvo para el cliente que acaba de escribir
+# (su sesión va al primario y la caché puede venir de una réplica atrasada)
+def _cached(session: Session, key, tags, loader):
+    if session.info.get("read_your_writes"):
+        return loader()
+    if session.info.get("replica"):
+        # Lo leído en la réplica puede ser anterior a un NOTIFY que ya vació la caché:
+        # se sirve lo que haya, pero no se guarda
+        value = entity_cache.get(key, _MISSING)
+        return loader() if value is _MISSING else value
+    return entity_cache.get_or_set(key, tags, loader)
+
+def _load_one(session: Session, model, entity_id: int):
+    obj = session.get(model, entity_id)
+    return obj.model_dump() if obj else None
+
+# Las lecturas coalescidas comparten el cuerpo ya serializado, no solo los datos
+def _json_body(data) -> bytes:
+    return JSONResponse(jsonable_encoder(data)).body
+
+def _json_response(body: bytes) -> Response:
+    return Response(content=body, media_type="application/json")
+
+MAX_BATCH_IDS = 1000
+
+class BatchIds(SQLModel):
+    ids: List[int]
+
+# Sin repetidos y en el orden pedido
+def _unique_ids(ids: List[int]) -> List[int]:
+    ids = list(dict.fromkeys(ids))
+    if len(ids) > MAX_BATCH_IDS:
+        raise HTTPException(status_code=400, detail=f"Máximo {MAX_BATCH_IDS} ids por petición")
+    return ids
+
+# ids=1,2,3 o ids=1&ids=2 -> [1, 2, 3]
+def _parse_ids(raw: List[str]) -> List[int]:
+    try:
+        return _unique_ids([int(part) for value in raw for part in value.split(",") if part.strip()])
+    except ValueError:
+        raise HTTPException(status_code=400, detail="ids debe ser una lista de enteros")
+
+# Multi-get: lo que está en la caché local se sirve de ahí y el resto se resuelve con
+# un solo SELECT ... WHERE id IN (...). Se respeta el orden pedido y se informan los ausentes.
+def _get_many(session: Session, model, table: str, ids: List[int]) -> dict:
+    use_cache = not session.info.get("read_your_writes")
+    # Filas de una réplica atrasada no se guardan (ver _cached)
+    store = use_cache and not session.info.get("replica")
+    found = {}
+    if use_cache:
+        for entity_id in ids:
+            cached = entity_cache.get((table, entity_id))
+            if cached is not None:
+                found[entity_id] = cached
+    pending = [entity_id for entity_id in ids if entity_id not in found]
+    generation = entity_cache.generation
+    if pending:
+        for obj in session.exec(select(model).where(model.id.in_(pending))).all():
+            found[obj.id] = obj.model_dump()
+            if store:
+                entity_cache.set((table, obj.id), found[obj.id], [(table, obj.id)], generation)
+    return {
+        "items": [found[entity_id] for entity_id in ids if entity_id in found],
+        "missing": [entity_id for entity_id in ids if entity_id not in found],
+    }
+
+# Historial paginado (más recientes primero); si hay más, la cabecera X-Next-Offset indica el siguiente offset
+def _history_page(session: Session, model, response: Response, limit: int, offset: int):
+    rows, has_more = get_history_page(session, model, limit, offset)
+    if has_more:
+        response.headers["X-Next-Offset"] = str(offset + limit)
+    return rows
+
 # ---------------------- PLAYERS ----------------------
 
 @router.post("/players/", response_model=Player, tags=["Players"])
@@ -33,21 +127,73 @@ def create_player(player: PlayerCreate, session: Session = Depends(get_session))
     session.refresh(db_player)
     return db_player
 
-# Obtener todos los jugadores
+# Obtener todos los jugadores (o solo los indicados con ?ids=1,2,3)
 @router.get("/players", tags=["Players"])
-def get_all_players(session: Session = Depends(get_session)):
+def get_all_players(ids: Optional[List[str]] = Query(None), session: Session = Depends(get_read_session)):
+    if ids:
+        return _get_many(session, Player, "player", _parse_ids(ids))
     players = session.exec(select(Player)).all()
     if not players:
         raise HTTPException(status_code=404, detail="No hay jugadores registrados.")
     return players
 
+# Multi-get para listas largas de ids (no caben en la URL)
+@router.post("/players/batch", tags=["Players"])
+def get_players_batch(body: BatchIds, session: Session = Depends(get_read_session)):
+    return _get_many(session, Player, "player", _unique_ids(body.ids))
+
+# Filtros combinables, orden (sort=-kills,name) y proyección (fields=id,gamertag,kd) paginados
+@router.get("/players/query", tags=["Players"])
+def query_players_endpoint(
+    name: Optional[str] = None,
+    gamertag: Optional[str] = None,
+    team_id: Optional[List[int]] = Query(None),
+    team_name: Optional[str] = None,
+    region: Optional[str] = None,
+    min_kills: Optional[int] = Query(None, ge=0),
+    max_kills: Optional[int] = Query(None, ge=0),
+    min_deaths: Optional[int] = Query(None, ge=0),
+    max_deaths: Optional[int] = Query(None, ge=0),
+    min_kd: Optional[float] = Query(None, ge=0),
+    max_kd: Optional[float] = Query(None, ge=0),
+    sort: Optional[str] = None,
+    fields: Optional[str] = None,
+    limit: int = Query(QUERY_DEFAULT_LIMIT, ge=1, le=QUERY_MAX_LIMIT),
+    offset: int = Query(0, ge=0),
+    session: Session = Depends(get_read_session),
+):
+    filters = {
+        "name": name, "gamertag": gamertag, "team_id": team_id, "team_name": team_name, "region": region,
+        "min_kills": min_kills, "max_kills": max_kills, "min_deaths": min_deaths, "max_deaths": max_deaths,
+        "min_kd": min_kd, "max_kd": max_kd,
+    }
+    try:
+        return query_players(session, filters, sort, fields, limit, offset)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 @router.get("/players/{player_id}", response_model=Player, tags=["Players"])
-def get_player_by_id(player_id: int, session: Session = Depends(get_session)):
-    player = session.get(Player, player_id)
-    if not player:
+def get_player_by_id(player_id: int, session: Session = Depends(get_read_session)):
+    player = _cached(session, ("player", player_id), [("player", player_id)],
+                     lambda: _load_one(session, Player, player_id))
+    if player is None:
         raise HTTPException(status_code=404, detail="Jugador no encontrado")
     return player
 
+# Evolución de kills/deaths (resolution=auto|raw|hour|day; por defecto los últimos 30 días)
+@router.get("/players/{player_id}/history", tags=["Players"])
+def get_player_history(
+    player_id: int,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    resolution: str = Query("auto", pattern="^(auto|raw|hour|day)$"),
+    session: Session = Depends(get_read_session),
+):
+    try:
+        return get_history(session, "player", player_id, start, end, resolution)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 @router.put("/players/{player_id}", response_model=Player, tags=["Players"])
 def update_player(player_id: int, update_data: UpdatedPlayer, session: Session = Depends(get_session)):
     player = session.get(Player, player_id)
@@ -94,9 +240,14 @@ def delete_player(player_id: int, session: Session = Depends(get_session)):
 
 #Mostrar Historial
 @router.get("/deleted-players", tags=["Players"])
-def get_deleted_players(session: Session = Depends(get_session)):
-    deleted_players = session.exec(select(DeletedPlayer)).all()
-    if not deleted_players:
+def get_deleted_players(
+    response: Response,
+    limit: int = Query(HISTORY_PAGE_SIZE, ge=1, le=HISTORY_MAX_PAGE_SIZE),
+    offset: int = Query(0, ge=0),
+    session: Session = Depends(get_read_session),
+):
+    deleted_players = _history_page(session, DeletedPlayer, response, limit, offset)
+    if not deleted_players and offset == 0:
         raise HTTPException(status_code=404, detail="No hay jugadores eliminados.")
     return deleted_players
 
@@ -135,7 +286,7 @@ def restore_player(player_id: int, session: Session = Depends(get_session)):
 
 # Filtrar jugadores por nombre
 @router.get("/players/by-name/{name}", tags=["Players"])
-def get_player_by_name(name: str, session: Session = Depends(get_session)):
+def get_player_by_name(name: str, session: Session = Depends(get_read_session)):
     players = session.exec(select(Player).where(Player.name.ilike(f"%{name}%"))).all()
     if not players:
         raise HTTPException(status_code=404, detail=f"No se encontraron jugadores con el nombre '{name}'.")
@@ -143,11 +294,15 @@ def get_player_by_name(name: str, session: Session = Depends(get_session)):
 
 # Filtrar jugadores por equipo
 @router.get("/players/by-team/{team_id}", tags=["Players"])
-def get_players_by_team(team_id: int, session: Session = Depends(get_session)):
-    players = session.exec(select(Player).where(Player.team_id == team_id)).all()
-    if not players:
-        raise HTTPException(status_code=404, detail=f"No se encontraron jugadores para el equipo con ID {team_id}.")
-    return players
+def get_players_by_team(team_id: int, session: Session = Depends(get_read_session)):
+    def load():
+        players = session.exec(select(Player).where(Player.team_id == team_id)).all()
+        if not players:
+            raise HTTPException(status_code=404, detail=f"No se encontraron jugadores para el equipo con ID {team_id}.")
+        return _json_body(players)
+
+    body = coalesce(session, "players_by_team", ("players:team", team_id), [("player", None)], load)
+    return _json_response(body)
 
 # ---------------------- TEAMS ----------------------
 
@@ -159,21 +314,128 @@ def create_team(team: TeamCreate, session: Session = Depends(get_session)):
     session.refresh(db_team)
     return db_team
 
-# Obtener todos los equipos
+# include=players (plantilla anidada), include=player_count o ambos: include=players,player_count
+TEAM_INCLUDE_PATTERN = "^(players|player_count)(,(players|player_count))*$"
+
+def _team_includes(include: Optional[str]) -> set:
+    return set(include.split(",")) if include else set()
+
+# Equipos de la consulta con lo pedido en include (plantillas: una consulta extra para todos)
+def _teams_with(session: Session, query, includes: set) -> list:
+    if "players" in includes:
+        return [team_with_roster(team, "player_count" in includes) for team in get_teams_with_players(session, query)]
+    if "player_count" in includes:
+        return [{**team.model_dump(), "player_count": count} for team, count in get_teams_with_player_counts(session, query)]
+    return session.exec(query).all()
+
+# Multi-get con plantillas: equipos y jugadores en dos consultas, en el orden pedido
+def _get_many_with_rosters(session: Session, ids: List[int], includes: set) -> dict:
+    found = {team["id"]: team for team in _teams_with(session, select(Team).where(Team.id.in_(ids)), includes)}
+    return {
+        "items": [found[team_id] for team_id in ids if team_id in found],
+        "missing": [team_id for team_id in ids if team_id not in found],
+    }
+
+# Obtener todos los equipos (o solo los indicados con ?ids=1,2,3)
 @router.get("/teams", tags=["Teams"])
-def get_all_teams(session: Session = Depends(get_session)):
-    teams = session.exec(select(Team)).all()
-    if not teams:
-        raise HTTPException(status_code=404, detail="No hay equipos registrados.")
-    return teams
+def get_all_teams(
+    ids: Optional[List[str]] = Query(None),
+    include: Optional[str] = Query(None, pattern=TEAM_INCLUDE_PATTERN),
+    session: Session = Depends(get_read_session),
+):
+    includes = _team_includes(include)
+    if ids:
+        if includes:
+            return _get_many_with_rosters(session, _parse_ids(ids), includes)
+        return _get_many(session, Team, "team", _parse_ids(ids))
+    if includes:
+        def load_with_includes():
+            teams = _teams_with(session, select(Team), includes)
+            if not teams:
+                raise HTTPException(status_code=404, detail="No hay equipos registrados.")
+            return _json_body(teams)
+
+        key = ",".join(sorted(includes))
+        tags = [("team", None), ("player", None)]
+        return _json_response(coalesce(session, f"teams_{key}", f"teams:{key}", tags, load_with_includes))
+
+    def load():
+        teams = _cached(
+            session, "teams:all", [("team", None)],
+            lambda: [team.model_dump() for team in session.exec(select(Team)).all()],
+        )
+        if not teams:
+            raise HTTPException(status_code=404, detail="No hay equipos registrados.")
+        return _json_body(teams)
+
+    return _json_response(coalesce(session, "teams", "teams:all", [("team", None)], load))
+
+@router.post("/teams/batch", tags=["Teams"])
+def get_teams_batch(
+    body: BatchIds,
+    include: Optional[str] = Query(None, pattern=TEAM_INCLUDE_PATTERN),
+    session: Session = Depends(get_read_session),
+):
+    includes = _team_includes(include)
+    if includes:
+        return _get_many_with_rosters(session, _unique_ids(body.ids), includes)
+    return _get_many(session, Team, "team", _unique_ids(body.ids))
+
+# Clasificación por rating (Glicko-2 ordena por rating - 2·RD, Elo por rating)
+@router.get("/teams/ratings", tags=["Teams"])
+def get_team_ratings(
+    system: str = Query(RATING_SYSTEM, pattern="^(glicko2|elo)$"),
+    limit: int = Query(QUERY_DEFAULT_LIMIT, ge=1, le=QUERY_MAX_LIMIT),
+    offset: int = Query(0, ge=0),
+    session: Session = Depends(get_read_session),
+):
+    return {"system": system, "items": get_current_ratings(session, system, limit, offset)}
 
 @router.get("/teams/{team_id}", response_model=Team, tags=["Teams"])
-def get_team(team_id: int, session: Session = Depends(get_session)):
-    team = session.get(Team, team_id)
-    if not team:
+def get_team(
+    team_id: int,
+    include: Optional[str] = Query(None, pattern=TEAM_INCLUDE_PATTERN),
+    session: Session = Depends(get_read_session),
+):
+    includes = _team_includes(include)
+    if includes:
+        def load_with_includes():
+            teams = _teams_with(session, select(Team).where(Team.id == team_id), includes)
+            return teams[0] if teams else None
+
+        key = ",".join(sorted(includes))
+        team = _cached(session, ("team", team_id, key), [("team", team_id), ("player", None)], load_with_includes)
+        if team is None:
+            raise HTTPException(status_code=404, detail="Equipo no encontrado")
+        # Respuesta ya serializada: response_model=Team descartaría players/player_count
+        return _json_response(_json_body(team))
+    team = _cached(session, ("team", team_id), [("team", team_id)],
+                   lambda: _load_one(session, Team, team_id))
+    if team is None:
         raise HTTPException(status_code=404, detail="Equipo no encontrado")
     return team
 
+@router.get("/teams/{team_id}/history", tags=["Teams"])
+def get_team_history(
+    team_id: int,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    resolution: str = Query("auto", pattern="^(auto|raw|hour|day)$"),
+    session: Session = Depends(get_read_session),
+):
+    try:
+        return get_history(session, "team", team_id, start, end, resolution)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/teams/{team_id}/ratings", tags=["Teams"])
+def get_team_rating_history(
+    team_id: int,
+    system: str = Query(RATING_SYSTEM, pattern="^(glicko2|elo)$"),
+    session: Session = Depends(get_read_session),
+):
+    return {"team_id": team_id, "system": system, "history": get_rating_history(session, team_id, system)}
+
 @router.put("/teams/{team_id}", response_model=Team, tags=["Teams"])
 def update_team(team_id: int, update_data: UpdatedTeam, session: Session = Depends(get_session)):
     team = session.get(Team, team_id)
@@ -187,36 +449,157 @@ def update_team(team_id: int, update_data: UpdatedTeam, session: Session = Depen
     session.refresh(team)
     return team
 
-#Eliminar Teams y mandarlos al historial
+#Eliminar Teams y mandarlos al historial (background=true: trabajo en segundo plano, ver /jobs)
 @router.delete("/teams/{team_id}", tags=["Teams"])
-def delete_teams (team_id: int, session: Session = Depends(get_session)):
+def delete_teams (team_id: int, background: bool = False, session: Session = Depends(get_session)):
+    if background:
+        return job_accepted(job_queue.submit("delete_team", {"team_id": team_id}))
     return delete_team(team_id, session)
 
 #Mostrar Teams Eliminados
 @router.get("/deleted-teams", tags=["Teams"])
-def get_deleted_teams(session: Session = Depends(get_session)):
-    deleted_teams = session.exec(select(DeletedTeam)).all()
-    if not deleted_teams:
+def get_deleted_teams(
+    response: Response,
+    limit: int = Query(HISTORY_PAGE_SIZE, ge=1, le=HISTORY_MAX_PAGE_SIZE),
+    offset: int = Query(0, ge=0),
+    session: Session = Depends(get_read_session),
+):
+    deleted_teams = _history_page(session, DeletedTeam, response, limit, offset)
+    if not deleted_teams and offset == 0:
         raise HTTPException(status_code=404, detail="No hay equipos eliminados.")
     return deleted_teams
 
 #Restaurar Teams
 @router.post("/teams/restore/{team_id}", tags=["Teams"])
-def restore_team_endpoint (team_id: int, session: Session = Depends(get_session)):
+def restore_team_endpoint (team_id: int, background: bool = False, session: Session = Depends(get_session)):
+    if background:
+        return job_accepted(job_queue.submit("restore_team", {"team_id": team_id}))
     return restore_team(team_id, session)
 
 # Filtrar equipos por nombre
 @router.get("/teams/by-name/{name}", tags=["Teams"])
-def get_teams_by_name(name: str, session: Session = Depends(get_session)):
-    teams = session.exec(select(Team).where(Team.name.ilike(f"%{name}%"))).all()
+def get_teams_by_name(
+    name: str,
+    include: Optional[str] = Query(None, pattern=TEAM_INCLUDE_PATTERN),
+    session: Session = Depends(get_read_session),
+):
+    teams = _teams_with(session, select(Team).where(Team.name.ilike(f"%{name}%")), _team_includes(include))
     if not teams:
         raise HTTPException(status_code=404, detail=f"No se encontraron equipos con el nombre '{name}'.")
     return teams
 
 # Filtrar equipos por cantidad de campeonatos
 @router.get("/teams/by-championship/{championship}", tags=["Teams"])
-def get_teams_by_championship(championship: int, session: Session = Depends(get_session)):
-    teams = session.exec(select(Team).where(Team.championships == championship)).all()
+def get_teams_by_championship(
+    championship: int,
+    include: Optional[str] = Query(None, pattern=TEAM_INCLUDE_PATTERN),
+    session: Session = Depends(get_read_session),
+):
+    teams = _teams_with(session, select(Team).where(Team.championships == championship), _team_includes(include))
     if not teams:
         raise HTTPException(status_code=404, detail=f"No se encontraron equipos con {championship} campeonatos ganados.")
     return teams
+
+
+# ---------------------- PARTIDOS ----------------------
+
+# Registra un resultado y rehace los ratings de su periodo. Si es de un periodo anterior el
+# recálculo va en segundo plano: la cabecera X-Ratings-Job apunta al trabajo (GET /jobs/{id})
+@router.post("/matches", response_model=Match, tags=["Matches"])
+def create_match(data: MatchCreate, response: Response, session: Session = Depends(get_session)):
+    for team_id in (data.team_a_id, data.team_b_id):
+        if not session.get(Team, team_id):
+            raise HTTPException(status_code=400, detail=f"El team_id {team_id} no existe")
+    match = Match(**data.model_dump(exclude_none=True))
+    try:
+        match, job = record_match(session, engine, match)
+    except RatingsUnavailable as e:
+        raise HTTPException(status_code=501, detail=str(e))
+    if job is not None:
+        response.headers["X-Ratings-Job"] = f"/jobs/{job['id']}"
+    return match
+
+@router.get("/matches", tags=["Matches"])
+def get_matches(
+    team_id: Optional[int] = None,
+    limit: int = Query(QUERY_DEFAULT_LIMIT, ge=1, le=QUERY_MAX_LIMIT),
+    offset: int = Query(0, ge=0),
+    session: Session = Depends(get_read_session),
+):
+    query = select(Match)
+    if team_id is not None:
+        query = query.where((Match.team_a_id == team_id) | (Match.team_b_id == team_id))
+    return session.exec(query.order_by(Match.played_at.desc(), Match.id.desc()).limit(limit).offset(offset)).all()
+
+# ---------------------- ESTADÍSTICAS ----------------------
+# Se responden desde la copia columnar en memoria (operations_stats_engine), sin consultar
+# la base de datos; los cambios llegan con unos segundos de retraso como mucho.
+
+LEADERBOARD_MAX_LIMIT = 100
+
+def _stats_snapshot(request: Request):
+    try:
+        return stats_engine.snapshot(fresh=recent_write(request))
+    except StatsEngineUnavailable as e:
+        raise HTTPException(status_code=501, detail=str(e))
+
+def _stats_response(snapshot, **data) -> dict:
+    return {"version": snapshot.version, "as_of": datetime.utcfromtimestamp(snapshot.built_at).isoformat(), **data}
+
+@router.get("/leaderboard/players", tags=["Stats"])
+def get_player_leaderboard(
+    request: Request,
+    metric: str = Query("kd", pattern="^(kills|deaths|kd)$"),
+    region: Optional[str] = None,
+    team_id: Optional[int] = None,
+    order: str = Query("desc", pattern="^(asc|desc)$"),
+    limit: int = Query(10, ge=1, le=LEADERBOARD_MAX_LIMIT),
+):
+    snapshot = _stats_snapshot(request)
+    items = snapshot.top_players(metric, limit, region, team_id, ascending=order == "asc")
+    return _stats_response(snapshot, metric=metric, items=items)
+
+@router.get("/leaderboard/teams", tags=["Stats"])
+def get_team_leaderboard(
+    request: Request,
+    metric: str = Query("kd", pattern="^(kills|deaths|kd|players|championships)$"),
+    region: Optional[str] = None,
+    order: str = Query("desc", pattern="^(asc|desc)$"),
+    limit: int = Query(10, ge=1, le=LEADERBOARD_MAX_LIMIT),
+):
+    snapshot = _stats_snapshot(request)
+    items = snapshot.top_teams(metric, limit, region, ascending=order == "asc")
+    return _stats_response(snapshot, metric=metric, items=items)
+
+# Recuento, media, mediana, mínimo y máximo de kills, deaths y K/D
+@router.get("/stats/summary", tags=["Stats"])
+def get_stats_summary(request: Request, region: Optional[str] = None, team_id: Optional[int] = None):
+    snapshot = _stats_snapshot(request)
+    return _stats_response(snapshot, region=region, team_id=team_id, **snapshot.summary(region, team_id))
+
+# Rango percentil y z-score de kills, deaths y K/D frente a la liga, su región y su equipo
+@router.get("/players/{player_id}/percentiles", tags=["Stats"])
+def get_player_percentiles(player_id: int, request: Request):
+    snapshot = _stats_snapshot(request)
+    result = player_percentiles(snapshot, player_id)
+    if result is None:
+        raise HTTPException(status_code=404, detail="Jugador no encontrado")
+    return _stats_response(snapshot, **result)
+
+# Media, desviación y cuantiles por grupo del ámbito; con players=true, también el
+# percentil y z-score de cada jugador (paginado)
+@router.get("/stats/distribution", tags=["Stats"])
+def get_stats_distribution(
+    request: Request,
+    scope: str = Query("league", pattern="^(league|region|team)$"),
+    metric: Optional[List[str]] = Query(None),
+    players: bool = False,
+    limit: int = Query(QUERY_DEFAULT_LIMIT, ge=1, le=QUERY_MAX_LIMIT),
+    offset: int = Query(0, ge=0),
+):
+    metrics = metric or list(PLAYER_METRICS)
+    invalid = [m for m in metrics if m not in PLAYER_METRICS]
+    if invalid:
+        raise HTTPException(status_code=400, detail=f"Métrica no válida: {', '.join(invalid)}")
+    snapshot = _stats_snapshot(request)
+    return _stats_response(snapshot, **distribution_report(snapshot, scope, metrics, players, limit, offset))
@@ -0,0 +1,119 @@
+// Intercambio de fragmentos HTML en el sitio (misma convención que HTMX, sin dependencias).
+// Los formularios con data-swap se envían con fetch y la cabecera HX-Request; el servidor
+// responde solo con las filas afectadas en vez de redirigir a la lista completa:
+//   data-swap="remove" -> se quita la fila del formulario (eliminar, restaurar)
+//   data-swap="row"    -> la fila se sustituye por la respuesta (editar en línea)
+//   data-swap="rows"   -> el contenido de data-target se sustituye por la respuesta (búsqueda)
+// Las filas tr.load-more[data-next] cargan la página siguiente al hacerse visibles.
+(function () {
+    "use strict";
+
+    const HEADERS = { "HX-Request": "true" };
+
+    function toNodes(html) {
+        const template = document.createElement("template");
+        template.innerHTML = html.trim();
+        return template.content;
+    }
+
+    async function showError(response) {
+        let message = `Error ${response.status}`;
+        try {
+            const body = await response.json();
+            if (body.detail) message = typeof body.detail === "string" ? body.detail : JSON.stringify(body.detail);
+        } catch (e) { /* respuesta sin JSON */ }
+        alert(message);
+    }
+
+    function formUrl(form) {
+        const params = new URLSearchParams();
+        for (const [key, value] of new FormData(form)) {
+            if (value !== "") params.append(key, value);
+        }
+        const query = params.toString();
+        return query ? `${form.action}?${query}` : form.action;
+    }
+
+    // Sin los ficheros no seleccionados: el servidor conserva la imagen actual
+    function formBody(form) {
+        const body = new FormData(form);
+        for (const [key, value] of [...body]) {
+            if (value instanceof File && !value.name) body.delete(key);
+        }
+        return body;
+    }
+
+    async function submitForm(form) {
+        const swap = form.dataset.swap;
+        const row = form.closest("tr");
+        const isGet = form.method.toLowerCase() === "get";
+        const url = isGet ? formUrl(form) : form.action;
+        const response = await fetch(url, {
+            method: isGet ? "GET" : "POST",
+            headers: HEADERS,
+            body: isGet ? undefined : formBody(form),
+        });
+        if (!response.ok) return showError(response);
+        const html = await response.text();
+
+        if (swap === "remove") {
+            row.remove();
+        } else if (swap === "row") {
+            row.replaceWith(toNodes(html));
+        } else if (swap === "rows") {
+            const target = document.querySelector(form.dataset.target);
+            target.replaceChildren(toNodes(html));
+            history.replaceState(null, "", url);
+        }
+        observeLoaders();
+    }
+
+    document.addEventListener("submit", (event) => {
+        const form = event.target.closest("form[data-swap]");
+        // Respeta los confirm() de onsubmit
+        if (!form || event.defaultPrevented) return;
+        event.preventDefault();
+        submitForm(form).catch(() => alert("No se pudo contactar con el servidor"));
+    });
+
+    // ---------------------- SCROLL INFINITO ----------------------
+
+    async function loadMore(sentinel) {
+        if (sentinel.dataset.loading) return;
+        sentinel.dataset.loading = "true";
+        try {
+            const response = await fetch(sentinel.dataset.next, { headers: HEADERS });
+            if (!response.ok) return showError(response);
+            // La respuesta trae sus filas y, si quedan más, un nuevo centinela
+            sentinel.replaceWith(toNodes(await response.text()));
+            observeLoaders();
+        } finally {
+            delete sentinel.dataset.loading;
+        }
+    }
+
+    const observer = "IntersectionObserver" in window
+        ? new IntersectionObserver((entries) => {
+            for (const entry of entries) {
+                if (entry.isIntersecting) {
+                    observer.unobserve(entry.target);
+                    loadMore(entry.target);
+                }
+            }
+        }, { rootMargin: "200px" })
+        : null;
+
+    function observeLoaders() {
+        if (!observer) return;
+        document.querySelectorAll("tr.load-more[data-next]").forEach((sentinel) => observer.observe(sentinel));
+    }
+
+    document.addEventListener("click", (event) => {
+        const link = event.target.closest("tr.load-more a");
+        if (!link) return;
+        event.preventDefault();
+        loadMore(link.closest("tr.load-more"));
+    });
+
+    observeLoaders();
+})();
@@ -1,7 +1,12 @@
+import os
+
+os.environ.setdefault("ADMIN_TOKEN", "test-admin-token")
+
 from fastapi.testclient import TestClient
 from main import app
 
 client = TestClient(app)
+ADMIN_HEADERS = {"X-Admin-Token": os.environ["ADMIN_TOKEN"]}
 
 
 def test_reset_all():
@@ -152,3 +157,792 @@ def test_delete_player():
     # Intentar obtener el jugador eliminado (debería dar error 404)
     get_response = client.get(f"/players/{player_id}")
     assert get_response.status_code == 404
+
+
+def test_generate_dataset_is_deterministic():
+    from generate_dataset import learn_profile, DatasetGenerator
+
+    profile = learn_profile("teams_real.csv", "players_real.csv")
+    first = list(DatasetGenerator(profile, seed=7).players(100, 25))
+    second = list(DatasetGenerator(profile, seed=7).players(100, 25))
+    assert first == second
+    assert len({row[1] for row in first}) == 100  # gamertags únicos
+    assert all(row[2] >= 0 and row[3] >= 0 for row in first)
+
+
+def test_metrics_endpoint():
+    client.get("/teams")
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert 'halo_http_requests_total{method="GET",route="/teams"' in response.text
+    assert "halo_http_request_duration_seconds_bucket" in response.text
+
+
+def test_sql_profiler_flags_repeated_shapes():
+    from utils.sql_profiler import RequestProfile
+
+    profile = RequestProfile()
+    for _ in range(6):
+        profile.record("SELECT team.id FROM team WHERE team.id = %(pk_1)s", 0.001)
+    profile.record("SELECT 1", 0.001)
+    suspects = profile.repeated_shapes(threshold=5)
+    assert profile.queries == 7
+    assert len(suspects) == 1 and suspects[0][1] == 6
+
+
+def test_slow_queries_endpoint():
+    import admin_routers
+    assert client.get("/admin/slow-queries").status_code == 403
+    # Sin ADMIN_TOKEN configurado se rechaza todo, salvo ADMIN_OPEN=true
+    token = admin_routers.ADMIN_TOKEN
+    admin_routers.ADMIN_TOKEN = None
+    try:
+        assert client.get("/admin/slow-queries", headers=ADMIN_HEADERS).status_code == 403
+        admin_routers.ADMIN_OPEN = True
+        assert client.get("/admin/slow-queries").status_code == 200
+    finally:
+        admin_routers.ADMIN_TOKEN, admin_routers.ADMIN_OPEN = token, False
+    response = client.get("/admin/slow-queries", headers=ADMIN_HEADERS)
+    assert response.status_code == 200
+    assert "threshold_ms" in response.json()
+    assert isinstance(response.json()["queries"], list)
+
+
+def test_export_players_csv_matches_loader_columns():
+    response = client.get("/export/players")
+    assert response.status_code == 200
+    assert response.text.splitlines()[0] == "name,gamertag,kills,deaths,team_name,image_url"
+
+    assert client.get("/export/unknown").status_code == 404
+
+
+def test_export_teams_parquet():
+    import io
+    import pytest
+    pq = pytest.importorskip("pyarrow.parquet")
+
+    response = client.get("/export/teams?format=parquet")
+    assert response.status_code == 200
+    table = pq.read_table(io.BytesIO(response.content))
+    assert table.schema.names == ["id", "name", "region", "championships", "image_url"]
+
+
+def test_scheduled_snapshot_runs_once_per_interval(tmp_path):
+    import pytest
+    pytest.importorskip("pyarrow")
+    from utils.db import engine
+    from operations.operations_snapshot import _scheduled_snapshot, create_snapshot, list_snapshots
+
+    # Nombres únicos aunque coincidan en el mismo segundo
+    first, second = create_snapshot(engine, "arrow", tmp_path), create_snapshot(engine, "arrow", tmp_path)
+    assert first["snapshot"] != second["snapshot"]
+
+    # Otro worker ya escribió en este intervalo: el programador no lo repite
+    assert _scheduled_snapshot(engine, "arrow", 60, tmp_path) is None
+    assert _scheduled_snapshot(engine, "arrow", 0, tmp_path)["snapshot"] == list_snapshots(tmp_path)[0]["snapshot"]
+
+
+def test_import_teams_csv_reports_invalid_rows():
+    content = (
+        "name,region,championships,image_url\n"
+        "Import Team OK,NA,2,\n"
+        "Import Team Bad,EU,-1,\n"
+    )
+    response = client.post("/import/teams", files={"file": ("teams.csv", content.encode(), "text/csv")})
+    assert response.status_code == 200
+    report = response.json()
+    assert report["processed"] == 2
+    assert report["inserted"] == 1
+    assert report["errors"][0]["row"] == 3
+
+
+def test_sync_teams_only_touches_changed_rows():
+    content = "name,region,championships,image_url\nSync Team A,NA,1,\nSync Team B,EU,2,\n"
+    files = lambda body: {"file": ("teams.csv", body.encode(), "text/csv")}
+
+    first = client.post("/import/teams/sync", files=files(content)).json()
+    assert first["inserted"] + first["updated"] == 2
+
+    second = client.post("/import/teams/sync", files=files(content.replace("EU,2", "EU,3"))).json()
+    assert second["updated"] == 1
+    assert second["unchanged"] == 1
+
+    # Un nombre repetido en otro lote también se rechaza (no gana la última fila)
+    import io
+    from sqlmodel import Session
+    from utils.db import engine
+    from operations.operations_sync import sync_teams
+    body = "name,region,championships,image_url\nSync Team C,NA,1,\nSync Team C,EU,9,\n"
+    with Session(engine) as session:
+        report = sync_teams(io.StringIO(body), session, chunk_size=1)
+    assert report["inserted"] == 1 and report["errors"][0]["row"] == 3
+    assert [t["region"] for t in client.get("/teams/by-name/Sync Team C").json()] == ["NA"]
+
+
+def test_change_bus_invalidates_local_cache():
+    from utils.cache import LocalCache
+    from utils.change_bus import ChangeBus
+
+    bus = ChangeBus()
+    cache = LocalCache(ttl=60)
+    bus.subscribe(cache.invalidate)
+    cache.set(("team", 1), {"name": "A"}, [("team", 1)])
+    cache.set("teams:all", [{"name": "A"}], [("team", None)])
+    cache.set(("team", 2), {"name": "B"}, [("team", 2)])
+
+    bus.publish("team", [1])
+    assert cache.get(("team", 1)) is None
+    assert cache.get("teams:all") is None
+    assert cache.get(("team", 2)) == {"name": "B"}
+
+
+def test_read_replica_routing_with_two_databases():
+    import pytest
+    from sqlalchemy import create_engine, text
+    from sqlmodel import SQLModel
+    from utils.db import engine
+    from utils.read_replica import replica_router
+
+    if engine.dialect.name != "postgresql":
+        pytest.skip("Requiere PostgreSQL")
+    # Segunda base local haciendo de réplica, con un equipo que el primario no tiene
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text("DROP DATABASE IF EXISTS halo_replica_test"))
+        conn.execute(text("CREATE DATABASE halo_replica_test"))
+    replica = create_engine(engine.url.set(database="halo_replica_test"))
+    SQLModel.metadata.create_all(replica)
+    with replica.begin() as conn:
+        conn.execute(text("INSERT INTO team (name, region, championships) VALUES ('Solo Replica', 'NA', 0)"))
+
+    try:
+        replica_router.configure(replica)
+        reader = TestClient(app)
+        assert reader.get("/teams/by-name/Solo Replica").status_code == 200
+
+        # Tras escribir, el mismo cliente lee del primario
+        writer = TestClient(app)
+        assert writer.post("/teams/", json={"name": "Replica Writer", "region": "NA", "championships": 0}).status_code == 200
+        assert writer.get("/teams/by-name/Solo Replica").status_code == 404
+
+        # Réplica caída: se vuelve al primario
+        replica_router.configure(create_engine(engine.url.set(database="halo_replica_missing")))
+        assert reader.get("/teams/by-name/Replica Writer").status_code == 200
+        assert replica_router.down
+    finally:
+        replica_router.configure(None)
+        replica.dispose()
+
+
+def test_players_query_filters_sorts_and_projects():
+    team = client.post("/teams/", json={"name": "Query Team", "region": "EU", "championships": 0}).json()
+    for gamertag, kills, deaths in (("QueryA", 30, 10), ("QueryB", 10, 0), ("QueryC", 5, 50)):
+        client.post("/players/", json={"name": "Query", "gamertag": gamertag, "kills": kills,
+                                       "deaths": deaths, "team_id": team["id"]})
+
+    response = client.get("/players/query", params={
+        "region": "EU", "name": "Query", "min_kd": 1, "sort": "-kd", "fields": "gamertag,kd,team_name",
+    })
+    assert response.status_code == 200
+    items = response.json()["items"]
+    assert [p["gamertag"] for p in items] == ["QueryB", "QueryA"]
+    assert set(items[0]) == {"gamertag", "kd", "team_name"}
+
+    page = client.get("/players/query", params={"team_id": team["id"], "limit": 2}).json()
+    assert len(page["items"]) == 2 and page["next_offset"] == 2
+    assert client.get("/players/query", params={"fields": "password"}).status_code == 400
+
+
+def test_multi_get_preserves_order_and_reports_missing():
+    a = client.post("/teams/", json={"name": "Batch A", "region": "NA", "championships": 0}).json()
+    b = client.post("/teams/", json={"name": "Batch B", "region": "NA", "championships": 0}).json()
+
+    response = client.get("/teams", params={"ids": f"{b['id']},999999,{a['id']}"})
+    assert response.status_code == 200
+    assert [t["name"] for t in response.json()["items"]] == ["Batch B", "Batch A"]
+    assert response.json()["missing"] == [999999]
+
+    response = client.post("/teams/batch", json={"ids": [a["id"], b["id"], a["id"]]})
+    assert [t["id"] for t in response.json()["items"]] == [a["id"], b["id"]]
+    assert client.get("/players", params={"ids": "x"}).status_code == 400
+
+
+def test_history_retention_drops_old_partitions():
+    from datetime import datetime, timedelta
+    from sqlalchemy import text
+    from utils.db import engine
+    from operations.operations_history import ensure_history_partitioning
+
+    ensure_history_partitioning(engine)
+    team = client.post("/teams/", json={"name": "History Team", "region": "NA", "championships": 0}).json()
+    client.post("/players/", json={"name": "History", "gamertag": "HistoryP", "kills": 1, "deaths": 1,
+                                   "team_id": team["id"]})
+    assert client.delete(f"/teams/{team['id']}").status_code == 200
+    old = datetime.utcnow() - timedelta(days=400)
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO deletedteam (name, region, championships, deleted_at) "
+                          "VALUES ('Old History Team', 'NA', 0, :old)"), {"old": old})
+
+    page = client.get("/deleted-teams", params={"limit": 1})
+    assert page.json()[0]["name"] == "History Team"
+    assert page.headers["X-Next-Offset"] == "1"
+
+    report = client.post("/admin/history/retention", params={"days": 365, "mode": "purge"}, headers=ADMIN_HEADERS).json()
+    assert report["tables"]["deletedteam"]["deleted_rows"] + len(report["tables"]["deletedteam"]["dropped_partitions"]) >= 1
+    names = [t["name"] for t in client.get("/deleted-teams").json()]
+    assert "History Team" in names and "Old History Team" not in names
+    assert client.post(f"/teams/restore/{team['id']}").status_code == 200
+    assert client.get("/players/by-team/" + str(team["id"])).status_code == 200
+
+
+def test_player_history_downsamples_old_samples():
+    from datetime import datetime, timedelta
+    from utils.db import engine
+    from operations.operations_timeseries import downsample, record_snapshot
+
+    player = client.post("/players/", json={"name": "Trend", "gamertag": "TrendP", "kills": 1, "deaths": 1}).json()
+    now = datetime.utcnow().replace(microsecond=0)
+    old = (now - timedelta(days=5)).replace(minute=0, second=0)
+    record_snapshot(engine, old)
+    record_snapshot(engine, old + timedelta(minutes=10))  # sin cambios: no se inserta
+    client.put(f"/players/{player['id']}", json={"kills": 7})
+    record_snapshot(engine, old + timedelta(minutes=20))
+    client.put(f"/players/{player['id']}", json={"kills": 9})
+    record_snapshot(engine, now)
+
+    raw = client.get(f"/players/{player['id']}/history", params={"resolution": "raw"}).json()
+    assert [p["kills"] for p in raw["points"]] == [1, 7, 9]
+
+    downsample(engine, now)
+    hourly = client.get(f"/players/{player['id']}/history", params={"resolution": "hour"}).json()
+    assert [p["kills"] for p in hourly["points"]] == [7, 9]
+
+
+def test_scheduled_sample_runs_once_per_interval():
+    from datetime import datetime, timedelta
+    from utils.db import engine
+    from operations.operations_timeseries import _scheduled_sample
+
+    client.post("/players/", json={"name": "Sampled", "gamertag": "SampledP", "kills": 3, "deaths": 1})
+    now = datetime.utcnow()
+    assert _scheduled_sample(engine, 0, now)["snapshot"]["players"] >= 1
+
+    # Otro worker ya tomó la muestra de este intervalo: no se repite
+    client.post("/players/", json={"name": "Sampled 2", "gamertag": "SampledP2", "kills": 1, "deaths": 1})
+    assert _scheduled_sample(engine, 10, now + timedelta(minutes=1)) is None
+    assert _scheduled_sample(engine, 10, now + timedelta(minutes=10))["snapshot"]["players"] == 1
+
+
+def test_admission_sheds_bulk_before_writes_and_health():
+    from types import SimpleNamespace
+    from utils.admission import AdmissionController
+
+    pool = SimpleNamespace(waiting=0)
+    controller = AdmissionController(rate=0, queue_threshold=2, route_limits="/export=1", pool=pool)
+
+    # Límite de concurrencia por ruta
+    reason, _, slot = controller.admit("GET", "/export/players", "c1")
+    assert reason is None
+    assert controller.admit("GET", "/export/teams", "c1")[0] == "concurrency"
+    controller.release(slot)
+
+    # Cola del pool por encima del umbral: se corta primero el tráfico masivo
+    pool.waiting = 2
+    assert controller.admit("GET", "/players", "c1")[0] == "db_saturated"
+    assert controller.admit("GET", "/players/1", "c1")[0] is None
+    assert controller.admit("POST", "/players/", "c1")[0] is None
+    pool.waiting = 100
+    assert controller.admit("POST", "/players/", "c1")[0] == "db_saturated"
+    assert controller.admit("GET", "/metrics", "c1")[0] is None
+    assert controller.admit("GET", "/static/logo.jpg", "c1")[0] is None
+
+    limited = AdmissionController(rate=1, burst=2, route_limits="", pool=SimpleNamespace(waiting=0))
+    assert [limited.admit("GET", "/players/1", "c2")[0] for _ in range(3)] == [None, None, "rate_limited"]
+    assert limited.admit("GET", "/players/1", "c3")[0] is None
+
+
+def test_batch_reads_do_not_mark_a_write():
+    from utils.read_replica import LAST_WRITE_COOKIE
+
+    team = client.post("/teams/", json={"name": "Cookie Team", "region": "CK", "championships": 0})
+    assert LAST_WRITE_COOKIE in team.headers.get("set-cookie", "")
+    client.cookies.clear()
+    batch = client.post("/teams/batch", json={"ids": [team.json()["id"]]})
+    assert batch.status_code == 200 and "set-cookie" not in batch.headers
+    assert "set-cookie" not in client.post("/players/batch", json={"ids": [1]}).headers
+
+
+def test_single_flight_shares_one_query():
+    import threading
+    import time
+    from utils.coalesce import SingleFlight
+
+    flight = SingleFlight(window_ms=10_000)
+    calls = []
+
+    def load():
+        calls.append(1)
+        time.sleep(0.2)
+        return b"[]"
+
+    threads = [threading.Thread(target=flight.do, args=("teams", "k", [("team", None)], load)) for _ in range(10)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(calls) == 1
+    assert flight.stats()["queries_saved"] == 9
+
+    assert flight.do("teams", "k", [("team", None)], load) == b"[]"
+    flight.invalidate("team", [1])
+    flight.do("teams", "k", [("team", None)], load)
+    assert len(calls) == 2
+
+
+def test_teams_include_player_count():
+    team = client.post("/teams/", json={"name": "Count Team", "region": "NA", "championships": 0}).json()
+    empty = client.post("/teams/", json={"name": "Empty Count Team", "region": "NA", "championships": 0}).json()
+    for gamertag in ("CountA", "CountB"):
+        client.post("/players/", json={"name": "Count", "gamertag": gamertag, "kills": 0, "deaths": 0,
+                                       "team_id": team["id"]})
+
+    counts = {t["id"]: t["player_count"] for t in client.get("/teams", params={"include": "player_count"}).json()}
+    assert counts[team["id"]] == 2 and counts[empty["id"]] == 0
+
+    # El frontend no elimina un equipo con jugadores, sí uno vacío
+    response = client.post(f"/frontend/teams/delete/{team['id']}", follow_redirects=False)
+    assert "error" in response.headers["location"]
+    response = client.post(f"/frontend/teams/delete/{empty['id']}", follow_redirects=False)
+    assert response.headers["location"] == "/frontend/teams/view"
+    assert "Count Team" in client.get("/frontend/teams/view").text
+
+
+def test_frontend_fragments_and_infinite_scroll():
+    from frontend_routers import FRONTEND_PAGE_SIZE
+    hx = {"HX-Request": "true"}
+    team = client.post("/teams/", json={"name": "Fragment Team", "region": "EU", "championships": 0}).json()
+    for i in range(FRONTEND_PAGE_SIZE + 5):
+        client.post("/players/", json={"name": "Fragment", "gamertag": f"Frag{i}", "kills": i, "deaths": 1,
+                                       "team_id": team["id"]})
+
+    # Primera página con centinela; la siguiente llega como fragmento sin la plantilla base
+    page = client.get("/frontend/players/search", params={"team_id": team["id"]})
+    assert page.text.count('<tr id="player-') == FRONTEND_PAGE_SIZE
+    assert 'class="load-more"' in page.text and "<html" in page.text
+    rows = client.get("/frontend/players/search", params={"team_id": team["id"], "after": 0}, headers=hx)
+    assert "<html" not in rows.text and rows.headers["vary"] == "HX-Request"
+    last_id = int(page.text.split('<tr id="player-')[-1].split('"')[0])
+    rest = client.get("/frontend/players/search", params={"team_id": team["id"], "after": last_id}, headers=hx)
+    assert rest.text.count('<tr id="player-') == 5 and "load-more" not in rest.text
+
+    # Eliminar con fragmento: respuesta vacía en vez de redirigir a la lista
+    response = client.post(f"/frontend/players/delete/{last_id}", headers=hx, follow_redirects=False)
+    assert response.status_code == 200 and response.content == b""
+    response = client.post(f"/frontend/players/restore/{last_id}", headers=hx, follow_redirects=False)
+    assert response.status_code == 200
+
+    # Edición en línea: devuelve solo la fila actualizada
+    edit = client.get(f"/frontend/teams/edit/{team['id']}", headers=hx)
+    assert 'form="edit-team-' in edit.text and "<html" not in edit.text
+    response = client.post(f"/frontend/teams/edit/{team['id']}", headers=hx,
+                           data={"name": "Fragment Team 2", "region": "EU", "championships": 1})
+    assert response.text.strip().startswith(f'<tr id="team-{team["id"]}">') and "Fragment Team 2" in response.text
+
+    # Un equipo con jugadores no se elimina: error legible en vez de redirección
+    response = client.post(f"/frontend/teams/delete/{team['id']}", headers=hx, follow_redirects=False)
+    assert response.status_code == 409
+
+
+def test_deleted_views_page_by_cursor():
+    import re
+    import frontend_routers
+    hx = {"HX-Request": "true"}
+    ids = [client.post("/players/", json={"name": "Cursor", "gamertag": f"Cursor{i}", "kills": 0, "deaths": 0}).json()["id"]
+           for i in range(5)]
+    for player_id in ids:
+        client.delete(f"/players/{player_id}")
+
+    size = frontend_routers.HISTORY_PAGE_SIZE
+    frontend_routers.HISTORY_PAGE_SIZE = 2
+    try:
+        page = client.get("/frontend/deleted-players/view", headers=hx).text
+        shown = [int(i) for i in re.findall(r'<tr id="deleted-player-(\d+)"', page)]
+        next_url = re.search(r'data-next="([^"]+)"', page).group(1).replace("&amp;", "&")
+        # Restaurar lo ya mostrado no hace saltar filas en la página siguiente
+        for player_id in shown:
+            client.post(f"/frontend/players/restore/{player_id}", headers=hx)
+        rest = client.get(next_url, headers=hx).text
+        following = [int(i) for i in re.findall(r'<tr id="deleted-player-(\d+)"', rest)]
+        assert shown == ids[::-1][:2] and following == ids[::-1][2:4]
+        assert client.get("/frontend/deleted-players/view", params={"after": "x"}).status_code == 400
+    finally:
+        frontend_routers.HISTORY_PAGE_SIZE = size
+
+
+def test_leaderboards_from_stats_engine():
+    team = client.post("/teams/", json={"name": "Board Team", "region": "LB", "championships": 2}).json()
+    other = client.post("/teams/", json={"name": "Board Rival", "region": "LB", "championships": 0}).json()
+    players = []
+    for gamertag, kills, deaths, team_id in (("BoardA", 30, 10, team["id"]), ("BoardB", 50, 5, team["id"]),
+                                             ("BoardC", 20, 0, other["id"])):
+        players.append(client.post("/players/", json={"name": "Board", "gamertag": gamertag, "kills": kills,
+                                                      "deaths": deaths, "team_id": team_id}).json())
+
+    board = client.get("/leaderboard/players", params={"region": "LB", "metric": "kd"}).json()
+    assert [p["gamertag"] for p in board["items"]] == ["BoardC", "BoardB", "BoardA"]
+
+    # El cambio llega por el bus de cambios y se aplica de forma incremental
+    version = board["version"]
+    client.put(f"/players/{players[0]['id']}", json={"kills": 500})
+    board = client.get("/leaderboard/players", params={"region": "LB", "metric": "kills", "limit": 1}).json()
+    assert board["version"] > version
+    assert board["items"][0]["gamertag"] == "BoardA" and board["items"][0]["value"] == 500
+
+    teams = client.get("/leaderboard/teams", params={"region": "LB", "metric": "kills"}).json()["items"]
+    assert [(t["name"], t["kills"], t["players"]) for t in teams] == [("Board Team", 550, 2), ("Board Rival", 20, 1)]
+
+    summary = client.get("/stats/summary", params={"team_id": team["id"]}).json()
+    assert summary["players"] == 2 and summary["kills"]["total"] == 550
+
+
+def test_player_percentiles_and_distribution():
+    team = client.post("/teams/", json={"name": "Pct Team", "region": "PCT", "championships": 0}).json()
+    ids = []
+    for i, kills in enumerate((10, 20, 30, 40)):
+        ids.append(client.post("/players/", json={"name": "Pct", "gamertag": f"Pct{i}", "kills": kills, "deaths": 10,
+                                                  "team_id": team["id"]}).json()["id"])
+
+    result = client.get(f"/players/{ids[3]}/percentiles").json()
+    assert result["region"] == "PCT" and result["scopes"]["team"]["kills"]["group_size"] == 4
+    # Mejor de 4: 3 por debajo + medio empate consigo mismo -> 87.5
+    assert result["scopes"]["team"]["kills"]["percentile"] == 87.5
+    assert round(result["scopes"]["team"]["kills"]["z"], 3) == 1.342
+    assert client.get("/players/999999999/percentiles").status_code == 404
+
+    report = client.get("/stats/distribution", params={"scope": "region", "metric": "kills"}).json()
+    group = next(g for g in report["groups"] if g["region"] == "PCT")
+    assert group["players"] == 4 and group["kills"]["p50"] == 25 and "deaths" not in group
+
+    # La caché de la distribución dura hasta la siguiente escritura de un jugador
+    client.put(f"/players/{ids[0]}", json={"kills": 100})
+    result = client.get(f"/players/{ids[3]}/percentiles").json()
+    assert result["scopes"]["team"]["kills"]["percentile"] == 62.5
+    assert client.get("/stats/distribution", params={"metric": "rating"}).status_code == 400
+
+
+def test_team_ratings_from_matches():
+    from datetime import datetime, timedelta
+    teams = [client.post("/teams/", json={"name": f"Rated {n}", "region": "RT", "championships": 0}).json()["id"]
+             for n in ("A", "B", "C")]
+    a, b, c = teams
+    for team_a, team_b, score_a, score_b in ((a, b, 3, 1), (a, c, 2, 0), (b, c, 2, 2)):
+        response = client.post("/matches", json={"team_a_id": team_a, "team_b_id": team_b,
+                                                 "score_a": score_a, "score_b": score_b})
+        assert response.status_code == 200
+    assert client.post("/matches", json={"team_a_id": a, "team_b_id": a, "score_a": 1, "score_b": 0}).status_code == 422
+
+    def ranking(system):
+        items = client.get("/teams/ratings", params={"system": system, "limit": 500}).json()["items"]
+        return [(i["team_id"], i["rating"]) for i in items if i["team_id"] in teams]
+
+    for system in ("elo", "glicko2"):
+        assert [team_id for team_id, _ in ranking(system)][0] == a
+
+    # Un resultado antiguo rehace desde su periodo; debe coincidir con un recálculo completo
+    old = (datetime.utcnow() - timedelta(days=30)).isoformat()
+    from utils.jobs import job_queue
+    response = client.post("/matches", json={"team_a_id": c, "team_b_id": a, "score_a": 5, "score_b": 0, "played_at": old})
+    # El recálculo desde un periodo antiguo va en segundo plano
+    job = job_queue.wait(response.headers["x-ratings-job"].rsplit("/", 1)[1])
+    assert job["status"] == "succeeded" and job["result"]["since_period"] is not None
+    history = client.get(f"/teams/{a}/ratings", params={"system": "glicko2"}).json()["history"]
+    assert len(history) == 2 and history[0]["matches"] == 1 and history[1]["matches"] == 2
+    incremental = ranking("glicko2")
+    assert client.post("/admin/ratings/recompute", headers=ADMIN_HEADERS).json()["matches"] >= 4
+    assert ranking("glicko2") == incremental
+
+
+def test_image_offload_to_object_storage():
+    import shutil
+    import utils.storage as storage
+    from utils.db import engine
+    from utils.storage import S3Storage, upload_queue
+    from utils.storage_standin import StandInStorageServer
+    from operations.operations_images import start_image_offload
+
+    server = StandInStorageServer().start_background()
+    previous, base = upload_queue.backend, storage.STORAGE_RETRY_BASE_SECONDS
+    try:
+        storage.STORAGE_RETRY_BASE_SECONDS = 0.01
+        upload_queue.configure(S3Storage(endpoint=server.url, bucket="halo", access_key="k", secret_key="s"))
+        start_image_offload(engine)
+        server.fail_next = 2
+
+        # Dos equipos suben un archivo con el mismo nombre y distinto contenido
+        for name, content in (("Offload Team", b"\xff\xd8jpeg-a"), ("Offload Team 2", b"\xff\xd8jpeg-b")):
+            response = client.post("/frontend/teams-form", data={"name": name, "region": "EU", "championships": 0},
+                                   files={"image": ("offload_logo.jpg", content, "image/jpeg")},
+                                   follow_redirects=False)
+            assert response.status_code == 303
+        assert upload_queue.wait_idle()
+
+        # Cada fila apunta a su propio objeto remoto, con su contenido
+        urls = {t["name"]: t["image_url"] for t in client.get("/teams/by-name/Offload Team").json()}
+        first, second = urls["Offload Team"], urls["Offload Team 2"]
+        assert first != second and first.startswith(f"{server.url}/halo/images/")
+        for url, content in ((first, b"\xff\xd8jpeg-a"), (second, b"\xff\xd8jpeg-b")):
+            assert server.get(("halo", url.split("/halo/", 1)[1])) == ("image/jpeg", content)
+        assert upload_queue.stats_by_result["retried"] >= 2
+        # Los reintentos reutilizan la conexión keep-alive del hilo
+        assert server.connections <= upload_queue.concurrency
+    finally:
+        upload_queue.configure(previous)
+        storage.STORAGE_RETRY_BASE_SECONDS = base
+        server.shutdown()
+        shutil.rmtree(storage.STATIC_DIR / "uploads", ignore_errors=True)
+
+
+def test_background_jobs():
+    import threading
+    from utils.db import engine
+    from data.models_job import Job
+    from utils.jobs import DatabaseJobStore, job_queue
+
+    team = client.post("/teams/", json={"name": "Job Team", "region": "JB", "championships": 0}).json()
+    client.post("/players/", json={"name": "Job", "gamertag": "JobPlayer", "kills": 1, "deaths": 1,
+                                   "team_id": team["id"]})
+
+    accepted = client.delete(f"/teams/{team['id']}", params={"background": "true"})
+    assert accepted.status_code == 202 and accepted.headers["location"] == accepted.json()["url"]
+    job = job_queue.wait(accepted.json()["job_id"])
+    assert job["status"] == "succeeded" and "Job Team" in job["result"]["message"]
+    assert client.get(f"/teams/{team['id']}").status_code == 404
+    assert client.get(accepted.json()["url"]).json()["progress"] == 1.0
+
+    # Error de datos: falla al primer intento; retry lo vuelve a encolar
+    missing = client.post("/teams/restore/999999", params={"background": "true"}).json()
+    failed = job_queue.wait(missing["job_id"])
+    assert failed["status"] == "failed" and failed["attempts"] == 1 and "no encontrado" in failed["error"]
+    assert client.post(f"/jobs/{missing['job_id']}/cancel").status_code == 409
+    assert client.post(f"/jobs/{missing['job_id']}/retry").status_code == 202
+    assert job_queue.wait(missing["job_id"])["attempts"] == 2
+
+    # Importación con progreso, sobre la cola persistente en la tabla job
+    previous = job_queue.store
+    job_queue.configure(DatabaseJobStore(engine, Job.__table__))
+    try:
+        rows = "".join(f"Job Import {i},JB,{i % 3},\n" for i in range(300))
+        accepted = client.post("/import/teams", params={"background": "true"},
+                               files={"file": ("teams.csv", ("name,region,championships,image_url\n" + rows).encode(), "text/csv")})
+        job = job_queue.wait(accepted.json()["job_id"])
+        assert job["status"] == "succeeded" and job["result"]["inserted"] == 300 and job["progress"] == 1.0
+        assert "upload" not in client.get(f"/jobs/{job['id']}").json()["params"]
+
+        # Cancelar un trabajo en ejecución: se detiene en su siguiente punto de control
+        started, release = threading.Event(), threading.Event()
+
+        @job_queue.handler("test_block")
+        def block(ctx):
+            started.set()
+            release.wait(5)
+            ctx.progress(0.5)
+            return {"done": True}
+
+        blocked = job_queue.submit("test_block")
+        assert started.wait(5)
+        assert client.post(f"/jobs/{blocked['id']}/cancel").json()["cancel_requested"] is True
+        release.set()
+        assert job_queue.wait(blocked["id"])["status"] == "cancelled"
+        assert any(j["id"] == blocked["id"] for j in client.get("/jobs", params={"status": "cancelled"}).json())
+    finally:
+        job_queue.configure(previous)
+        job_queue.handlers.pop("test_block", None)
+
+
+def test_import_job_not_retried_after_partial_commit():
+    import io
+    from operations.operations_import import import_teams
+    from operations.operations_jobs import _import_job
+    from utils.jobs import job_queue
+
+    # Falla transitoria tras confirmar el primer lote: reintentar duplicaría el informe
+    def flaky(text_file, session):
+        import_teams(text_file, session, chunk_size=2)
+        raise ConnectionError("conexión perdida")
+
+    @job_queue.handler("test_flaky_import")
+    def handler(ctx, **params):
+        return _import_job(ctx, flaky, **params)
+
+    try:
+        rows = "".join(f"Flaky Import {i},FL,0,\n" for i in range(3))
+        upload = job_queue.save_upload(io.BytesIO(("name,region,championships,image_url\n" + rows).encode()))
+        job = job_queue.wait(job_queue.submit("test_flaky_import", {"upload": upload})["id"])
+        assert job["status"] == "failed" and job["attempts"] == 1
+        assert "conexión perdida" in job["error"]
+    finally:
+        job_queue.handlers.pop("test_flaky_import", None)
+
+
+def test_models_configure_on_their_own():
+    import subprocess
+    import sys
+
+    # Cada módulo de modelos basta para configurar los mappers (Player.team <-> Team.players)
+    for module in ("data.models_player", "data.models_team"):
+        code = f"import {module}; from sqlalchemy.orm import configure_mappers; configure_mappers()"
+        assert subprocess.run([sys.executable, "-c", code], capture_output=True).returncode == 0, module
+
+
+def test_teams_include_players_with_eager_loading():
+    from sqlalchemy import event
+    from utils.db import engine
+
+    teams = [client.post("/teams/", json={"name": f"Roster {n}", "region": "RS", "championships": 0}).json()["id"]
+             for n in ("A", "B", "C")]
+    for i, team_id in enumerate(teams[:2]):
+        for n in range(i + 2):
+            client.post("/players/", json={"name": "Roster", "gamertag": f"Roster{i}{n}", "kills": n, "deaths": 1,
+                                           "team_id": team_id})
+
+    statements = []
+    counter = lambda *args: statements.append(args[2])
+    event.listen(engine, "before_cursor_execute", counter)
+    try:
+        batch = client.post("/teams/batch", params={"include": "players,player_count"},
+                            json={"ids": teams + [999999]}).json()
+    finally:
+        event.remove(engine, "before_cursor_execute", counter)
+    # Equipos y plantillas en dos consultas, no una por equipo
+    assert len([sql for sql in statements if sql.lstrip().upper().startswith("SELECT")]) == 2
+    assert [t["id"] for t in batch["items"]] == teams and batch["missing"] == [999999]
+    assert [len(t["players"]) for t in batch["items"]] == [2, 3, 0]
+    assert [t["player_count"] for t in batch["items"]] == [2, 3, 0]
+
+    roster = client.get(f"/teams/{teams[1]}", params={"include": "players"}).json()
+    assert [p["gamertag"] for p in roster["players"]] == ["Roster10", "Roster11", "Roster12"]
+    assert "player_count" not in roster
+
+    # La plantilla cacheada se invalida al cambiar un jugador
+    player_id = roster["players"][0]["id"]
+    client.put(f"/players/{player_id}", json={"team_id": teams[2]})
+    assert len(client.get(f"/teams/{teams[1]}", params={"include": "players"}).json()["players"]) == 2
+
+    everything = {t["id"]: t for t in client.get("/teams", params={"include": "players"}).json()}
+    assert len(everything[teams[2]]["players"]) == 1
+    assert client.get("/teams/by-name/Roster", params={"include": "players"}).json()[0]["players"]
+    assert client.get("/teams", params={"include": "roster"}).status_code == 422
+    assert client.get("/teams/999999", params={"include": "players"}).status_code == 404
+
+
+def test_readiness_after_warmup():
+    import signal
+    import threading
+    from utils.db import engine
+    from utils.warmup import warmup, warmup_steps
+    from frontend_routers import templates
+    from main import app
+
+    assert client.get("/live").json() == {"status": "alive"}
+
+    # Sin calentar (TestClient no ejecuta el arranque) el worker no está listo
+    state = warmup
+    try:
+        response = client.get("/ready")
+        assert response.status_code == 503 and response.json()["ready"] is False
+
+        broken = [("db", lambda: 1 / 0)]
+        assert state.run(broken) is False
+        assert client.get("/ready").json()["steps"]["db"]["ok"] is False
+
+        steps = warmup_steps(app, {"primary": engine, "replica": None}, [templates.env])
+        assert state.run(steps) is True
+        body = client.get("/ready").json()
+        assert client.get("/ready").status_code == 200
+        assert [name for name in body["steps"]] == ["db", "templates", "schemas", "openapi"]
+        assert body["steps"]["db"]["attempts"] == 2 and body["steps"]["db"]["connections"]["primary"] >= 1
+        assert body["steps"]["templates"]["templates"] >= 10 and body["steps"]["openapi"]["paths"] > 0
+        assert all(step["seconds"] >= 0 for step in body["steps"].values())
+        assert "halo_ready 1" in client.get("/metrics").text
+
+        # SIGTERM: /ready pasa a 503 y el manejador de uvicorn llega tras el drenaje
+        stopped = threading.Event()
+        previous = signal.signal(signal.SIGTERM, lambda sig, frame: stopped.set())
+        try:
+            state.install_drain_signal(0.5)
+            signal.raise_signal(signal.SIGTERM)
+            assert client.get("/ready").status_code == 503 and not stopped.is_set()
+            assert stopped.wait(5)
+        finally:
+            signal.signal(signal.SIGTERM, previous)
+    finally:
+        warmup.__init__()
+
+
+def test_replica_reads_do_not_populate_cache():
+    from sqlmodel import Session
+    from utils.cache import entity_cache
+    from utils.db import engine
+    from routers import _cached, _get_many
+    from data.models_team import Team
+
+    team = client.post("/teams/", json={"name": "Replica Cache", "region": "RC", "championships": 0}).json()
+    entity_cache.clear()
+    with Session(engine) as session:
+        session.info["replica"] = True
+        assert _cached(session, ("replica-test",), [("team", None)], lambda: "stale") == "stale"
+        assert _get_many(session, Team, "team", [team["id"]])["items"][0]["name"] == "Replica Cache"
+    assert entity_cache.get(("replica-test",)) is None and entity_cache.get(("team", team["id"])) is None
+
+
+# Al final: vacía la base de datos
+def test_reset_all_clears_ratings():
+    # Partido entre los equipos 1 y 2; tras vaciar, el nuevo equipo 1 empieza sin rating
+    assert client.delete("/reset-all").status_code == 200
+    teams = [client.post("/teams/", json={"name": f"Reset Rated {n}", "region": "RS", "championships": 0}).json()["id"]
+             for n in ("A", "B")]
+    assert client.post("/matches", json={"team_a_id": teams[0], "team_b_id": teams[1],
+                                         "score_a": 1, "score_b": 0}).status_code == 200
+
+    assert client.delete("/reset-all").status_code == 200
+    team = client.post("/teams/", json={"name": "Reset Fresh", "region": "RS", "championships": 0}).json()
+    assert team["id"] == 1
+    assert client.get(f"/teams/{team['id']}/ratings").json()["history"] == []
+    assert all(i["team_id"] != team["id"] for i in client.get("/teams/ratings").json()["items"])
+
+
+def test_reset_all_clears_stat_history():
+    from utils.db import engine
+    from operations.operations_timeseries import record_snapshot
+
+    assert client.delete("/reset-all").status_code == 200
+    team = client.post("/teams/", json={"name": "Reset Series", "region": "RS", "championships": 0}).json()
+    client.post("/players/", json={"name": "Series", "gamertag": "ResetSeries", "kills": 4, "deaths": 2,
+                                   "team_id": team["id"]})
+    record_snapshot(engine)
+
+    assert client.delete("/reset-all").status_code == 200
+    team = client.post("/teams/", json={"name": "Reset Series 2", "region": "RS", "championships": 0}).json()
+    player = client.post("/players/", json={"name": "Series 2", "gamertag": "ResetSeries2", "kills": 0, "deaths": 0,
+                                            "team_id": team["id"]}).json()
+    assert client.get(f"/teams/{team['id']}/history", params={"resolution": "raw"}).json()["points"] == []
+    assert client.get(f"/players/{player['id']}/history", params={"resolution": "raw"}).json()["points"] == []
+
+
+def test_sync_relinks_after_reset_and_delete():
+    content = "name,region,championships,image_url\nRelink Team A,NA,1,\nRelink Team B,EU,2,\n"
+    files = lambda body: {"file": ("teams.csv", body.encode(), "text/csv")}
+
+    assert client.delete("/reset-all").status_code == 200
+    assert client.post("/import/teams/sync", files=files(content)).json()["inserted"] == 2
+
+    # Tras vaciar, el mismo archivo vuelve a crear los equipos (el estado antiguo no cuenta)
+    assert client.delete("/reset-all").status_code == 200
+    assert client.post("/import/teams/sync", files=files(content)).json()["inserted"] == 2
+
+    # Equipo borrado por la API (pasa al historial): se crea de nuevo en vez de resucitar su id
+    team_a = client.get("/teams/by-name/Relink Team A").json()[0]
+    assert client.delete(f"/teams/{team_a['id']}").status_code == 200
+    report = client.post("/import/teams/sync", files=files(content.replace("NA,1", "NA,5"))).json()
+    assert report["inserted"] == 1 and report["unchanged"] == 1
+    assert [t["championships"] for t in client.get("/teams/by-name/Relink Team A").json()] == [5]
+
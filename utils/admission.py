@@ -0,0 +1,223 @@
+import json
+import math
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from utils.db import engine
+from utils.metrics import Counter, Gauge, registry
+
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "true").lower() in ("1", "true", "yes")
+# Hilos esperando conexión a partir de los cuales se empieza a rechazar tráfico masivo.
+# Las lecturas se rechazan al doble y las escrituras al cuádruple; los health checks nunca.
+ADMISSION_QUEUE_THRESHOLD = int(os.getenv("ADMISSION_QUEUE_THRESHOLD", "5"))
+# Token bucket por cliente (peticiones por segundo y ráfaga); 0 = sin límite (por defecto).
+# Detrás de un balanceador todos los clientes comparten la IP del proxy: activarlo solo
+# junto con ADMISSION_TRUST_PROXY=true para identificar al cliente por X-Forwarded-For.
+ADMISSION_RATE_PER_SECOND = float(os.getenv("ADMISSION_RATE_PER_SECOND", "0"))
+ADMISSION_BURST = int(os.getenv("ADMISSION_BURST", "100"))
+# Peticiones simultáneas por prefijo de ruta: "/export=2,/import=2"
+ADMISSION_ROUTE_LIMITS = os.getenv("ADMISSION_ROUTE_LIMITS", "/export=2,/import=2,/admin/snapshots=1")
+ADMISSION_RETRY_AFTER = 1
+# Solo detrás de un proxy de confianza se identifica al cliente por X-Forwarded-For
+ADMISSION_TRUST_PROXY = os.getenv("ADMISSION_TRUST_PROXY", "false").lower() in ("1", "true", "yes")
+
+# Prioridades, de mayor a menor
+CRITICAL, WRITE, READ, BULK = "critical", "write", "read", "bulk"
+SHED_FACTOR = {BULK: 1, READ: 2, WRITE: 4}
+
+CRITICAL_PREFIXES = ("/health", "/ready", "/live", "/metrics")
+# Sin base de datos: nunca se rechazan
+EXEMPT_PREFIXES = ("/static",)
+# Listados completos, exportaciones e importaciones
+BULK_PREFIXES = ("/export", "/import", "/admin/snapshots")
+BULK_PATHS = {
+    "/players", "/teams", "/deleted-players", "/deleted-teams",
+    "/frontend/players/view", "/frontend/teams/view",
+    "/frontend/deleted-players/view", "/frontend/teams/deleted/view",
+}
+
+admission_rejected = registry.register(Counter(
+    "halo_admission_rejected_total", "Peticiones rechazadas por el control de admisión", ("reason", "priority")))
+pool_waiting = registry.register(Gauge(
+    "halo_db_pool_waiting", "Hilos esperando una conexión del pool"))
+
+
+def _matches(path: str, prefix: str) -> bool:
+    return path == prefix or path.startswith(prefix.rstrip("/") + "/")
+
+
+def classify(method: str, path: str) -> Optional[str]:
+    if any(_matches(path, p) for p in EXEMPT_PREFIXES):
+        return None
+    if any(_matches(path, p) for p in CRITICAL_PREFIXES):
+        return CRITICAL
+    if any(_matches(path, p) for p in BULK_PREFIXES):
+        return BULK
+    if method in ("GET", "HEAD"):
+        return BULK if path.rstrip("/") in BULK_PATHS else READ
+    return WRITE
+
+
+def parse_route_limits(raw: str) -> List[Tuple[str, int]]:
+    limits = []
+    for part in raw.split(","):
+        if "=" not in part:
+            continue
+        prefix, limit = part.split("=", 1)
+        limits.append((prefix.strip(), int(limit)))
+    # El prefijo más largo gana
+    return sorted(limits, key=lambda item: len(item[0]), reverse=True)
+
+
+class TokenBucket:
+    __slots__ = ("tokens", "updated")
+
+    def __init__(self, capacity: float):
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+
+class AdmissionController:
+    def __init__(self, rate: float = ADMISSION_RATE_PER_SECOND, burst: int = ADMISSION_BURST,
+                 queue_threshold: int = ADMISSION_QUEUE_THRESHOLD, route_limits: str = ADMISSION_ROUTE_LIMITS,
+                 pool=None):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.queue_threshold = queue_threshold
+        self.route_limits = parse_route_limits(route_limits)
+        self.pool = pool if pool is not None else engine.pool
+        self._in_flight: Dict[str, int] = {prefix: 0 for prefix, _ in self.route_limits}
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    def pool_waiting(self) -> int:
+        return getattr(self.pool, "waiting", 0)
+
+    # Devuelve None si hay saldo, o los segundos hasta el próximo token
+    def _take_token(self, client: str) -> Optional[float]:
+        if self.rate <= 0:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(client)
+            if bucket is None:
+                if len(self._buckets) > 10000:
+                    self._buckets.clear()
+                bucket = self._buckets[client] = TokenBucket(self.burst)
+            bucket.tokens = min(self.burst, bucket.tokens + (now - bucket.updated) * self.rate)
+            bucket.updated = now
+            if bucket.tokens >= 1:
+                bucket.tokens -= 1
+                return None
+            return (1 - bucket.tokens) / self.rate
+
+    def _route_slot(self, path: str) -> Tuple[Optional[str], bool]:
+        for prefix, limit in self.route_limits:
+            if _matches(path, prefix):
+                with self._lock:
+                    if self._in_flight[prefix] >= limit:
+                        return prefix, False
+                    self._in_flight[prefix] += 1
+                return prefix, True
+        return None, True
+
+    def release(self, prefix: Optional[str]):
+        if prefix is not None:
+            with self._lock:
+                self._in_flight[prefix] -= 1
+
+    # -> (motivo de rechazo | None, Retry-After, prefijo con plaza ocupada)
+    def admit(self, method: str, path: str, client: str) -> Tuple[Optional[str], int, Optional[str]]:
+        priority = classify(method, path)
+        if priority is None or priority == CRITICAL:
+            return None, 0, None
+
+        waiting = self.pool_waiting()
+        with registry.lock:
+            pool_waiting.set(waiting)
+        if self.queue_threshold > 0 and waiting >= self.queue_threshold * SHED_FACTOR[priority]:
+            return self._reject("db_saturated", priority, ADMISSION_RETRY_AFTER)
+
+        wait = self._take_token(client)
+        if wait is not None:
+            return self._reject("rate_limited", priority, max(1, math.ceil(wait)))
+
+        prefix, ok = self._route_slot(path)
+        if not ok:
+            return self._reject("concurrency", priority, ADMISSION_RETRY_AFTER)
+        return None, 0, prefix
+
+    def status(self) -> dict:
+        return {
+            "pool_waiting": self.pool_waiting(),
+            "queue_threshold": self.queue_threshold,
+            "rate_per_second": self.rate,
+            "burst": self.burst,
+            "route_limits": dict(self.route_limits),
+            "in_flight": dict(self._in_flight),
+            "tracked_clients": len(self._buckets),
+        }
+
+    def _reject(self, reason: str, priority: str, retry_after: int):
+        with registry.lock:
+            admission_rejected.inc((reason, priority))
+        return reason, retry_after, None
+
+
+REJECTION_MESSAGES = {
+    "db_saturated": (503, "El servidor está saturado, inténtalo de nuevo en unos segundos"),
+    "concurrency": (503, "Demasiadas peticiones simultáneas a esta ruta"),
+    "rate_limited": (429, "Demasiadas peticiones desde este cliente"),
+}
+
+
+def _client_key(scope) -> str:
+    if ADMISSION_TRUST_PROXY:
+        for name, value in scope.get("headers", []):
+            if name == b"x-forwarded-for":
+                return value.decode("latin-1").split(",")[0].strip()
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+
+# ---------------------- MIDDLEWARE ASGI ----------------------
+
+# Rechaza antes de tocar la base de datos (fallar rápido en vez de encolar)
+class AdmissionMiddleware:
+    def __init__(self, app, controller: Optional[AdmissionController] = None):
+        self.app = app
+        self.controller = controller or admission_controller
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        reason, retry_after, prefix = self.controller.admit(scope["method"], scope["path"], _client_key(scope))
+        if reason is not None:
+            status, detail = REJECTION_MESSAGES[reason]
+            body = json.dumps({
+                "msg": "¡Llórelo! Algo salió mal...",
+                "detail": detail,
+                "path": scope["path"],
+            }).encode("utf-8")
+            await send({
+                "type": "http.response.start",
+                "status": status,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode()),
+                    (b"retry-after", str(retry_after).encode()),
+                ],
+            })
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.release(prefix)
+
+
+admission_controller = AdmissionController()
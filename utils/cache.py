@@ -0,0 +1,113 @@
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Optional, Set, Tuple
+
+from utils.change_bus import change_bus
+
+CACHE_TTL_SECONDS = float(os.getenv("CACHE_TTL_SECONDS", "30"))
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "10000"))
+
+_MISSING = object()
+
+# Etiqueta de dependencia: (tabla, id) o (tabla, None) si depende de toda la tabla
+Tag = Tuple[str, Optional[int]]
+
+
+# Caché local del worker. Cada entrada declara de qué filas/tablas depende y el bus de
+# cambios la invalida en cuanto llega un evento (local o por NOTIFY de otro worker).
+class LocalCache:
+    def __init__(self, ttl: float = CACHE_TTL_SECONDS, max_entries: int = CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._data: Dict[Any, Tuple[float, Any, Tuple[Tag, ...]]] = {}
+        self._tags: Dict[Tag, Set[Any]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._generation = 0
+
+    def get(self, key, default=None):
+        entry = self._data.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            self.misses += 1
+            return default
+        self.hits += 1
+        return entry[1]
+
+    # Número de invalidaciones vistas: quien carga datos lo lee antes y lo pasa a set()
+    @property
+    def generation(self) -> int:
+        return self._generation
+
+    def set(self, key, value, tags: Iterable[Tag], generation: Optional[int] = None):
+        tags = tuple(tags)
+        with self._lock:
+            # Si llegó una invalidación mientras se cargaba, el valor puede estar viejo: no se guarda
+            if generation is not None and generation != self._generation:
+                return
+            if len(self._data) >= self.max_entries:
+                self._evict_expired()
+                if len(self._data) >= self.max_entries:
+                    self._clear()
+            self._data[key] = (time.monotonic() + self.ttl, value, tags)
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+
+    def get_or_set(self, key, tags: Iterable[Tag], loader: Callable[[], Any]):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            generation = self._generation
+            value = loader()
+            self.set(key, value, tags, generation)
+        return value
+
+    def _drop(self, key):
+        entry = self._data.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry[2]:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+    def _evict_expired(self):
+        now = time.monotonic()
+        for key in [k for k, (expires, _, _) in self._data.items() if expires < now]:
+            self._drop(key)
+
+    def _clear(self):
+        self._data.clear()
+        self._tags.clear()
+
+    # Callback del bus de cambios
+    def invalidate(self, table: str, ids: Optional[Iterable[int]] = None):
+        with self._lock:
+            self.invalidations += 1
+            self._generation += 1
+            if ids is None:
+                tags = [tag for tag in self._tags if tag[0] == table]
+            else:
+                tags = [(table, None)] + [(table, i) for i in ids]
+            for tag in tags:
+                for key in list(self._tags.get(tag, ())):
+                    self._drop(key)
+
+    def clear(self):
+        with self._lock:
+            self._clear()
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+        }
+
+
+entity_cache = LocalCache()
+change_bus.subscribe(entity_cache.invalidate)
@@ -0,0 +1,214 @@
+import json
+import logging
+import os
+import select
+import threading
+from typing import Callable, Iterable, List, Optional
+
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session as ORMSession
+
+logger = logging.getLogger("halo.change_bus")
+
+# postgres: LISTEN/NOTIFY entre workers | memory: solo invalidación dentro del proceso
+CHANGE_BUS = os.getenv("CHANGE_BUS", "postgres").lower()
+CHANGE_CHANNEL = "halo_changes"
+NOTIFY_TABLES = ("player", "team", "deletedplayer", "deletedteam")
+
+# Suscriptor: callback(table, ids) — ids=None significa "cualquier fila de la tabla"
+Subscriber = Callable[[str, Optional[List[int]]], None]
+
+
+# Bus de cambios del proceso. Sirve tal cual como sustituto en memoria para los tests:
+# publish() entrega el evento a los suscriptores de forma síncrona.
+class ChangeBus:
+    def __init__(self):
+        self._subscribers: List[Subscriber] = []
+        self.received = 0
+
+    def subscribe(self, callback: Subscriber):
+        self._subscribers.append(callback)
+
+    def publish(self, table: str, ids: Optional[Iterable[int]] = None):
+        self.received += 1
+        ids = list(ids) if ids is not None else None
+        for callback in list(self._subscribers):
+            try:
+                callback(table, ids)
+            except Exception:
+                logger.exception("Error en suscriptor del bus de cambios")
+
+    # Tras reconectar no sabemos qué se perdió: se invalida todo
+    def publish_all(self):
+        for table in NOTIFY_TABLES:
+            self.publish(table, None)
+
+
+change_bus = ChangeBus()
+
+
+# ---------------------- PUBLICACIÓN LOCAL DESDE EL ORM ----------------------
+# Las escrituras hechas por este worker invalidan su caché justo después del commit,
+# sin esperar el NOTIFY (lectura de lo propio escrito en el mismo worker).
+
+@event.listens_for(ORMSession, "after_flush")
+def _collect_changes(session, flush_context):
+    changed = session.info.setdefault("changed_rows", set())
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        table = getattr(obj, "__tablename__", None)
+        if table in NOTIFY_TABLES:
+            changed.add((table, getattr(obj, "id", None)))
+
+
+# INSERT/UPDATE/DELETE en bloque ejecutados por la sesión (importaciones, sync...) no
+# pasan por session.new/dirty: se marca la tabla completa.
+@event.listens_for(ORMSession, "do_orm_execute")
+def _collect_bulk_changes(orm_execute_state):
+    if not (orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    table = getattr(orm_execute_state.statement, "table", None)
+    if table is not None and table.name in NOTIFY_TABLES:
+        orm_execute_state.session.info.setdefault("changed_rows", set()).add((table.name, None))
+
+
+@event.listens_for(ORMSession, "after_commit")
+def _publish_changes(session):
+    changed = session.info.pop("changed_rows", None)
+    if not changed:
+        return
+    by_table = {}
+    for table, row_id in changed:
+        by_table.setdefault(table, set()).add(row_id)
+    for table, ids in by_table.items():
+        change_bus.publish(table, None if None in ids else ids)
+
+
+@event.listens_for(ORMSession, "after_rollback")
+def _discard_changes(session):
+    session.info.pop("changed_rows", None)
+
+
+# ---------------------- POSTGRESQL: TRIGGERS + LISTEN ----------------------
+
+# Triggers por sentencia con tablas de transición: una sola notificación por INSERT/UPDATE/DELETE
+# aunque toque miles de filas. Si la lista de ids no cabe en el payload (8000 bytes) se envía ids=null.
+NOTIFY_FUNCTION_SQL = f"""
+CREATE OR REPLACE FUNCTION halo_notify_change() RETURNS trigger AS $$
+DECLARE
+    ids json;
+    payload text;
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        SELECT json_agg(id) INTO ids FROM old_rows;
+    ELSE
+        SELECT json_agg(id) INTO ids FROM new_rows;
+    END IF;
+    IF ids IS NULL THEN
+        RETURN NULL;
+    END IF;
+    payload := json_build_object('table', TG_TABLE_NAME, 'op', TG_OP, 'ids', ids)::text;
+    IF octet_length(payload) > 7900 THEN
+        payload := json_build_object('table', TG_TABLE_NAME, 'op', TG_OP, 'ids', NULL)::text;
+    END IF;
+    PERFORM pg_notify('{CHANGE_CHANNEL}', payload);
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+"""
+
+_TRIGGERS = (
+    ("ins", "INSERT", "NEW TABLE AS new_rows"),
+    ("upd", "UPDATE", "NEW TABLE AS new_rows"),
+    ("del", "DELETE", "OLD TABLE AS old_rows"),
+)
+
+
+def install_notify_triggers(engine, tables: Iterable[str] = NOTIFY_TABLES):
+    with engine.begin() as conn:
+        # Varios workers arrancando a la vez no deben pisarse el DDL
+        conn.execute(text("SELECT pg_advisory_xact_lock(hashtext('halo_notify_triggers'))"))
+        conn.execute(text(NOTIFY_FUNCTION_SQL))
+        for table in tables:
+            for suffix, op, referencing in _TRIGGERS:
+                name = f"halo_notify_{table}_{suffix}"
+                conn.execute(text(f"DROP TRIGGER IF EXISTS {name} ON {table}"))
+                conn.execute(text(
+                    f"CREATE TRIGGER {name} AFTER {op} ON {table} REFERENCING {referencing} "
+                    f"FOR EACH STATEMENT EXECUTE FUNCTION halo_notify_change()"
+                ))
+
+
+# Una conexión dedicada por worker (fuera del pool) escuchando el canal en un hilo aparte
+class PostgresChangeListener:
+    def __init__(self, engine, bus: ChangeBus = change_bus, channel: str = CHANGE_CHANNEL):
+        self.engine = engine
+        self.bus = bus
+        self.channel = channel
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.connected = threading.Event()
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="change-listener", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        backoff = 0.5
+        while not self._stop.is_set():
+            raw = None
+            try:
+                raw = self.engine.raw_connection()
+                dbapi_conn = raw.driver_connection
+                raw.detach()  # no vuelve al pool
+                dbapi_conn.autocommit = True
+                dbapi_conn.cursor().execute(f"LISTEN {self.channel}")
+                self.connected.set()
+                self.bus.publish_all()
+                backoff = 0.5
+                while not self._stop.is_set():
+                    if select.select([dbapi_conn], [], [], 1.0) == ([], [], []):
+                        continue
+                    dbapi_conn.poll()
+                    while dbapi_conn.notifies:
+                        self._dispatch(dbapi_conn.notifies.pop(0).payload)
+            except Exception as e:
+                self.connected.clear()
+                logger.warning("Listener de cambios desconectado (%s); reintentando en %.1fs", e, backoff)
+                self._stop.wait(backoff)
+                backoff = min(backoff * 2, 30)
+            finally:
+                if raw is not None:
+                    try:
+                        raw.close()
+                    except Exception:
+                        pass
+
+    def _dispatch(self, payload: str):
+        try:
+            data = json.loads(payload)
+        except ValueError:
+            return
+        self.bus.publish(data.get("table"), data.get("ids"))
+
+
+_listener: Optional[PostgresChangeListener] = None
+
+
+def start_change_bus(engine):
+    global _listener
+    if CHANGE_BUS != "postgres" or engine.dialect.name != "postgresql":
+        return None
+    install_notify_triggers(engine)
+    _listener = PostgresChangeListener(engine)
+    _listener.start()
+    return _listener
+
+
+def stop_change_bus():
+    if _listener is not None:
+        _listener.stop()
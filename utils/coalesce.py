@@ -0,0 +1,101 @@
+import os
+import threading
+from typing import Any, Callable, Dict, Iterable
+
+from utils.cache import LocalCache, Tag
+from utils.change_bus import change_bus
+from utils.metrics import Counter, registry
+
+# Ventana de micro-caché tras resolver una lectura compartida (0 = solo coalescencia)
+COALESCE_WINDOW_MS = float(os.getenv("COALESCE_WINDOW_MS", "250"))
+# Un seguidor no espera más que esto al líder; si se agota hace su propia consulta
+COALESCE_WAIT_SECONDS = 30
+
+coalesce_requests = registry.register(Counter(
+    "halo_coalesce_requests_total",
+    "Lecturas coalescidas: leader ejecuta la consulta, shared/microcache se ahorran una", ("name", "result")))
+
+
+class _Call:
+    __slots__ = ("done", "value", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+# Single-flight: las peticiones idénticas que llegan mientras otra ya está consultando
+# esperan su resultado (ya serializado) en vez de lanzar la misma consulta.
+class SingleFlight:
+    def __init__(self, window_ms: float = COALESCE_WINDOW_MS):
+        self.window = window_ms / 1000
+        self.recent = LocalCache(ttl=self.window)
+        self._calls: Dict[Any, _Call] = {}
+        self._lock = threading.Lock()
+        self.stats_by_result = {"leader": 0, "shared": 0, "microcache": 0}
+
+    def _count(self, name: str, result: str):
+        self.stats_by_result[result] += 1
+        with registry.lock:
+            coalesce_requests.inc((name, result))
+
+    def do(self, name: str, key, tags: Iterable[Tag], fn: Callable[[], Any]):
+        if self.window > 0:
+            value = self.recent.get(key)
+            if value is not None:
+                self._count(name, "microcache")
+                return value
+
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                generation = self.recent.generation
+
+        if not leader:
+            if call.done.wait(COALESCE_WAIT_SECONDS):
+                self._count(name, "shared")
+                if call.error is not None:
+                    raise call.error
+                return call.value
+            return fn()
+
+        self._count(name, "leader")
+        try:
+            call.value = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        if self.window > 0:
+            self.recent.set(key, call.value, tags, generation)
+        return call.value
+
+    def invalidate(self, table: str, ids=None):
+        self.recent.invalidate(table, ids)
+
+    def stats(self) -> dict:
+        return {
+            "window_ms": self.window * 1000,
+            "in_flight": len(self._calls),
+            "microcache_entries": self.recent.stats()["entries"],
+            **self.stats_by_result,
+            "queries_saved": self.stats_by_result["shared"] + self.stats_by_result["microcache"],
+        }
+
+
+single_flight = SingleFlight()
+change_bus.subscribe(single_flight.invalidate)
+
+
+# Para los endpoints: quien acaba de escribir no comparte lecturas (podría recibir una
+# consulta que empezó antes de su escritura)
+def coalesce(session, name: str, key, tags: Iterable[Tag], fn: Callable[[], Any]):
+    if session.info.get("read_your_writes"):
+        return fn()
+    return single_flight.do(name, key, tags, fn)
@@ -1,4 +1,6 @@
 from sqlmodel import SQLModel, create_engine, Session
+from sqlalchemy.pool import QueuePool
+import threading
 from dotenv import load_dotenv
 import os
 
@@ -11,7 +13,34 @@ if not DATABASE_URL:
 
 print(f"Conectando a la base de datos en: {DATABASE_URL}")
 
-engine = create_engine(DATABASE_URL, echo=True)
+# DB_ECHO=false evita volcar cada sentencia a stdout (para consultas lentas ver /admin/slow-queries)
+DB_ECHO = os.getenv("DB_ECHO", "true").lower() in ("1", "true", "yes")
+
+# QueuePool que cuenta cuántos hilos esperan una conexión con el pool agotado.
+# El control de admisión (utils/admission.py) rechaza peticiones cuando esa cola crece.
+class WaitCountingQueuePool(QueuePool):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.waiting = 0
+        self._waiting_lock = threading.Lock()
+
+    def _do_get(self):
+        if self.checkedout() < self.size() + max(self._max_overflow, 0):
+            return super()._do_get()
+        with self._waiting_lock:
+            self.waiting += 1
+        try:
+            return super()._do_get()
+        finally:
+            with self._waiting_lock:
+                self.waiting -= 1
+
+pool_options = {} if DATABASE_URL.startswith("sqlite") else {"poolclass": WaitCountingQueuePool}
+engine = create_engine(DATABASE_URL, echo=DB_ECHO, **pool_options)
+
+# Réplica de solo lectura opcional para los GET (ver utils/read_replica.py)
+READ_DATABASE_URL = os.getenv("READ_DATABASE_URL")
+read_engine = create_engine(READ_DATABASE_URL, echo=DB_ECHO, pool_pre_ping=True) if READ_DATABASE_URL else None
 
 def get_session():
     with Session(engine) as session:
@@ -0,0 +1,538 @@
+import logging
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from fastapi.responses import JSONResponse
+from sqlalchemy import Table, delete, func, select, update
+from sqlalchemy.engine import Engine
+
+from utils.metrics import Counter, Gauge, registry
+
+logger = logging.getLogger("halo.jobs")
+
+# memory: cola dentro del proceso (se pierde al reiniciar) | db: tabla job compartida por todos los workers
+JOBS_BACKEND = os.getenv("JOBS_BACKEND", "memory").lower()
+JOBS_WORKERS = int(os.getenv("JOBS_WORKERS", "2"))
+# Intentos ante errores transitorios (conexión, bloqueos...); los errores de datos fallan a la primera
+JOBS_MAX_ATTEMPTS = int(os.getenv("JOBS_MAX_ATTEMPTS", "3"))
+JOBS_RETRY_BASE_SECONDS = float(os.getenv("JOBS_RETRY_BASE_SECONDS", "5"))
+JOBS_POLL_SECONDS = float(os.getenv("JOBS_POLL_SECONDS", "1"))
+# Un trabajo "running" sin latido durante 3 intervalos se da por perdido y vuelve a la cola
+JOBS_HEARTBEAT_SECONDS = float(os.getenv("JOBS_HEARTBEAT_SECONDS", "10"))
+JOBS_RETENTION_HOURS = float(os.getenv("JOBS_RETENTION_HOURS", "24"))
+# Archivos subidos para importaciones en segundo plano (con JOBS_BACKEND=db debe ser un volumen compartido)
+JOBS_DIR = Path(os.getenv("JOBS_DIR") or Path(tempfile.gettempdir()) / "halo_jobs")
+JOBS_PROGRESS_INTERVAL_SECONDS = 0.5
+
+FINISHED = ("succeeded", "failed", "cancelled")
+RETRYABLE = ("failed", "cancelled")
+
+jobs_total = registry.register(Counter(
+    "halo_jobs_total", "Trabajos en segundo plano por resultado", ("kind", "result")))
+jobs_running = registry.register(Gauge(
+    "halo_jobs_running", "Trabajos en ejecución en este proceso"))
+
+
+class JobCancelled(Exception):
+    pass
+
+
+# Fallo definitivo (entidad inexistente, datos inválidos): no se reintenta
+class JobError(RuntimeError):
+    pass
+
+
+# Cancelar o reintentar un trabajo en un estado que no lo permite
+class JobStateError(RuntimeError):
+    pass
+
+
+def _new_job(kind: str, params: dict, max_attempts: int) -> dict:
+    now = datetime.utcnow()
+    return {
+        "id": uuid.uuid4().hex, "kind": kind, "status": "queued", "params": params,
+        "progress": 0.0, "message": None, "result": None, "error": None,
+        "attempts": 0, "max_attempts": max_attempts, "cancel_requested": False, "worker": None,
+        "created_at": now, "run_after": now, "started_at": None, "finished_at": None, "heartbeat_at": None,
+    }
+
+
+def _requeued_fields(job: dict) -> dict:
+    if job["status"] not in RETRYABLE:
+        raise JobStateError(f"Solo se reintentan trabajos fallidos o cancelados (estado: {job['status']})")
+    return {
+        "status": "queued", "progress": 0.0, "message": None, "result": None, "error": None,
+        "cancel_requested": False, "worker": None, "run_after": datetime.utcnow(), "finished_at": None,
+        # Un reintento manual siempre concede al menos un intento más
+        "max_attempts": max(job["max_attempts"], job["attempts"] + 1),
+    }
+
+
+# ---------------------- ALMACENES ----------------------
+# Todos trabajan con dicts con las columnas de data/models_job.py
+
+class MemoryJobStore:
+    name = "memory"
+
+    def __init__(self):
+        self._jobs: "OrderedDict[str, dict]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, job: dict):
+        with self._lock:
+            self._jobs[job["id"]] = dict(job)
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def list(self, status: Optional[str] = None, kind: Optional[str] = None,
+             limit: int = 50, offset: int = 0) -> List[dict]:
+        with self._lock:
+            jobs = [dict(job) for job in reversed(self._jobs.values())
+                    if (status is None or job["status"] == status) and (kind is None or job["kind"] == kind)]
+        return jobs[offset:offset + limit]
+
+    def counts(self) -> Dict[str, int]:
+        counts: Dict[str, int] = {}
+        with self._lock:
+            for job in self._jobs.values():
+                counts[job["status"]] = counts.get(job["status"], 0) + 1
+        return counts
+
+    def claim(self, worker: str) -> Optional[dict]:
+        now = datetime.utcnow()
+        with self._lock:
+            for job in self._jobs.values():
+                if job["status"] == "queued" and job["run_after"] <= now:
+                    job.update(status="running", attempts=job["attempts"] + 1, worker=worker,
+                               started_at=now, heartbeat_at=now)
+                    return dict(job)
+        return None
+
+    def update(self, job_id: str, **fields):
+        with self._lock:
+            if job_id in self._jobs:
+                self._jobs[job_id].update(fields)
+
+    def request_cancel(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            if job["status"] in FINISHED:
+                raise JobStateError(f"El trabajo ya terminó (estado: {job['status']})")
+            if job["status"] == "queued":
+                job.update(status="cancelled", message="Cancelado antes de empezar", finished_at=datetime.utcnow())
+            else:
+                job["cancel_requested"] = True
+            return dict(job)
+
+    def requeue(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            job.update(_requeued_fields(job))
+            return dict(job)
+
+    # En memoria solo corren los trabajos de este proceso: no hay latidos que comprobar
+    def heartbeat(self, job_ids: List[str]) -> List[str]:
+        return []
+
+    def recover_stale(self, before: datetime) -> int:
+        return 0
+
+    def purge(self, before: datetime) -> List[dict]:
+        with self._lock:
+            old = [job for job in self._jobs.values()
+                   if job["status"] in FINISHED and job["finished_at"] and job["finished_at"] < before]
+            for job in old:
+                del self._jobs[job["id"]]
+        return old
+
+
+# Cola persistente en la tabla job. Cada worker reclama el siguiente trabajo listo con
+# FOR UPDATE SKIP LOCKED: varios procesos (o máquinas) consumen sin pisarse.
+class DatabaseJobStore:
+    name = "db"
+
+    def __init__(self, engine: Engine, table: Table):
+        self.engine = engine
+        self.table = table
+
+    def _one(self, conn, query) -> Optional[dict]:
+        row = conn.execute(query).first()
+        return dict(row._mapping) if row else None
+
+    def add(self, job: dict):
+        with self.engine.begin() as conn:
+            conn.execute(self.table.insert().values(**job))
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self.engine.connect() as conn:
+            return self._one(conn, select(self.table).where(self.table.c.id == job_id))
+
+    def list(self, status: Optional[str] = None, kind: Optional[str] = None,
+             limit: int = 50, offset: int = 0) -> List[dict]:
+        t = self.table
+        query = select(t).order_by(t.c.created_at.desc(), t.c.id).limit(limit).offset(offset)
+        if status is not None:
+            query = query.where(t.c.status == status)
+        if kind is not None:
+            query = query.where(t.c.kind == kind)
+        with self.engine.connect() as conn:
+            return [dict(row._mapping) for row in conn.execute(query)]
+
+    def counts(self) -> Dict[str, int]:
+        t = self.table
+        with self.engine.connect() as conn:
+            return dict(conn.execute(select(t.c.status, func.count()).group_by(t.c.status)).all())
+
+    def claim(self, worker: str) -> Optional[dict]:
+        t = self.table
+        now = datetime.utcnow()
+        next_id = (
+            select(t.c.id)
+            .where(t.c.status == "queued", t.c.run_after <= now)
+            .order_by(t.c.run_after, t.c.created_at)
+            .limit(1)
+            .with_for_update(skip_locked=True)
+            .scalar_subquery()
+        )
+        query = (
+            update(t).where(t.c.id == next_id)
+            .values(status="running", attempts=t.c.attempts + 1, worker=worker, started_at=now, heartbeat_at=now)
+            .returning(*t.c)
+        )
+        with self.engine.begin() as conn:
+            return self._one(conn, query)
+
+    def update(self, job_id: str, **fields):
+        with self.engine.begin() as conn:
+            conn.execute(update(self.table).where(self.table.c.id == job_id).values(**fields))
+
+    def _locked(self, conn, job_id: str) -> Optional[dict]:
+        return self._one(conn, select(self.table).where(self.table.c.id == job_id).with_for_update())
+
+    def request_cancel(self, job_id: str) -> Optional[dict]:
+        with self.engine.begin() as conn:
+            job = self._locked(conn, job_id)
+            if job is None:
+                return None
+            if job["status"] in FINISHED:
+                raise JobStateError(f"El trabajo ya terminó (estado: {job['status']})")
+            if job["status"] == "queued":
+                fields = {"status": "cancelled", "message": "Cancelado antes de empezar",
+                          "finished_at": datetime.utcnow()}
+            else:
+                fields = {"cancel_requested": True}
+            conn.execute(update(self.table).where(self.table.c.id == job_id).values(**fields))
+            return {**job, **fields}
+
+    def requeue(self, job_id: str) -> Optional[dict]:
+        with self.engine.begin() as conn:
+            job = self._locked(conn, job_id)
+            if job is None:
+                return None
+            fields = _requeued_fields(job)
+            conn.execute(update(self.table).where(self.table.c.id == job_id).values(**fields))
+            return {**job, **fields}
+
+    # Renueva el latido de los trabajos de este proceso y devuelve los que otro worker pidió cancelar
+    def heartbeat(self, job_ids: List[str]) -> List[str]:
+        if not job_ids:
+            return []
+        t = self.table
+        with self.engine.begin() as conn:
+            conn.execute(update(t).where(t.c.id.in_(job_ids), t.c.status == "running")
+                         .values(heartbeat_at=datetime.utcnow()))
+            return list(conn.execute(select(t.c.id).where(t.c.id.in_(job_ids), t.c.cancel_requested)).scalars())
+
+    # Trabajos de un worker caído: vuelven a la cola si les quedan intentos
+    def recover_stale(self, before: datetime) -> int:
+        t = self.table
+        stale = (t.c.status == "running", t.c.heartbeat_at < before)
+        now = datetime.utcnow()
+        with self.engine.begin() as conn:
+            requeued = conn.execute(
+                update(t).where(*stale, t.c.attempts < t.c.max_attempts)
+                .values(status="queued", worker=None, run_after=now)
+            ).rowcount
+            conn.execute(
+                update(t).where(*stale)
+                .values(status="failed", worker=None, finished_at=now, error="El worker dejó de responder")
+            )
+        return requeued
+
+    def purge(self, before: datetime) -> List[dict]:
+        t = self.table
+        with self.engine.begin() as conn:
+            rows = conn.execute(
+                delete(t).where(t.c.status.in_(FINISHED), t.c.finished_at < before).returning(*t.c)
+            )
+            return [dict(row._mapping) for row in rows]
+
+
+# ---------------------- CONTEXTO DEL TRABAJO ----------------------
+
+# Se pasa al handler: informa del progreso y es el punto donde se atiende la cancelación
+# (lanza JobCancelled; lo no confirmado de la transacción en curso se descarta).
+class JobContext:
+    def __init__(self, queue: "JobQueue", job: dict):
+        self.queue = queue
+        self.job_id = job["id"]
+        self.attempt = job["attempts"]
+        self.cancel_event = threading.Event()
+        self._last_report = 0.0
+
+    @property
+    def cancelled(self) -> bool:
+        return self.cancel_event.is_set()
+
+    def check_cancelled(self):
+        if self.cancelled:
+            raise JobCancelled()
+
+    # progress(done, total) o progress(fracción); se escribe como mucho cada medio segundo
+    def progress(self, done: float, total: Optional[float] = None, message: Optional[str] = None):
+        self.check_cancelled()
+        now = time.monotonic()
+        if message is None and now - self._last_report < JOBS_PROGRESS_INTERVAL_SECONDS:
+            return
+        self._last_report = now
+        fraction = done if total is None else (done / total if total else 1.0)
+        fields = {"progress": round(min(max(fraction, 0.0), 1.0), 4)}
+        if message is not None:
+            fields["message"] = message
+        self.queue.store.update(self.job_id, **fields)
+
+
+# ---------------------- COLA ----------------------
+
+# Grupo fijo de hilos que consume del almacén. Los handlers se registran por tipo:
+#   @job_queue.handler("delete_team")
+#   def run(ctx, team_id): ...
+# Lo que devuelvan (JSON) queda como resultado del trabajo.
+class JobQueue:
+    def __init__(self, store, workers: int = JOBS_WORKERS, max_attempts: int = JOBS_MAX_ATTEMPTS,
+                 upload_dir: Path = JOBS_DIR):
+        self.store = store
+        self.workers = max(workers, 1)
+        self.max_attempts = max_attempts
+        self.upload_dir = upload_dir
+        self.handlers: Dict[str, Callable] = {}
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._running: Dict[str, JobContext] = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition()
+        self._signals = 0
+        self._threads: List[threading.Thread] = []
+        self._last_purge = 0.0
+
+    def handler(self, kind: str):
+        def register(fn):
+            self.handlers[kind] = fn
+            return fn
+        return register
+
+    def configure(self, store):
+        self.store = store
+
+    def start(self):
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                self._threads.append(threading.Thread(target=self._worker, name=f"jobs-{i}", daemon=True))
+            self._threads.append(threading.Thread(target=self._maintenance, name="jobs-maintenance", daemon=True))
+            for thread in self._threads:
+                thread.start()
+
+    def _signal(self):
+        with self._wakeup:
+            self._signals += 1
+            self._wakeup.notify()
+
+    def _wait(self):
+        with self._wakeup:
+            if not self._signals:
+                self._wakeup.wait(JOBS_POLL_SECONDS)
+            self._signals = max(self._signals - 1, 0)
+
+    def submit(self, kind: str, params: Optional[dict] = None, max_attempts: Optional[int] = None) -> dict:
+        if kind not in self.handlers:
+            raise KeyError(f"Tipo de trabajo desconocido: {kind}")
+        job = _new_job(kind, params or {}, max_attempts or self.max_attempts)
+        self.store.add(job)
+        self.start()
+        self._signal()
+        return job
+
+    # Copia un archivo subido fuera del spool de la petición; el trabajo lo borra al terminar bien
+    def save_upload(self, source) -> str:
+        self.upload_dir.mkdir(parents=True, exist_ok=True)
+        path = self.upload_dir / f"{uuid.uuid4().hex}.upload"
+        with open(path, "wb") as target:
+            shutil.copyfileobj(source, target)
+        return str(path)
+
+    def _discard_upload(self, job: dict):
+        upload = (job.get("params") or {}).get("upload")
+        if upload and Path(upload).parent == self.upload_dir:
+            Path(upload).unlink(missing_ok=True)
+
+    def get(self, job_id: str) -> Optional[dict]:
+        return self.store.get(job_id)
+
+    def list(self, **filters) -> List[dict]:
+        return self.store.list(**filters)
+
+    def cancel(self, job_id: str) -> Optional[dict]:
+        job = self.store.request_cancel(job_id)
+        if job is not None and job["status"] == "running":
+            with self._lock:
+                ctx = self._running.get(job_id)
+            if ctx is not None:
+                ctx.cancel_event.set()
+        return job
+
+    def retry(self, job_id: str) -> Optional[dict]:
+        job = self.store.requeue(job_id)
+        if job is not None:
+            self.start()
+            self._signal()
+        return job
+
+    # Para tests y scripts: espera a que el trabajo termine
+    def wait(self, job_id: str, timeout: float = 30) -> Optional[dict]:
+        deadline = time.monotonic() + timeout
+        while True:
+            job = self.store.get(job_id)
+            if job is None or job["status"] in FINISHED or time.monotonic() > deadline:
+                return job
+            time.sleep(0.02)
+
+    def _count(self, kind: str, result: str):
+        with registry.lock:
+            jobs_total.inc((kind, result))
+
+    def _set_running(self):
+        with self._lock:
+            running = len(self._running)
+        with registry.lock:
+            jobs_running.set(running)
+
+    def _worker(self):
+        while True:
+            try:
+                job = self.store.claim(self.worker_id)
+            except Exception:
+                logger.exception("No se pudo reclamar un trabajo")
+                job = None
+            if job is None:
+                self._wait()
+                continue
+            self._run(job)
+
+    def _finish(self, job: dict, status: str, **fields):
+        self.store.update(job["id"], status=status, finished_at=datetime.utcnow(), worker=None, **fields)
+        self._count(job["kind"], status)
+
+    def _run(self, job: dict):
+        ctx = JobContext(self, job)
+        with self._lock:
+            self._running[job["id"]] = ctx
+        self._set_running()
+        try:
+            handler = self.handlers.get(job["kind"])
+            if handler is None:
+                raise JobError(f"Tipo de trabajo desconocido: {job['kind']}")
+            if job["cancel_requested"]:
+                raise JobCancelled()
+            result = handler(ctx, **job["params"])
+        except JobCancelled:
+            self._finish(job, "cancelled", message="Cancelado")
+        except JobError as e:
+            self._finish(job, "failed", error=str(e))
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            if job["attempts"] < job["max_attempts"]:
+                logger.warning("Trabajo %s (%s) falló en el intento %d; se reintenta: %s",
+                               job["id"], job["kind"], job["attempts"], error)
+                delay = JOBS_RETRY_BASE_SECONDS * (2 ** (job["attempts"] - 1))
+                self.store.update(job["id"], status="queued", error=error, worker=None,
+                                  run_after=datetime.utcnow() + timedelta(seconds=delay))
+                self._count(job["kind"], "retried")
+            else:
+                logger.exception("Trabajo %s (%s) fallido", job["id"], job["kind"])
+                self._finish(job, "failed", error=error)
+        else:
+            self._finish(job, "succeeded", result=result, progress=1.0)
+            self._discard_upload(job)
+        finally:
+            with self._lock:
+                self._running.pop(job["id"], None)
+            self._set_running()
+
+    # Latidos, cancelaciones pedidas desde otro proceso, recuperación de trabajos huérfanos y purga
+    def _maintenance(self):
+        while True:
+            time.sleep(JOBS_HEARTBEAT_SECONDS)
+            try:
+                with self._lock:
+                    running = dict(self._running)
+                for job_id in self.store.heartbeat(list(running)):
+                    running[job_id].cancel_event.set()
+                if self.store.recover_stale(datetime.utcnow() - timedelta(seconds=3 * JOBS_HEARTBEAT_SECONDS)):
+                    self._signal()
+                if time.monotonic() - self._last_purge > 3600:
+                    self._last_purge = time.monotonic()
+                    for job in self.store.purge(datetime.utcnow() - timedelta(hours=JOBS_RETENTION_HOURS)):
+                        self._discard_upload(job)
+            except Exception:
+                logger.exception("Error en el mantenimiento de la cola de trabajos")
+
+    def status(self) -> dict:
+        with self._lock:
+            running = list(self._running)
+        return {
+            "backend": self.store.name,
+            "workers": self.workers,
+            "started": bool(self._threads),
+            "running_here": running,
+            "kinds": sorted(self.handlers),
+            "jobs": self.store.counts(),
+        }
+
+
+# Vista pública de un trabajo (la ruta del archivo subido es un detalle interno)
+def job_public(job: dict) -> dict:
+    data = dict(job)
+    data["params"] = {k: v for k, v in (job.get("params") or {}).items() if k != "upload"}
+    data.pop("worker", None)
+    data["url"] = f"/jobs/{job['id']}"
+    return data
+
+
+# 202 Accepted con la URL de seguimiento
+def job_accepted(job: dict) -> JSONResponse:
+    url = f"/jobs/{job['id']}"
+    return JSONResponse(
+        status_code=202,
+        content={"job_id": job["id"], "kind": job["kind"], "status": job["status"], "url": url},
+        headers={"Location": url},
+    )
+
+
+job_queue = JobQueue(MemoryJobStore())
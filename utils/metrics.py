@@ -0,0 +1,173 @@
+import os
+import threading
+import time
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Tuple
+
+from utils.request_context import UNMATCHED_ROUTE, current_request, install_query_timing
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+
+
+def _labels(names: Tuple[str, ...], values: Tuple[str, ...]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(
+        f'{n}="{str(v).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+        for n, v in zip(names, values)
+    )
+    return "{" + pairs + "}"
+
+
+# ---------------------- TIPOS DE MÉTRICA ----------------------
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = ()):
+        self.name, self.help, self.label_names = name, help_text, labels
+        self.values: Dict[tuple, float] = {}
+
+    def inc(self, labels: tuple = (), amount: float = 1.0):
+        self.values[labels] = self.values.get(labels, 0.0) + amount
+
+    def render(self) -> Iterable[str]:
+        for labels, value in self.values.items():
+            yield f"{self.name}{_labels(self.label_names, labels)} {value}"
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, labels: tuple = (), amount: float = 1.0):
+        self.inc(labels, -amount)
+
+    def set(self, value: float, labels: tuple = ()):
+        self.values[labels] = value
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = (), buckets=LATENCY_BUCKETS):
+        self.name, self.help, self.label_names = name, help_text, labels
+        self.buckets = tuple(buckets)
+        # Por serie: [conteos por bucket (no acumulados) + overflow, suma, total]
+        self.series: Dict[tuple, list] = {}
+
+    def observe(self, value: float, labels: tuple = ()):
+        data = self.series.get(labels)
+        if data is None:
+            data = self.series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        data[0][bisect_left(self.buckets, value)] += 1
+        data[1] += value
+        data[2] += 1
+
+    def render(self) -> Iterable[str]:
+        names = self.label_names + ("le",)
+        for labels, (counts, total, count) in self.series.items():
+            cumulative = 0
+            for bound, c in zip(self.buckets, counts):
+                cumulative += c
+                yield f"{self.name}_bucket{_labels(names, labels + (repr(float(bound)),))} {cumulative}"
+            yield f"{self.name}_bucket{_labels(names, labels + ('+Inf',))} {count}"
+            yield f"{self.name}_sum{_labels(self.label_names, labels)} {total}"
+            yield f"{self.name}_count{_labels(self.label_names, labels)} {count}"
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.metrics: List = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    # Formato de exposición de texto de Prometheus (version=0.0.4)
+    def render(self) -> str:
+        lines = []
+        with self.lock:
+            for metric in self.metrics:
+                lines.append(f"# HELP {metric.name} {metric.help}")
+                lines.append(f"# TYPE {metric.name} {metric.kind}")
+                lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+http_requests = registry.register(Counter(
+    "halo_http_requests_total", "Peticiones HTTP atendidas", ("method", "route", "status")))
+http_latency = registry.register(Histogram(
+    "halo_http_request_duration_seconds", "Latencia de las peticiones HTTP", ("method", "route")))
+http_in_progress = registry.register(Gauge(
+    "halo_http_requests_in_progress", "Peticiones HTTP en curso", ("method",)))
+http_response_size = registry.register(Histogram(
+    "halo_http_response_size_bytes", "Tamaño del cuerpo de respuesta", ("method", "route"), SIZE_BUCKETS))
+db_queries = registry.register(Counter(
+    "halo_db_queries_total", "Sentencias SQL ejecutadas por ruta", ("route",)))
+db_time = registry.register(Counter(
+    "halo_db_query_duration_seconds_total", "Tiempo acumulado en sentencias SQL por ruta", ("route",)))
+upload_bytes = registry.register(Counter(
+    "halo_upload_bytes_total", "Bytes de imágenes subidas desde los formularios", ("route",)))
+
+
+# Llamado por los handlers de formularios con imagen
+def record_upload(size: int):
+    ctx = current_request.get()
+    if ctx is not None:
+        ctx.upload_bytes += size
+
+
+# ---------------------- MIDDLEWARE ASGI ----------------------
+
+# Middleware ASGI puro (sin BaseHTTPMiddleware) para mantener bajo el costo por petición
+# y no bufferizar respuestas en streaming. Debe ir dentro de RequestContextMiddleware.
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        method = scope["method"]
+        ctx = current_request.get()
+        status = [500]
+        size = [0]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            elif message["type"] == "http.response.body":
+                size[0] += len(message.get("body", b""))
+            await send(message)
+
+        with registry.lock:
+            http_in_progress.inc((method,))
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            route = ctx.route if ctx is not None else UNMATCHED_ROUTE
+            with registry.lock:
+                http_in_progress.dec((method,))
+                http_requests.inc((method, route, str(status[0])))
+                http_latency.observe(elapsed, (method, route))
+                http_response_size.observe(size[0], (method, route))
+                if ctx is not None and ctx.db_queries:
+                    db_queries.inc((route,), ctx.db_queries)
+                    db_time.inc((route,), ctx.db_time)
+                if ctx is not None and ctx.upload_bytes:
+                    upload_bytes.inc((route,), ctx.upload_bytes)
+
+
+# Middleware de métricas y conteo de sentencias SQL por petición (solo con METRICS_ENABLED)
+def install_metrics(app):
+    install_query_timing()
+    app.add_middleware(MetricsMiddleware)
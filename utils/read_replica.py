@@ -0,0 +1,178 @@
+import logging
+import os
+import threading
+import time
+from http.cookies import SimpleCookie
+from typing import Optional
+
+from fastapi import Request
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+from sqlmodel import Session
+
+from utils.db import engine as primary_engine, read_engine
+from utils.metrics import Counter, registry
+
+logger = logging.getLogger("halo.read_replica")
+
+# Segundos tras una escritura del cliente en los que sus lecturas van al primario
+READ_YOUR_WRITES_SECONDS = float(os.getenv("READ_YOUR_WRITES_SECONDS", "5"))
+# Retraso máximo tolerado en la réplica antes de desviar las lecturas al primario
+REPLICA_MAX_LAG_SECONDS = float(os.getenv("REPLICA_MAX_LAG_SECONDS", "2"))
+# Cada cuánto se vuelve a medir el retraso (y se reintenta una réplica caída)
+REPLICA_CHECK_SECONDS = float(os.getenv("REPLICA_CHECK_SECONDS", "2"))
+
+LAST_WRITE_COOKIE = "halo_last_write"
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+db_reads = registry.register(Counter(
+    "halo_db_reads_total", "Sesiones de solo lectura por destino", ("target", "reason")))
+
+# Retraso de la réplica en segundos. Un standby sin tráfico nuevo tiene un
+# pg_last_xact_replay_timestamp() viejo: si ya aplicó todo lo recibido, el retraso es 0.
+# Fuera de recuperación (p. ej. dos bases locales en desarrollo) también es 0.
+LAG_SQL = """
+SELECT CASE
+    WHEN NOT pg_is_in_recovery() THEN 0
+    WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+    ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+END
+"""
+
+
+# Decide a qué motor va cada sesión de lectura
+class ReplicaRouter:
+    def __init__(self, primary, replica=None):
+        self.primary = primary
+        self.replica = replica
+        self.lag: Optional[float] = None
+        self.down = False
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def configure(self, replica):
+        with self._lock:
+            self.replica = replica
+            self.lag = None
+            self.down = False
+            self._checked_at = 0.0
+
+    def _measure_lag(self) -> float:
+        with self.replica.connect() as conn:
+            if conn.dialect.name != "postgresql":
+                return 0.0
+            return float(conn.execute(text(LAG_SQL)).scalar() or 0)
+
+    # Mide el retraso como mucho una vez cada REPLICA_CHECK_SECONDS; si otro hilo ya
+    # está midiendo se usa el último valor conocido en lugar de esperar.
+    def _refresh(self):
+        if time.monotonic() - self._checked_at < REPLICA_CHECK_SECONDS:
+            return
+        if not self._lock.acquire(blocking=False):
+            return
+        try:
+            try:
+                self.lag = self._measure_lag()
+                if self.down:
+                    logger.info("Réplica de lectura disponible de nuevo (retraso %.2fs)", self.lag)
+                self.down = False
+            except DBAPIError as e:
+                if not self.down:
+                    logger.warning("Réplica de lectura no disponible: %s", e)
+                self.down = True
+            self._checked_at = time.monotonic()
+        finally:
+            self._lock.release()
+
+    def mark_down(self):
+        self.down = True
+        self._checked_at = time.monotonic()
+
+    def replica_usable(self) -> bool:
+        if self.replica is None:
+            return False
+        self._refresh()
+        return not self.down and (self.lag or 0) <= REPLICA_MAX_LAG_SECONDS
+
+    def status(self) -> dict:
+        return {
+            "configured": self.replica is not None,
+            "down": self.down,
+            "lag_seconds": self.lag,
+            "max_lag_seconds": REPLICA_MAX_LAG_SECONDS,
+            "read_your_writes_seconds": READ_YOUR_WRITES_SECONDS,
+        }
+
+
+replica_router = ReplicaRouter(primary_engine, read_engine)
+
+
+def recent_write(request: Request) -> bool:
+    try:
+        last_write = float(request.cookies.get(LAST_WRITE_COOKIE, 0))
+    except ValueError:
+        return False
+    return time.time() - last_write < READ_YOUR_WRITES_SECONDS
+
+
+# Dependencia para los endpoints de solo lectura. Sin réplica configurada es igual a get_session.
+def get_read_session(request: Request):
+    if replica_router.replica is None:
+        target, reason = replica_router.primary, "no_replica"
+    elif recent_write(request):
+        target, reason = replica_router.primary, "read_your_writes"
+    elif not replica_router.replica_usable():
+        target, reason = replica_router.primary, "replica_down" if replica_router.down else "replica_lag"
+    else:
+        target, reason = replica_router.replica, "replica"
+
+    session = Session(target)
+    if target is replica_router.replica:
+        # Se pide la conexión ya: si la réplica cayó desde la última medición se usa el primario
+        try:
+            session.connection()
+        except DBAPIError as e:
+            logger.warning("Fallo al conectar con la réplica, se usa el primario: %s", e)
+            replica_router.mark_down()
+            session.close()
+            target, reason = replica_router.primary, "replica_down"
+            session = Session(target)
+    session.info["read_only"] = True
+    # Marca para ReadYourWritesMiddleware: un POST de solo lectura (multi-get) no es una escritura
+    request.state.read_only = True
+    session.info["replica"] = target is replica_router.replica
+    # Quien acaba de escribir no debe leer la caché local (puede venir de una réplica atrasada)
+    session.info["read_your_writes"] = reason == "read_your_writes"
+    db_reads.inc(("replica" if session.info["replica"] else "primary", reason))
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+# ---------------------- MIDDLEWARE ASGI ----------------------
+
+# Marca con una cookie la hora de la última escritura correcta del cliente, para que sus
+# siguientes lecturas (también las de la redirección tras un formulario) vayan al primario.
+class ReadYourWritesMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] in SAFE_METHODS:
+            return await self.app(scope, receive, send)
+
+        async def send_wrapper(message):
+            # Los endpoints con get_read_session marcan la petición (request.state) como de solo lectura
+            read_only = scope.get("state", {}).get("read_only", False)
+            if message["type"] == "http.response.start" and message["status"] < 400 and not read_only:
+                cookie = SimpleCookie()
+                cookie[LAST_WRITE_COOKIE] = f"{time.time():.3f}"
+                cookie[LAST_WRITE_COOKIE]["path"] = "/"
+                cookie[LAST_WRITE_COOKIE]["max-age"] = max(int(READ_YOUR_WRITES_SECONDS), 1)
+                cookie[LAST_WRITE_COOKIE]["samesite"] = "Lax"
+                header = cookie.output(header="").strip().encode("latin-1")
+                message["headers"] = list(message.get("headers", [])) + [(b"set-cookie", header)]
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
@@ -0,0 +1,94 @@
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+UNMATCHED_ROUTE = "<unmatched>"
+
+
+# Estado mutable de la petición en curso. Se guarda un objeto (no valores sueltos)
+# en el ContextVar para que lo que escriben los endpoints síncronos desde el
+# threadpool siga siendo visible para el middleware al terminar la petición.
+class RequestContext:
+    __slots__ = ("scope", "db_queries", "db_time", "upload_bytes")
+
+    def __init__(self, scope: dict):
+        self.scope = scope
+        self.db_queries = 0
+        self.db_time = 0.0
+        self.upload_bytes = 0
+
+    # Plantilla de la ruta ("/players/{player_id}"), no la URL concreta, para no disparar la cardinalidad
+    @property
+    def route(self) -> str:
+        return route_label(self.scope)
+
+
+current_request: ContextVar[Optional[RequestContext]] = ContextVar("current_request", default=None)
+
+
+def route_label(scope: dict) -> str:
+    route = scope.get("route")
+    if route is not None:
+        return getattr(route, "path", UNMATCHED_ROUTE)
+    if scope.get("app_root_path") is not None and scope.get("root_path"):
+        # Montajes como /static
+        return scope["root_path"]
+    return UNMATCHED_ROUTE
+
+
+def get_request_context() -> Optional[RequestContext]:
+    return current_request.get()
+
+
+# ---------------------- HOOKS DE SQLALCHEMY ----------------------
+# Solo se instalan con las métricas activas (install_query_timing): si no, cada sentencia
+# de cada motor pagaría por ellos sin que nadie lea los contadores.
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get("query_start")
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    ctx = current_request.get()
+    if ctx is not None:
+        ctx.db_queries += 1
+        ctx.db_time += elapsed
+
+
+def _handle_error(exception_context):
+    conn = exception_context.connection
+    if conn is not None and conn.info.get("query_start"):
+        conn.info["query_start"].pop()
+
+
+# Escuchamos en la clase Engine para cubrir cualquier motor (primario, réplicas...)
+def install_query_timing():
+    if event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+        return
+    event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(Engine, "handle_error", _handle_error)
+
+
+# ---------------------- MIDDLEWARE ASGI ----------------------
+
+# Crea el RequestContext de cada petición HTTP; debe ser el middleware más externo
+class RequestContextMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        token = current_request.set(RequestContext(scope))
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            current_request.reset(token)
@@ -0,0 +1,145 @@
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from utils.request_context import current_request
+
+logger = logging.getLogger("halo.slow_queries")
+
+# 0 desactiva el registro
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+SLOW_QUERY_BUFFER = int(os.getenv("SLOW_QUERY_BUFFER", "200"))
+# Fracción de consultas lentas a las que se les captura el plan con EXPLAIN
+SLOW_QUERY_EXPLAIN_SAMPLE = float(os.getenv("SLOW_QUERY_EXPLAIN_SAMPLE", "0.1"))
+# No repetir el EXPLAIN de la misma sentencia antes de este intervalo (segundos)
+EXPLAIN_COOLDOWN = 60.0
+MAX_PARAMS_LEN = 1000
+
+
+class SlowQueryLog:
+    def __init__(self, maxlen: int = SLOW_QUERY_BUFFER):
+        self.entries: deque = deque(maxlen=maxlen)
+        self.lock = threading.Lock()
+        self.total = 0
+        self._explained: Dict[str, float] = {}
+        self._explain_queue: "queue.Queue" = queue.Queue(maxsize=100)
+        self._worker: Optional[threading.Thread] = None
+
+    def record(self, engine, statement: str, parameters, elapsed: float):
+        ctx = current_request.get()
+        entry = {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "duration_ms": round(elapsed * 1000, 2),
+            "statement": statement,
+            "parameters": repr(parameters)[:MAX_PARAMS_LEN],
+            "route": ctx.route if ctx is not None else None,
+            "method": ctx.scope.get("method") if ctx is not None else None,
+            "plan": None,
+        }
+        with self.lock:
+            self.entries.append(entry)
+            self.total += 1
+        logger.warning("Consulta lenta (%.1f ms) en %s: %s", entry["duration_ms"], entry["route"], statement)
+        if self._should_explain(engine, statement):
+            try:
+                self._explain_queue.put_nowait((engine, statement, parameters, entry))
+                self._ensure_worker()
+            except queue.Full:
+                pass
+
+    def _should_explain(self, engine, statement: str) -> bool:
+        if engine.dialect.name != "postgresql" or random.random() >= SLOW_QUERY_EXPLAIN_SAMPLE:
+            return False
+        now = time.monotonic()
+        with self.lock:
+            last = self._explained.get(statement)
+            if last is not None and now - last < EXPLAIN_COOLDOWN:
+                return False
+            if len(self._explained) > 1000:
+                self._explained.clear()
+            self._explained[statement] = now
+        return True
+
+    def _ensure_worker(self):
+        if self._worker is None or not self._worker.is_alive():
+            self._worker = threading.Thread(target=self._explain_loop, name="slow-query-explain", daemon=True)
+            self._worker.start()
+
+    # El EXPLAIN se ejecuta en un hilo aparte para no sumar latencia a la petición lenta
+    def _explain_loop(self):
+        while True:
+            engine, statement, parameters, entry = self._explain_queue.get()
+            try:
+                entry["plan"] = explain(engine, statement, parameters)
+            except Exception as e:
+                entry["plan"] = {"error": str(e)}
+
+    def snapshot(self, limit: Optional[int] = None) -> List[dict]:
+        with self.lock:
+            entries = list(self.entries)
+        entries.reverse()
+        return entries[:limit] if limit else entries
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.total = 0
+
+
+# ANALYZE ejecuta la sentencia de verdad: solo se usa con SELECT y siempre dentro
+# de una transacción que se revierte. Para escrituras se captura el plan estimado.
+def explain(engine, statement: str, parameters):
+    is_select = statement.lstrip().lower().startswith(("select", "with"))
+    options = "ANALYZE, BUFFERS, FORMAT JSON" if is_select else "FORMAT JSON"
+    if isinstance(parameters, (list, tuple)) and parameters and isinstance(parameters[0], (dict, list, tuple)):
+        parameters = parameters[0]  # executemany: basta con el primer juego de parámetros
+    # Conexión DBAPI directa: no dispara los eventos de SQLAlchemy ni se registra a sí misma
+    raw = engine.raw_connection()
+    try:
+        cursor = raw.cursor()
+        cursor.execute(f"EXPLAIN ({options}) {statement}", parameters or None)
+        plan = cursor.fetchone()[0]
+        return json.loads(plan) if isinstance(plan, str) else plan
+    finally:
+        raw.rollback()
+        raw.close()
+
+
+slow_query_log = SlowQueryLog()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("slow_query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get("slow_query_start")
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    if elapsed * 1000 >= SLOW_QUERY_MS:
+        slow_query_log.record(conn.engine, statement, parameters, elapsed)
+
+
+def _handle_error(exception_context):
+    conn = exception_context.connection
+    if conn is not None and conn.info.get("slow_query_start"):
+        conn.info["slow_query_start"].pop()
+
+
+def install_slow_query_log():
+    if SLOW_QUERY_MS <= 0:
+        return
+    event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(Engine, "handle_error", _handle_error)
@@ -0,0 +1,148 @@
+import logging
+import os
+import re
+import time
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from utils.request_context import route_label
+
+logger = logging.getLogger("halo.sql_profiler")
+
+SQL_PROFILER_ENABLED = os.getenv("SQL_PROFILER_ENABLED", "false").lower() in ("1", "true", "yes")
+# Veces que se puede repetir la misma forma de sentencia en una petición antes de marcarla como N+1
+NPLUS1_THRESHOLD = int(os.getenv("SQL_PROFILER_NPLUS1_THRESHOLD", "5"))
+
+_NUMBER = re.compile(r"\b\d+(\.\d+)?\b")
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_IN_LIST = re.compile(r"\(\s*(\?|%\([^)]*\)s|\$\d+)(\s*,\s*(\?|%\([^)]*\)s|\$\d+))+\s*\)")
+_PARAM = re.compile(r"%\([^)]*\)s|\$\d+")
+_SPACES = re.compile(r"\s+")
+
+
+# Normaliza una sentencia a su "forma": sin literales ni nombres de parámetros,
+# para que "WHERE id = 1" y "WHERE id = 2" cuenten como la misma consulta.
+def statement_shape(statement: str) -> str:
+    shape = _STRING.sub("?", statement)
+    shape = _NUMBER.sub("?", shape)
+    shape = _IN_LIST.sub("(?, ...)", shape)
+    shape = _PARAM.sub("?", shape)
+    return _SPACES.sub(" ", shape).strip()
+
+
+class RequestProfile:
+    __slots__ = ("queries", "db_time", "shapes")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        # forma -> [veces, tiempo acumulado]
+        self.shapes: Dict[str, list] = {}
+
+    def record(self, statement: str, elapsed: float):
+        self.queries += 1
+        self.db_time += elapsed
+        entry = self.shapes.get(statement)
+        if entry is None:
+            self.shapes[statement] = [1, elapsed]
+        else:
+            entry[0] += 1
+            entry[1] += elapsed
+
+    # Se normaliza al final (una vez por sentencia distinta) y no en cada ejecución
+    def repeated_shapes(self, threshold: int = NPLUS1_THRESHOLD) -> List[tuple]:
+        grouped: Dict[str, list] = {}
+        for statement, (count, elapsed) in self.shapes.items():
+            entry = grouped.setdefault(statement_shape(statement), [0, 0.0])
+            entry[0] += count
+            entry[1] += elapsed
+        return sorted(
+            ((shape, count, elapsed) for shape, (count, elapsed) in grouped.items() if count >= threshold),
+            key=lambda item: item[1],
+            reverse=True,
+        )
+
+
+_current_profile: ContextVar[Optional[RequestProfile]] = ContextVar("current_profile", default=None)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current_profile.get() is not None:
+        conn.info.setdefault("profiler_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = _current_profile.get()
+    starts = conn.info.get("profiler_start")
+    if profile is None or not starts:
+        return
+    profile.record(statement, time.perf_counter() - starts.pop())
+
+
+def _handle_error(exception_context):
+    conn = exception_context.connection
+    if conn is not None and conn.info.get("profiler_start"):
+        conn.info["profiler_start"].pop()
+
+
+def _server_timing(profile: RequestProfile, total: float, suspects: List[tuple]) -> bytes:
+    parts = [
+        f'db;dur={profile.db_time * 1000:.2f};desc="{profile.queries} queries"',
+        f"app;dur={max(total - profile.db_time, 0) * 1000:.2f}",
+    ]
+    if suspects:
+        parts.append(f'nplus1;desc="{len(suspects)} repeated shapes"')
+    return ", ".join(parts).encode("latin-1")
+
+
+# Middleware ASGI opcional: cuenta y cronometra cada sentencia SQL de la petición,
+# detecta posibles N+1 y publica los totales en la cabecera Server-Timing.
+class SQLProfilerMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        profile = RequestProfile()
+        token = _current_profile.set(profile)
+        start = time.perf_counter()
+        reported = [False]
+
+        def report():
+            reported[0] = True
+            suspects = profile.repeated_shapes()
+            route = route_label(scope)
+            logger.debug("%s %s: %d consultas en %.2f ms", scope["method"], route, profile.queries,
+                         profile.db_time * 1000)
+            for shape, count, elapsed in suspects:
+                logger.warning("Posible N+1 en %s %s: %d x (%.2f ms) %s", scope["method"], route, count,
+                               elapsed * 1000, shape)
+            return suspects
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                suspects = report()
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", _server_timing(profile, time.perf_counter() - start, suspects)))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current_profile.reset(token)
+            if not reported[0]:
+                report()
+
+
+# Los listeners solo se registran si el perfilador está activo: desactivado no cuesta nada
+def install_sql_profiler(app):
+    event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(Engine, "handle_error", _handle_error)
+    app.add_middleware(SQLProfilerMiddleware)
@@ -0,0 +1,319 @@
+import hashlib
+import hmac
+import http.client
+import logging
+import mimetypes
+import os
+import queue
+import random
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Dict, Hashable, Optional
+from urllib.parse import quote, urlsplit
+
+from utils.metrics import Counter, Gauge, registry
+
+logger = logging.getLogger("halo.storage")
+
+# local: las imágenes se quedan en static/ | s3: bucket S3 compatible | supabase: Supabase Storage
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "local").lower()
+STORAGE_S3_ENDPOINT = os.getenv("STORAGE_S3_ENDPOINT", "https://s3.amazonaws.com")
+STORAGE_S3_BUCKET = os.getenv("STORAGE_S3_BUCKET", "halo-images")
+STORAGE_S3_REGION = os.getenv("STORAGE_S3_REGION", "us-east-1")
+STORAGE_S3_ACCESS_KEY = os.getenv("STORAGE_S3_ACCESS_KEY", "")
+STORAGE_S3_SECRET_KEY = os.getenv("STORAGE_S3_SECRET_KEY", "")
+# URL pública del bucket si no coincide con endpoint/bucket (CDN, dominio propio)
+STORAGE_PUBLIC_URL = os.getenv("STORAGE_PUBLIC_URL")
+STORAGE_SUPABASE_BUCKET = os.getenv("STORAGE_SUPABASE_BUCKET", "images")
+# Subidas simultáneas (cada hilo reutiliza su propia conexión HTTP)
+STORAGE_UPLOAD_CONCURRENCY = int(os.getenv("STORAGE_UPLOAD_CONCURRENCY", "4"))
+STORAGE_UPLOAD_RETRIES = int(os.getenv("STORAGE_UPLOAD_RETRIES", "5"))
+STORAGE_RETRY_BASE_SECONDS = float(os.getenv("STORAGE_RETRY_BASE_SECONDS", "0.5"))
+# Conservar la copia local una vez subida
+STORAGE_KEEP_LOCAL = os.getenv("STORAGE_KEEP_LOCAL", "true").lower() in ("1", "true", "yes")
+STORAGE_TIMEOUT_SECONDS = 30
+
+storage_uploads = registry.register(Counter(
+    "halo_storage_uploads_total", "Subidas al almacenamiento de objetos", ("backend", "result")))
+storage_queue_depth = registry.register(Gauge(
+    "halo_storage_queue_depth", "Imágenes pendientes de subir al almacenamiento de objetos"))
+
+
+class StorageError(RuntimeError):
+    pass
+
+
+# ---------------------- HTTP CON CONEXIONES REUTILIZADAS ----------------------
+
+# Una conexión keep-alive por hilo y host: las subidas de un mismo hilo no repiten el
+# handshake TCP/TLS. Si el servidor cerró la conexión se abre otra en el siguiente intento.
+class HttpClient:
+    def __init__(self, timeout: float = STORAGE_TIMEOUT_SECONDS):
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self, scheme: str, netloc: str):
+        connections = self._local.__dict__.setdefault("connections", {})
+        conn = connections.get((scheme, netloc))
+        if conn is None:
+            factory = http.client.HTTPSConnection if scheme == "https" else http.client.HTTPConnection
+            conn = connections[(scheme, netloc)] = factory(netloc, timeout=self.timeout)
+        return conn
+
+    def request(self, method: str, url: str, body: bytes = b"", headers: Optional[Dict[str, str]] = None):
+        parts = urlsplit(url)
+        path = parts.path + (f"?{parts.query}" if parts.query else "")
+        conn = self._connection(parts.scheme, parts.netloc)
+        try:
+            conn.request(method, path, body=body, headers=headers or {})
+            response = conn.getresponse()
+            return response.status, response.read()
+        except (http.client.HTTPException, OSError):
+            conn.close()
+            self._local.connections.pop((parts.scheme, parts.netloc), None)
+            raise
+
+
+# ---------------------- BACKENDS ----------------------
+
+class LocalStorage:
+    name = "local"
+    remote = False
+
+    def __init__(self, directory: Path, base_url: str = "/static"):
+        self.directory = directory
+        self.base_url = base_url
+
+    def put(self, key: str, data: bytes, content_type: str) -> str:
+        path = self.directory / key
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(data)
+        return f"{self.base_url}/{key}"
+
+
+# Cualquier servicio compatible con S3 (AWS, MinIO, R2...) con URLs de tipo ruta
+# (endpoint/bucket/clave) y firma AWS Signature V4
+class S3Storage:
+    name = "s3"
+    remote = True
+
+    def __init__(self, endpoint: str = STORAGE_S3_ENDPOINT, bucket: str = STORAGE_S3_BUCKET,
+                 region: str = STORAGE_S3_REGION, access_key: str = STORAGE_S3_ACCESS_KEY,
+                 secret_key: str = STORAGE_S3_SECRET_KEY, public_url: Optional[str] = STORAGE_PUBLIC_URL):
+        self.endpoint = endpoint.rstrip("/")
+        self.bucket = bucket
+        self.region = region
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.public_url = (public_url or f"{self.endpoint}/{bucket}").rstrip("/")
+        self.http = HttpClient()
+
+    def _sign(self, method: str, url: str, headers: Dict[str, str], payload_hash: str) -> Dict[str, str]:
+        now = datetime.now(timezone.utc)
+        amz_date = now.strftime("%Y%m%dT%H%M%SZ")
+        parts = urlsplit(url)
+        headers = {**{k.lower(): v for k, v in headers.items()},
+                   "host": parts.netloc, "x-amz-date": amz_date, "x-amz-content-sha256": payload_hash}
+        signed = sorted(headers)
+        canonical = "\n".join([
+            method, parts.path or "/", parts.query,
+            "".join(f"{name}:{str(headers[name]).strip()}\n" for name in signed),
+            ";".join(signed), payload_hash,
+        ])
+        scope = f"{now:%Y%m%d}/{self.region}/s3/aws4_request"
+        to_sign = "\n".join(["AWS4-HMAC-SHA256", amz_date, scope, hashlib.sha256(canonical.encode()).hexdigest()])
+        key = f"AWS4{self.secret_key}".encode()
+        for part in (f"{now:%Y%m%d}", self.region, "s3", "aws4_request"):
+            key = hmac.new(key, part.encode(), hashlib.sha256).digest()
+        signature = hmac.new(key, to_sign.encode(), hashlib.sha256).hexdigest()
+        headers["authorization"] = (
+            f"AWS4-HMAC-SHA256 Credential={self.access_key}/{scope}, "
+            f"SignedHeaders={';'.join(signed)}, Signature={signature}"
+        )
+        return headers
+
+    def put(self, key: str, data: bytes, content_type: str) -> str:
+        url = f"{self.endpoint}/{self.bucket}/{quote(key)}"
+        headers = self._sign("PUT", url, {"content-type": content_type}, hashlib.sha256(data).hexdigest())
+        status, body = self.http.request("PUT", url, data, headers)
+        if status >= 300:
+            raise StorageError(f"S3 respondió {status}: {body[:200]!r}")
+        return f"{self.public_url}/{quote(key)}"
+
+
+# Supabase Storage mediante su API REST (la misma que usa el cliente oficial)
+class SupabaseStorage:
+    name = "supabase"
+    remote = True
+
+    def __init__(self, url: Optional[str] = None, key: Optional[str] = None, bucket: str = STORAGE_SUPABASE_BUCKET):
+        self.url = (url or os.getenv("SUPABASE_URL") or "").rstrip("/")
+        self.key = key or os.getenv("SUPABASE_KEY")
+        if not self.url or not self.key:
+            raise StorageError("SUPABASE_URL o SUPABASE_KEY no definidos en el archivo .env")
+        self.bucket = bucket
+        self.http = HttpClient()
+
+    def put(self, key: str, data: bytes, content_type: str) -> str:
+        url = f"{self.url}/storage/v1/object/{self.bucket}/{quote(key)}"
+        headers = {
+            "Authorization": f"Bearer {self.key}",
+            "apikey": self.key,
+            "Content-Type": content_type,
+            # La clave es el hash del contenido: reescribir el mismo objeto (reintento tras un
+            # timeout que sí llegó a guardarse) deja los mismos bytes
+            "x-upsert": "true",
+        }
+        status, body = self.http.request("POST", url, data, headers)
+        if status >= 300:
+            raise StorageError(f"Supabase Storage respondió {status}: {body[:200]!r}")
+        return f"{self.url}/storage/v1/object/public/{self.bucket}/{quote(key)}"
+
+
+def create_backend(name: str = STORAGE_BACKEND, static_dir: Optional[Path] = None):
+    if name == "s3":
+        return S3Storage()
+    if name == "supabase":
+        return SupabaseStorage()
+    if name == "local":
+        return LocalStorage(static_dir or Path(__file__).resolve().parent.parent / "static")
+    raise StorageError(f"Backend de almacenamiento '{name}' no soportado")
+
+
+# ---------------------- COLA DE SUBIDAS EN SEGUNDO PLANO ----------------------
+
+# Las imágenes se guardan primero en static/ (la petición responde sin esperar a la red)
+# y un grupo limitado de hilos las sube al backend remoto con reintentos. Al terminar,
+# on_uploaded(url_local, url_remota, destino) reescribe la fila que guardó la imagen y
+# devuelve True si ya nada apunta a la copia local (solo entonces puede borrarse).
+class UploadQueue:
+    def __init__(self, backend, static_dir: Path, concurrency: int = STORAGE_UPLOAD_CONCURRENCY,
+                 retries: int = STORAGE_UPLOAD_RETRIES, keep_local: bool = STORAGE_KEEP_LOCAL):
+        self.backend = backend
+        self.static_dir = static_dir
+        self.concurrency = max(concurrency, 1)
+        self.retries = retries
+        self.keep_local = keep_local
+        self.local = LocalStorage(static_dir)
+        self.on_uploaded: Optional[Callable[[str, str, Optional[Hashable]], bool]] = None
+        self._queue: "queue.Queue" = queue.Queue()
+        self._queued = set()
+        self._lock = threading.Lock()
+        self._threads = []
+        self.stats_by_result = {"uploaded": 0, "retried": 0, "failed": 0}
+
+    def configure(self, backend, keep_local: Optional[bool] = None):
+        self.backend = backend
+        if keep_local is not None:
+            self.keep_local = keep_local
+
+    @property
+    def enabled(self) -> bool:
+        return self.backend.remote
+
+    def _start_workers(self):
+        with self._lock:
+            while len(self._threads) < self.concurrency:
+                thread = threading.Thread(target=self._worker, name=f"storage-upload-{len(self._threads)}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def _set_depth(self):
+        with registry.lock:
+            storage_queue_depth.set(self._queue.unfinished_tasks)
+
+    # Copia local con nombre único (uploads/<uuid>.<ext>): dos imágenes subidas con el
+    # mismo nombre de archivo no se pisan
+    def save_local(self, data: bytes, filename: str) -> str:
+        content_type = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+        return self.local.put(f"uploads/{uuid.uuid4().hex}{Path(filename).suffix.lower()}", data, content_type)
+
+    # destino identifica la fila a reescribir (se entrega tal cual a on_uploaded).
+    # Devuelve False si la URL no es de un fichero local o no hay backend remoto.
+    def enqueue(self, local_url: Optional[str], target: Optional[Hashable] = None) -> bool:
+        if not self.enabled or not local_url or not local_url.startswith("/static/"):
+            return False
+        item = (local_url, target)
+        with self._lock:
+            if item in self._queued:
+                return True
+            self._queued.add(item)
+        self._start_workers()
+        self._queue.put(item)
+        self._set_depth()
+        return True
+
+    def _count(self, result: str):
+        self.stats_by_result[result] += 1
+        with registry.lock:
+            storage_uploads.inc((self.backend.name, result))
+
+    def _upload(self, local_url: str) -> Optional[str]:
+        key = local_url[len("/static/"):]
+        path = self.static_dir / key
+        if not path.is_file():
+            logger.warning("Imagen %s no encontrada en disco; no se sube", path)
+            return None
+        data = path.read_bytes()
+        content_type = mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+        # Clave por contenido: nunca sobrescribe otra imagen (la misma imagen da el mismo objeto)
+        remote_key = f"images/{hashlib.sha256(data).hexdigest()}{path.suffix.lower()}"
+        for attempt in range(self.retries + 1):
+            try:
+                return self.backend.put(remote_key, data, content_type)
+            except Exception as e:
+                if attempt == self.retries:
+                    logger.error("Subida de %s fallida tras %d intentos: %s", key, attempt + 1, e)
+                    raise
+                self._count("retried")
+                # Espera exponencial con jitter para no sincronizar reintentos entre hilos
+                time.sleep(STORAGE_RETRY_BASE_SECONDS * (2 ** attempt) * random.uniform(0.5, 1.5))
+
+    def _worker(self):
+        while True:
+            item = self._queue.get()
+            local_url, target = item
+            try:
+                remote_url = self._upload(local_url)
+                if remote_url is not None:
+                    unreferenced = True
+                    if self.on_uploaded is not None:
+                        unreferenced = self.on_uploaded(local_url, remote_url, target)
+                    if not self.keep_local and unreferenced:
+                        (self.static_dir / local_url[len("/static/"):]).unlink(missing_ok=True)
+                    self._count("uploaded")
+            except Exception:
+                # La imagen sigue sirviéndose desde static/; se reintenta en el próximo arranque
+                self._count("failed")
+            finally:
+                with self._lock:
+                    self._queued.discard(item)
+                self._queue.task_done()
+                self._set_depth()
+
+    # Para tests y apagados ordenados: espera a que la cola quede vacía
+    def wait_idle(self, timeout: float = 30) -> bool:
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if time.monotonic() > deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def status(self) -> dict:
+        return {
+            "backend": self.backend.name,
+            "remote": self.enabled,
+            "pending": self._queue.unfinished_tasks,
+            "workers": len(self._threads),
+            "concurrency": self.concurrency,
+            "keep_local": self.keep_local,
+            **self.stats_by_result,
+        }
+
+
+STATIC_DIR = Path(__file__).resolve().parent.parent / "static"
+upload_queue = UploadQueue(create_backend(static_dir=STATIC_DIR), STATIC_DIR)
@@ -0,0 +1,113 @@
+# Servidor local que imita S3 y Supabase Storage para desarrollar y probar sin red:
+#
+#   python -m utils.storage_standin --port 9000
+#   STORAGE_BACKEND=s3 STORAGE_S3_ENDPOINT=http://127.0.0.1:9000 uvicorn main:app
+#
+# S3:       PUT  /{bucket}/{clave}                      GET /{bucket}/{clave}
+# Supabase: POST /storage/v1/object/{bucket}/{clave}    GET /storage/v1/object/public/{bucket}/{clave}
+# No valida firmas ni tokens. Los objetos se guardan en memoria (y se copian en --dir).
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+from urllib.parse import unquote
+
+SUPABASE_PREFIX = "/storage/v1/object/"
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, como los servicios reales
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def log_message(self, format, *args):
+        pass
+
+    def _object_key(self) -> Optional[Tuple[str, str]]:
+        path = unquote(self.path.split("?", 1)[0])
+        if path.startswith(SUPABASE_PREFIX):
+            path = path[len(SUPABASE_PREFIX):]
+            if path.startswith("public/"):
+                path = path[len("public/"):]
+        bucket, _, key = path.lstrip("/").partition("/")
+        return (bucket, key) if bucket and key else None
+
+    def _reply(self, status: int, body: bytes = b"", content_type: str = "application/json"):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _store(self):
+        length = int(self.headers.get("Content-Length", 0))
+        data = self.rfile.read(length)
+        target = self._object_key()
+        with self.server.lock:
+            if self.server.fail_next > 0:
+                self.server.fail_next -= 1
+                return self._reply(503, b'{"error": "fallo simulado"}')
+        if target is None:
+            return self._reply(400, b'{"error": "ruta sin bucket/clave"}')
+        self.server.put(target, self.headers.get("Content-Type", "application/octet-stream"), data)
+        self._reply(200, b'{"Key": "%s"}' % "/".join(target).encode())
+
+    do_PUT = _store
+    do_POST = _store
+
+    def do_GET(self):
+        target = self._object_key()
+        stored = self.server.get(target) if target else None
+        if stored is None:
+            return self._reply(404, b'{"error": "no encontrado"}')
+        content_type, data = stored
+        self._reply(200, data, content_type)
+
+
+class StandInStorageServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address=("127.0.0.1", 0), directory: Optional[Path] = None):
+        super().__init__(address, StandInHandler)
+        self.directory = directory
+        self.objects: Dict[Tuple[str, str], Tuple[str, bytes]] = {}
+        self.lock = threading.Lock()
+        self.connections = 0
+        # Número de próximas subidas que responderán 503 (para probar los reintentos)
+        self.fail_next = 0
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def put(self, target: Tuple[str, str], content_type: str, data: bytes):
+        with self.lock:
+            self.objects[target] = (content_type, data)
+        if self.directory is not None:
+            path = self.directory.joinpath(*target)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_bytes(data)
+
+    def get(self, target: Tuple[str, str]):
+        with self.lock:
+            return self.objects.get(target)
+
+    def start_background(self) -> "StandInStorageServer":
+        threading.Thread(target=self.serve_forever, name="storage-standin", daemon=True).start()
+        return self
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Almacenamiento de objetos local (S3 / Supabase) para pruebas")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--dir", type=Path, default=None, help="Guardar también los objetos en este directorio")
+    args = parser.parse_args()
+    server = StandInStorageServer((args.host, args.port), args.dir)
+    print(f"Almacenamiento local escuchando en {server.url}")
+    server.serve_forever()
@@ -0,0 +1,210 @@
+import logging
+import os
+import signal
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import configure_mappers
+from sqlmodel import SQLModel
+
+from utils.metrics import Gauge, registry
+
+logger = logging.getLogger("halo.warmup")
+
+# Trabajo perezoso que se adelanta al arranque para que las primeras peticiones tras un
+# despliegue no lo paguen. /ready responde 503 hasta que todos los pasos terminan bien.
+WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "true").lower() in ("1", "true", "yes")
+# Pasos y orden: db, templates, schemas, openapi
+WARMUP_STEPS = [step.strip() for step in os.getenv("WARMUP_STEPS", "db,templates,schemas,openapi").split(",") if step.strip()]
+# Conexiones a abrir por engine (0 = tamaño del pool)
+WARMUP_DB_CONNECTIONS = int(os.getenv("WARMUP_DB_CONNECTIONS", "0"))
+# background: el worker arranca enseguida (/live responde, /ready da 503 mientras calienta)
+# blocking: el arranque espera al calentamiento (para plataformas sin sonda de readiness)
+WARMUP_MODE = os.getenv("WARMUP_MODE", "background").lower()
+# En background, los pasos fallidos (p. ej. base de datos aún no disponible) se reintentan
+WARMUP_RETRY_SECONDS = float(os.getenv("WARMUP_RETRY_SECONDS", "5"))
+# Con SIGTERM, /ready da 503 durante estos segundos antes de que el servidor deje de aceptar
+# conexiones, para que el balanceador lo saque de rotación (0 = parar enseguida)
+WARMUP_DRAIN_SECONDS = float(os.getenv("WARMUP_DRAIN_SECONDS", "5"))
+
+worker_ready = registry.register(Gauge(
+    "halo_ready", "1 si el worker terminó el calentamiento y acepta tráfico"))
+warmup_seconds = registry.register(Gauge(
+    "halo_warmup_seconds", "Duración del último intento de cada paso del calentamiento", ("step",)))
+
+Step = Tuple[str, Callable[[], dict]]
+
+
+# ---------------------- PASOS ----------------------
+
+def _pool_size(engine: Engine) -> int:
+    size = getattr(engine.pool, "size", None)
+    return size() if callable(size) else 1
+
+
+# Abre a la vez tantas conexiones como el pool (handshake, autenticación, TLS) y las
+# devuelve: quedan listas para las primeras peticiones
+def warm_database(engines: Dict[str, Optional[Engine]], connections: int = WARMUP_DB_CONNECTIONS) -> dict:
+    opened = {}
+    for name, engine in engines.items():
+        if engine is None:
+            continue
+        held = []
+        try:
+            for _ in range(connections or _pool_size(engine)):
+                conn = engine.connect()
+                held.append(conn)
+                conn.execute(text("SELECT 1"))
+        finally:
+            for conn in held:
+                conn.close()
+        opened[name] = len(held)
+    return {"connections": opened}
+
+
+# Compila todas las plantillas (incluidos los parciales) en la caché de cada entorno Jinja
+def warm_templates(environments) -> dict:
+    compiled = 0
+    for env in environments:
+        for name in env.list_templates(extensions=["html"]):
+            env.get_template(name)
+            compiled += 1
+    return {"templates": compiled}
+
+
+# Configura los mappers (relaciones) y genera el esquema JSON de cada modelo
+def warm_schemas() -> dict:
+    configure_mappers()
+    pending, models = list(SQLModel.__subclasses__()), set()
+    while pending:
+        model = pending.pop()
+        if model in models:
+            continue
+        models.add(model)
+        pending.extend(model.__subclasses__())
+        model.model_json_schema()
+    return {"models": len(models)}
+
+
+def warm_openapi(app) -> dict:
+    return {"paths": len(app.openapi()["paths"])}
+
+
+def warmup_steps(app, engines: Dict[str, Optional[Engine]], template_environments,
+                 names: List[str] = WARMUP_STEPS) -> List[Step]:
+    available = {
+        "db": lambda: warm_database(engines),
+        "templates": lambda: warm_templates(template_environments),
+        "schemas": warm_schemas,
+        "openapi": lambda: warm_openapi(app),
+    }
+    unknown = [name for name in names if name not in available]
+    if unknown:
+        logger.warning("Pasos de calentamiento desconocidos (se ignoran): %s", ", ".join(unknown))
+    return [(name, available[name]) for name in names if name in available]
+
+
+# ---------------------- ESTADO ----------------------
+
+class Warmup:
+    def __init__(self):
+        self.mode = WARMUP_MODE
+        self.steps: Dict[str, dict] = {}
+        self.started_at: Optional[datetime] = None
+        self.finished_at: Optional[datetime] = None
+        self.total_seconds: Optional[float] = None
+        self.draining = False
+        self._lock = threading.Lock()
+        self._started = time.perf_counter()
+
+    @property
+    def ready(self) -> bool:
+        return self.finished_at is not None and not self.draining
+
+    def _set_ready_gauge(self):
+        with registry.lock:
+            worker_ready.set(1 if self.ready else 0)
+
+    # Ejecuta los pasos pendientes o fallidos; devuelve True cuando todos están hechos
+    def run(self, steps: List[Step]) -> bool:
+        with self._lock:
+            if self.started_at is None:
+                self.started_at = datetime.utcnow()
+                self._started = time.perf_counter()
+            for name, step in steps:
+                if self.steps.get(name, {}).get("ok"):
+                    continue
+                started = time.perf_counter()
+                try:
+                    detail = step() or {}
+                    result = {"ok": True, **detail}
+                except Exception as e:
+                    logger.warning("Paso de calentamiento '%s' fallido: %s", name, e)
+                    result = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+                seconds = time.perf_counter() - started
+                attempts = self.steps.get(name, {}).get("attempts", 0) + 1
+                self.steps[name] = {**result, "seconds": round(seconds, 4), "attempts": attempts}
+                with registry.lock:
+                    warmup_seconds.set(seconds, (name,))
+            if all(self.steps[name]["ok"] for name, _ in steps):
+                self.finished_at = datetime.utcnow()
+                self.total_seconds = round(time.perf_counter() - self._started, 4)
+        self._set_ready_gauge()
+        return self.finished_at is not None
+
+    def _run_until_ready(self, steps: List[Step]):
+        while not self.run(steps) and not self.draining:
+            time.sleep(WARMUP_RETRY_SECONDS)
+
+    def start(self, steps: List[Step]):
+        if not WARMUP_ENABLED:
+            steps = []
+        if self.mode == "blocking" or not steps:
+            self.run(steps)
+            return
+        threading.Thread(target=self._run_until_ready, args=(steps,), name="warmup", daemon=True).start()
+
+    # /ready pasa a 503 para que el balanceador deje de enviar tráfico
+    def drain(self):
+        self.draining = True
+        self._set_ready_gauge()
+
+    # Los hooks de shutdown llegan tarde (uvicorn ya no acepta conexiones): se intercepta
+    # SIGTERM, se drena y se pasa la señal al manejador previo tras `seconds`.
+    # Un segundo SIGTERM para sin esperar. Solo desde el hilo principal, tras instalar uvicorn el suyo.
+    def install_drain_signal(self, seconds: float = WARMUP_DRAIN_SECONDS):
+        if seconds <= 0 or threading.current_thread() is not threading.main_thread():
+            return
+        previous = signal.getsignal(signal.SIGTERM)
+        if not callable(previous):
+            return
+
+        def on_sigterm(sig, frame):
+            if self.draining:
+                previous(sig, frame)
+                return
+            logger.info("SIGTERM: drenando %.1f s antes de parar", seconds)
+            self.drain()
+            timer = threading.Timer(seconds, previous, args=(sig, frame))
+            timer.daemon = True
+            timer.start()
+
+        signal.signal(signal.SIGTERM, on_sigterm)
+
+    def status(self) -> dict:
+        return {
+            "ready": self.ready,
+            "draining": self.draining,
+            "mode": self.mode,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "total_seconds": self.total_seconds,
+            "steps": dict(self.steps),
+        }
+
+
+warmup = Warmup()